@@ -221,7 +221,7 @@ function App() {
 
   useEffect(() => {
     if (socket) {
-      socket.on('message', (receivedMessage: ReceivedMessage) => {
+      const handleReceivedMessage = (receivedMessage: ReceivedMessage) => {
         addServerMessage(receivedMessage)
         if(receivedMessage.options.fillInput){
           setInputValue(receivedMessage.options.fillInput)
@@ -230,6 +230,13 @@ function App() {
         if(receivedMessage.options.asksForPassword){
           setPrivateInput(true)
         }
+      }
+
+      socket.on('message', handleReceivedMessage);
+
+      // the server sends the messages produced by each command in batches
+      socket.on('messages', (receivedMessages: ReceivedMessage[]) => {
+        receivedMessages.forEach(handleReceivedMessage)
       });
 
       socket.on('connect', () => {
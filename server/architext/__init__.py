@@ -1,6 +1,6 @@
 # set up internationalization
-import architext.util
-locale = architext.util.get_config()['locale']
+import architext.config
+locale = architext.config.config.locale
 
 import gettext as _gettext
 
@@ -0,0 +1,95 @@
+"""Message queue shared by the processes of a multi-worker server.
+
+Each worker process serves its own clients, but sessions send messages to
+players connected to any of them (see Session.send_to_room). The workers share
+a python-socketio client manager, so emitting to a client of another worker
+goes through the message queue, and a ManagerTransport plugs the same message
+queue into the bus (see bus.py), so the other workers learn who is connected
+where and which worlds have changed.
+
+The message queue is given as an URL: redis://, rediss:// or unix:// for Redis,
+local:// for the in-process stand-in used in tests (LocalManager), and any
+other URL (e.g. amqp://) for Kombu.
+"""
+import json
+import logging
+import queue
+import threading
+import uuid
+import socketio
+from .. import bus as bus_module
+
+logger = logging.getLogger(__name__)
+
+BUS_CHANNEL_SUFFIX = '_bus'
+
+
+def create_manager(url, channel='architext', write_only=False):
+    """Returns the python-socketio client manager for the message queue at url."""
+    scheme = url.split('://', 1)[0].lower()
+    if scheme == 'local':
+        manager_class = LocalManager
+    elif scheme in ('redis', 'rediss', 'unix'):
+        manager_class = socketio.RedisManager
+    else:
+        manager_class = socketio.KombuManager
+    # write only managers are not attached to a server, which would give them its json module
+    return manager_class(url, channel=channel, write_only=write_only, logger=logger, json=json)
+
+
+class LocalManager(socketio.PubSubManager):
+    """Stand-in for a message queue, for tests and benchmarks: the managers of
+    this process created with the same channel get each other's messages, as
+    if each of them were in a different worker."""
+
+    name = 'local'
+    _listeners = {}  # channel: list of the queues of the managers listening to it
+    _listeners_lock = threading.Lock()
+
+    def __init__(self, url='local://', channel='architext', write_only=False, logger=None, json=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger, json=json)
+
+    def _publish(self, data):
+        with self._listeners_lock:
+            listeners = list(self._listeners.get(self.channel, []))
+        message = self.json.dumps(data)
+        for listener in listeners:
+            listener.put(message)
+
+    def _listen(self):
+        listener = queue.Queue()
+        with self._listeners_lock:
+            self._listeners.setdefault(self.channel, []).append(listener)
+        while True:
+            yield listener.get()
+
+
+class ManagerTransport(bus_module.AbstractTransport):
+    """Bus transport that goes through the message queue of a client manager,
+    on a channel of its own (see create_bus_transport)."""
+
+    def __init__(self, manager, bus=bus_module.bus):
+        self.manager = manager
+        self.bus = bus
+        self.origin = uuid.uuid4().hex  # the message queue also delivers our own messages back to us
+
+    def publish(self, topic: str, payload: dict) -> None:
+        self.manager._publish({'origin': self.origin, 'topic': topic, 'payload': payload})
+
+    def listen(self):
+        """Hands over the messages of the other processes to the bus. It never
+        returns, so it has to run as a background task."""
+        for message in self.manager._listen():
+            data = message if isinstance(message, dict) else json.loads(message)
+            if data.get('origin') == self.origin:
+                continue
+            try:
+                self.bus.deliver(data['topic'], data['payload'])
+            except Exception:
+                logger.exception(f'Error delivering a {data.get("topic")} bus message.')
+
+
+def create_bus_transport(url, channel='architext', bus=bus_module.bus):
+    """Returns a ManagerTransport for the message queue at url. Call its listen
+    method in a background task, and plug it into the bus with set_transport."""
+    return ManagerTransport(create_manager(url, channel=channel + BUS_CHANNEL_SUFFIX, write_only=True), bus=bus)
@@ -1,7 +1,13 @@
 import abc
+import asyncio
+import collections
+import logging
+import threading
 import typing
 import dataclasses
 
+logger = logging.getLogger(__name__)
+
 @dataclasses.dataclass
 class MessageOptions():
     display: typing.Literal['wrap', 'box', 'underline', 'fit'] = 'wrap'
@@ -19,6 +25,11 @@ class AbstractSender(abc.ABC):
     def send(self, connection_id: str, message: Message) -> None:
         pass
 
+    def flush(self) -> None:
+        """Called at the end of each command. Senders that hold messages back
+        must deliver them now."""
+        pass
+
 class FakeSender(AbstractSender):
     def __init__(self):
         self._sent = []
@@ -33,5 +44,108 @@ class SocketIOSender(AbstractSender):
 
     def send(self, connection_id: str, message: Message) -> None:
         if connection_id is not None:
-            print(dataclasses.asdict(message))
-            self.sio.emit('message', dataclasses.asdict(message), to=connection_id)
\ No newline at end of file
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(dataclasses.asdict(message))
+            self.sio.emit('message', dataclasses.asdict(message), to=connection_id)
+
+class BatchingSocketIOSender(AbstractSender):
+    """Sender that queues the messages of each client and delivers them in
+    batches, as a single 'messages' event with the list of messages.
+
+    Queued messages are emitted when flush is called at the end of each command,
+    from a background task, so the command doesn't wait for the network. A single
+    instance should be shared by all the sessions, so that the messages to each
+    client keep their order.
+
+    Backpressure: while a client is still receiving a batch, the following ones
+    wait in its queue. If more than max_queued_messages are waiting, the oldest
+    are dropped so a slow client can't make the server hold an unbounded
+    amount of messages.
+
+    When the server runs in several processes, the messages to the clients of
+    other processes go through the message queue of the client manager (see
+    adapters.message_queue). The ones to the clients of this process don't.
+    """
+    MAX_QUEUED_MESSAGES = 500
+
+    def __init__(self, sio, max_queued_messages=MAX_QUEUED_MESSAGES):
+        self.sio = sio
+        self.max_queued_messages = max_queued_messages
+        self._queues: typing.Dict[str, typing.Deque[dict]] = {}
+        self._draining: typing.Set[str] = set()  # clients with a background task emitting to them
+        self._dropped: typing.Dict[str, int] = collections.Counter()
+        self.dropped_messages = 0  # since the server started
+        self._lock = threading.Lock()
+
+    def send(self, connection_id: str, message: Message) -> None:
+        if connection_id is None:
+            return
+        with self._lock:
+            queue = self._queues.setdefault(connection_id, collections.deque())
+            if len(queue) >= self.max_queued_messages:
+                queue.popleft()
+                self._dropped[connection_id] += 1
+                self.dropped_messages += 1
+            queue.append(dataclasses.asdict(message))
+
+    def flush(self) -> None:
+        for connection_id in self._take_ready():
+            self.sio.start_background_task(self._drain, connection_id)
+
+    def queued_messages(self) -> int:
+        """Number of messages waiting to be emitted, to all clients."""
+        with self._lock:
+            return sum(len(queue) for queue in self._queues.values())
+
+    def _take_ready(self) -> typing.List[str]:
+        # clients with queued messages and no task emitting to them yet
+        with self._lock:
+            ready = [connection_id for connection_id in self._queues if connection_id not in self._draining]
+            self._draining.update(ready)
+        return ready
+
+    def _next_batch(self, connection_id: str) -> typing.Optional[typing.List[dict]]:
+        # returns None once the queue of the client is empty, ending the task that emits to it
+        with self._lock:
+            queue = self._queues.pop(connection_id, None)
+            dropped = self._dropped.pop(connection_id, 0)
+            if not queue:
+                self._draining.discard(connection_id)
+                return None
+        if dropped:
+            logger.warning(f'Dropped {dropped} messages to slow client {connection_id}.')
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f'{len(queue)} messages to {connection_id}: {list(queue)}')
+        return list(queue)
+
+    def _drain(self, connection_id: str) -> None:
+        while True:
+            batch = self._next_batch(connection_id)
+            if batch is None:
+                return
+            local_client = self.sio.manager.is_connected(connection_id, '/')
+            self.sio.emit('messages', batch, to=connection_id, ignore_queue=local_client)
+
+class AsyncBatchingSocketIOSender(BatchingSocketIOSender):
+    """BatchingSocketIOSender for a socketio.AsyncServer.
+
+    Sessions are processed in worker threads (see the asyncio_server
+    entrypoint), so flush hands the batches over to the event loop, which
+    emits them.
+    """
+
+    def __init__(self, sio, loop, max_queued_messages=BatchingSocketIOSender.MAX_QUEUED_MESSAGES):
+        super().__init__(sio, max_queued_messages=max_queued_messages)
+        self.loop = loop
+
+    def flush(self) -> None:
+        for connection_id in self._take_ready():
+            asyncio.run_coroutine_threadsafe(self._drain(connection_id), self.loop)
+
+    async def _drain(self, connection_id: str) -> None:
+        while True:
+            batch = self._next_batch(connection_id)
+            if batch is None:
+                return
+            local_client = self.sio.manager.is_connected(connection_id, '/')
+            await self.sio.emit('messages', batch, to=connection_id, ignore_queue=local_client)
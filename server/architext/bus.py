@@ -0,0 +1,56 @@
+"""Publish/subscribe bus used to tell sessions about changes made by other sessions.
+
+Messages are delivered right away to the subscribers of this process. When the
+server runs in several processes, the entrypoint plugs a transport into the bus
+(see Bus.set_transport) that also delivers them to the other processes, which
+hand them over to their own bus with Bus.deliver.
+
+Payloads must be JSON serializable, since transports may send them through the
+network.
+"""
+import abc
+import threading
+import typing
+
+class AbstractTransport(abc.ABC):
+    """Sends bus messages to the other processes of the server."""
+
+    @abc.abstractmethod
+    def publish(self, topic: str, payload: dict) -> None:
+        pass
+
+
+class Bus():
+    def __init__(self):
+        self._subscribers: typing.Dict[str, typing.List[typing.Callable[[dict], None]]] = {}
+        self._transport: typing.Optional[AbstractTransport] = None
+        self._lock = threading.RLock()
+
+    def subscribe(self, topic: str, callback: typing.Callable[[dict], None]) -> None:
+        with self._lock:
+            self._subscribers.setdefault(topic, []).append(callback)
+
+    def publish(self, topic: str, payload: dict) -> None:
+        """Delivers the message to this process and, if there is a transport, to the others."""
+        self.deliver(topic, payload)
+        if self._transport is not None:
+            self._transport.publish(topic, payload)
+
+    def publish_to_others(self, topic: str, payload: dict) -> None:
+        """Delivers the message to the other processes only, if there is a transport."""
+        if self._transport is not None:
+            self._transport.publish(topic, payload)
+
+    def deliver(self, topic: str, payload: dict) -> None:
+        """Delivers a message to the subscribers of this process only."""
+        with self._lock:
+            callbacks = list(self._subscribers.get(topic, []))
+        for callback in callbacks:
+            callback(payload)
+
+    def set_transport(self, transport: typing.Optional[AbstractTransport]) -> None:
+        self._transport = transport
+
+
+# Bus shared by the whole process.
+bus = Bus()
@@ -0,0 +1,93 @@
+"""Server configuration, read from config.yml.
+
+The file is parsed once and kept in memory. Accessing the configuration checks
+the modification time of the file, at most once every CHECK_INTERVAL seconds,
+and parses it again if it has changed, so it can be edited while the server
+runs. Entrypoints also reload it when they receive SIGHUP (see reload).
+"""
+import io
+import os
+import threading
+import time
+import typing
+import yaml
+
+CONFIG_FILE = 'config.yml'
+
+
+class Config():
+    CHECK_INTERVAL = 2.0  # seconds
+
+    def __init__(self, path=CONFIG_FILE, check_interval=CHECK_INTERVAL):
+        self.path = path
+        self.check_interval = check_interval
+        self._values: typing.Optional[dict] = None
+        self._mtime = None
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+
+    def reload(self):
+        """Parses the file again."""
+        with self._lock:
+            self._load()
+
+    def _load(self):
+        mtime = os.stat(self.path).st_mtime
+        with io.open(self.path) as file:
+            self._values = yaml.load(file, Loader=yaml.FullLoader) or {}
+        self._mtime = mtime
+        self._next_check = time.monotonic() + self.check_interval
+
+    def _get_values(self) -> dict:
+        if self._values is None or time.monotonic() >= self._next_check:
+            with self._lock:
+                if self._values is None or os.stat(self.path).st_mtime != self._mtime:
+                    self._load()
+                else:
+                    self._next_check = time.monotonic() + self.check_interval
+        return self._values
+
+    def as_dict(self) -> dict:
+        """All the values of the configuration, as they are in the file."""
+        return dict(self._get_values())
+
+    @property
+    def locale(self) -> str:
+        # translations are installed when the server starts, changing it requires a restart
+        return self._get_values()['locale']
+
+    @property
+    def public_worlds_limit(self) -> int:
+        return int(self._get_values()['public_worlds_limit'])
+
+    @property
+    def cover(self) -> typing.Optional[str]:
+        """Welcome text for new connections. None to use the default one."""
+        return self._get_values().get('cover') or None
+
+    @property
+    def sign_in_welcome(self) -> typing.Optional[str]:
+        return self._get_values().get('sign_in_welcome') or None
+
+    @property
+    def log_in_welcome(self) -> typing.Optional[str]:
+        return self._get_values().get('log_in_welcome') or None
+
+    @property
+    def slow_command_milliseconds(self) -> float:
+        """Messages that take longer are written to the slow commands log (see query_tracing)."""
+        return float(self._get_values().get('slow_command_milliseconds', 500))
+
+    @property
+    def slow_command_queries(self) -> int:
+        """Messages that send more database commands are written to the slow commands log."""
+        return int(self._get_values().get('slow_command_queries', 30))
+
+    @property
+    def admins(self) -> typing.List[str]:
+        """Names of the users that can use the server administration verbs."""
+        return list(self._get_values().get('admins') or [])
+
+
+# Configuration of the server, shared by the whole process.
+config = Config()
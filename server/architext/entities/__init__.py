@@ -10,6 +10,11 @@ from .exit import Exit
 from .room import Room
 from .user import User
 from .location_save import LocationSave
+from .room_view import RoomView
+from .world_list import WorldList
+from . import world_graph
+from . import name_registry
+from . import indexes
 
 from .exceptions import BadItem, EmptyName, WrongNameFormat, RoomNameClash, TakableItemNameClash, NameNotGloballyUnique, CantDelete, ValueWithLineBreaks, ValueTooLong, PublicWorldLimitReached
 
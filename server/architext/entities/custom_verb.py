@@ -1,4 +1,5 @@
 import mongoengine
+from . import world_graph as world_graph_module
 
 class CustomVerb(mongoengine.Document):
     names = mongoengine.ListField(mongoengine.StringField())
@@ -12,6 +13,10 @@ class CustomVerb(mongoengine.Document):
     def is_name(self, verb_name):
         return verb_name in self.names
 
+    def delete(self):
+        super().delete()
+        world_graph_module.cache.custom_verb_deleted(self)
+
     def clone(self):
         new_custom_verb = CustomVerb(names=self.names.copy(), commands=self.commands.copy())
         new_custom_verb.save()
@@ -0,0 +1,53 @@
+import collections
+
+class CustomVerbTable():
+    """Custom verbs of a world state by name, so that the messages that are not
+    custom verbs (most of them) are told apart without searching the rooms,
+    items and inventories (see verbs.CustomVerb.search_for_custom_verb).
+
+    The world graph builds it from its world state, rooms, items and the items
+    carried in the world's inventories, and drops it whenever any of them
+    changes.
+    """
+
+    def __init__(self):
+        self._of_world = {}  # verb name: first custom verb of the world state with that name
+        self._of_room = collections.defaultdict(dict)  # room id: verb name: first custom verb of the room with that name
+        self._of_items_in_room = collections.defaultdict(set)  # room id: names of the custom verbs of its items
+        self._of_carried_items = set()  # names of the custom verbs of the items carried in any inventory
+
+    @classmethod
+    def from_graph(cls, graph):
+        table = cls()
+        for custom_verb in graph.world_state.custom_verbs:
+            table._add(table._of_world, custom_verb)
+        for room_id, room in graph.rooms.items():
+            for custom_verb in room.custom_verbs:
+                table._add(table._of_room[room_id], custom_verb)
+        for room_id, items in graph.items_by_room.items():
+            for item in items:
+                for custom_verb in item.custom_verbs:
+                    table._of_items_in_room[room_id].update(custom_verb.names)
+        for item in graph.carried_items.values():
+            for custom_verb in item.custom_verbs:
+                table._of_carried_items.update(custom_verb.names)
+        return table
+
+    @staticmethod
+    def _add(verbs_by_name, custom_verb):
+        for name in custom_verb.names:
+            verbs_by_name.setdefault(name, custom_verb)
+
+    def world_verb(self, name):
+        """The custom verb of the world state with that name, or None."""
+        return self._of_world.get(name)
+
+    def room_verb(self, name, room_id):
+        """The custom verb of the room with that name, or None."""
+        room_verbs = self._of_room.get(room_id)
+        return room_verbs.get(name) if room_verbs is not None else None
+
+    def may_be_item_verb(self, name, room_id):
+        """False if no item of the room, nor any item carried in the world,
+        has a custom verb with that name."""
+        return name in self._of_items_in_room.get(room_id, ()) or name in self._of_carried_items
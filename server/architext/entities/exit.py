@@ -1,6 +1,7 @@
 import mongoengine
 from . import item as item_module
 from . import room as room_module
+from . import world_graph as world_graph_module
 
 class Exit(mongoengine.Document):
     name = mongoengine.StringField(required=True)
@@ -11,19 +12,27 @@ class Exit(mongoengine.Document):
     key_names = mongoengine.ListField(mongoengine.StringField())
     room = mongoengine.ReferenceField('Room', default=None)
 
+    meta = {'indexes': [('room', 'name'), 'destination'], 'auto_create_index': False, 'index_background': True}
+
     def __init__(self, *args, save_on_creation=True, **kwargs):
         super().__init__(*args, **kwargs)
         if self.id is None and save_on_creation:
             self.save()
 
     def save(self):
-        self.ensure_i_am_valid()
-        super().save()
+        with world_graph_module.cache.saving(self):
+            self.ensure_i_am_valid()
+            super().save()
+        world_graph_module.cache.exit_saved(self)
+
+    def delete(self):
+        super().delete()
+        world_graph_module.cache.exit_deleted(self)
 
     def ensure_i_am_valid(self):
         name_conditions = self._get_name_validation_conditions(self.name,  self.room, self)
         for condition in name_conditions.values():
-            if not condition['condition']:
+            if not condition['condition']():
                 raise condition['exception']
 
     @classmethod
@@ -65,6 +74,9 @@ class Exit(mongoengine.Document):
 
     @classmethod
     def get_exits_in_world_state(cls, world_state):
+        graph = world_graph_module.cache.get_loaded(world_state.id)
+        if graph is not None:
+            return graph.get_all_exits()
         exits_in_world_state = []
         for room in room_module.Room.objects(world_state=world_state):
             exits_in_world_state += room.exits
@@ -0,0 +1,104 @@
+"""Checks and builds the indexes of the entity collections.
+
+Entities declare their indexes in their meta, with auto_create_index disabled:
+mongoengine would otherwise build them the first time each collection is
+used, blocking whatever request got there first. Instead, the server builds the
+missing ones in the background when it starts (see check), and reports the hot
+queries that would still scan a whole collection.
+"""
+import bson
+from .custom_verb import CustomVerb
+from .exit import Exit
+from .inventory import Inventory
+from .item import Item
+from .location_save import LocationSave
+from .room import Room
+from .user import User
+from .world import World
+from .world_snapshot import WorldSnapshot
+from .world_state import WorldState
+
+DOCUMENTS = [CustomVerb, Exit, Inventory, Item, LocationSave, Room, User, World, WorldSnapshot, WorldState]
+
+# Any id works to see how a query would be executed.
+_AN_ID = bson.ObjectId()
+
+# The queries the game runs all the time: (description, document, filter).
+HOT_QUERIES = [
+    ('rooms of a world state',               Room,          {'world_state': _AN_ID}),
+    ('room of a world state by alias',       Room,          {'world_state': _AN_ID, 'alias': '0'}),
+    ('items of a room',                      Item,          {'room': _AN_ID}),
+    ('items of several rooms',               Item,          {'room': {'$in': [_AN_ID]}}),
+    ('saved items of a world state',         Item,          {'saved_in': _AN_ID}),
+    ('saved item by item id',                Item,          {'saved_in': _AN_ID, 'item_id': 'item#1'}),
+    ('exits of a room',                      Exit,          {'room': _AN_ID}),
+    ('exit of a room by name',               Exit,          {'room': _AN_ID, 'name': 'door'}),
+    ('exits leading to a room',              Exit,          {'destination': _AN_ID}),
+    ('users in a room',                      User,          {'room': _AN_ID}),
+    ('connected users',                      User,          {'client_id': {'$ne': None}}),
+    ('user by name',                         User,          {'name': 'name'}),
+    ('inventory of a user in a world state', Inventory,     {'user': _AN_ID, 'world_state': _AN_ID}),
+    ('inventories of a world state',         Inventory,     {'world_state': _AN_ID}),
+    ('inventories carrying an item',         Inventory,     {'items': _AN_ID}),
+    ('location save of a user in a world',   LocationSave,  {'user': _AN_ID, 'world': _AN_ID}),
+    ('world of a world state',               World,         {'world_state': _AN_ID}),
+    ('public worlds of a creator',           World,         {'creator': _AN_ID, 'public': True}),
+    ('worlds listed at the lobby',           World,         {'$or': [{'public': True}, {'creator': _AN_ID}, {'_id': {'$in': [_AN_ID]}}]}),
+    ('public snapshots',                     WorldSnapshot, {'public': True}),
+]
+
+
+def missing_indexes():
+    """Returns the declared indexes that don't exist in the database, as a
+    dict of document: list of index keys."""
+    missing = {}
+    for document in DOCUMENTS:
+        # the _id index only shows up once the collection exists, and is created along with it
+        document_missing = [keys for keys in document.compare_indexes()['missing'] if keys != [('_id', 1)]]
+        if document_missing:
+            missing[document] = document_missing
+    return missing
+
+
+def build_missing_indexes():
+    """Builds the declared indexes that don't exist yet. The database builds
+    them in the background (see index_background in the meta of the entities)."""
+    missing = missing_indexes()
+    for document in missing:
+        document.ensure_indexes()
+    return missing
+
+
+def _does_collection_scan(plan):
+    if plan.get('stage') == 'COLLSCAN':
+        return True
+    children = plan.get('inputStages', []) + ([plan['inputStage']] if 'inputStage' in plan else [])
+    return any(_does_collection_scan(child) for child in children)
+
+
+def collection_scans():
+    """Returns the descriptions of the hot queries that the database would
+    execute scanning a whole collection."""
+    scans = []
+    for description, document, query_filter in HOT_QUERIES:
+        winning_plan = document._get_collection().find(query_filter).explain()['queryPlanner']['winningPlan']
+        # with the slot based engine, the plan is one level deeper
+        if _does_collection_scan(winning_plan.get('queryPlan', winning_plan)):
+            scans.append(description)
+    return scans
+
+
+def check(logger, build=True):
+    """Logs the missing indexes, builds them if build is True, and logs the hot
+    queries that would still do collection scans."""
+    missing = build_missing_indexes() if build else missing_indexes()
+    for document, keys in missing.items():
+        action = 'Building' if build else 'Missing'
+        logger.info(f'{action} indexes of {document._get_collection_name()}: {keys}')
+    if not missing:
+        logger.info('All the declared indexes exist.')
+
+    scans = collection_scans()
+    for description in scans:
+        logger.warning(f'Query doing a collection scan: {description}')
+    return missing, scans
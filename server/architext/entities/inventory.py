@@ -1,15 +1,22 @@
 import mongoengine
+from . import world_graph as world_graph_module
 
 class Inventory(mongoengine.Document):
     user  = mongoengine.ReferenceField('User', required=True)
     world_state = mongoengine.ReferenceField('WorldState', required=True)
     items = mongoengine.ListField(mongoengine.ReferenceField('Item'))
 
+    meta = {'indexes': [('user', 'world_state'), 'world_state', 'items'], 'auto_create_index': False, 'index_background': True}
+
     def __init__(self, *args, save_on_creation=True, **kwargs):
         super().__init__(*args, **kwargs)
         if self.id is None and save_on_creation:
                 self.save()
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        world_graph_module.cache.inventory_saved(self)
+
     def add_item(self, item):
         item.remove_from_room()
         self.items.append(item)
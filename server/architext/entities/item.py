@@ -2,7 +2,10 @@ import mongoengine
 from .exceptions import *
 from . import exit as exit_module
 from . import inventory as inventory_module
+from . import name_registry as name_registry_module
 from . import room as room_module
+from . import world_graph as world_graph_module
+import functools
 import re
 
 class Item(mongoengine.Document):
@@ -14,6 +17,8 @@ class Item(mongoengine.Document):
     room         = mongoengine.ReferenceField('Room', default=None)
     saved_in     = mongoengine.ReferenceField('WorldState', default=None)
 
+    meta = {'indexes': ['room', ('saved_in', 'item_id')], 'auto_create_index': False, 'index_background': True}
+
     def __init__(self, *args, save_on_creation=True, **kwargs):
         super().__init__(*args, **kwargs)
         if self.id is None:  # if this is a newly created Item, instead of a pre-existing document being instantiated by mongoengine.
@@ -23,8 +28,10 @@ class Item(mongoengine.Document):
                 self.save()
 
     def save(self):
-        self.ensure_i_am_valid()
-        super().save()
+        with world_graph_module.cache.saving(self):
+            self.ensure_i_am_valid()
+            super().save()
+        world_graph_module.cache.item_saved(self)
 
     def _generate_item_id(self):
         id_number = 1
@@ -37,20 +44,25 @@ class Item(mongoengine.Document):
     def ensure_i_am_valid(self):
         name_conditions = self._get_name_validation_conditions(self.name,  self.room, self, self.is_takable())
         for condition in name_conditions.values():
-            if not condition['condition']:
+            if not condition['condition']():
                 raise condition['exception']
 
     @classmethod
-    def _get_name_validation_conditions(cls, item_name, local_room=None, ignore_item=None, takable=False):
+    def _get_name_validation_conditions(cls, item_name, local_room=None, ignore_item=None, takable=False, registry=None):
+        """Returns the conditions a name has to meet. Each condition is a function,
+        so only the conditions that are checked are evaluated, in order, from the
+        cheapest to the ones that depend on the whole world (which are answered by
+        the NameRegistry of the world, or by registry if given)."""
         conditions_for_this_item = {}
+        ignore_id = ignore_item.id if ignore_item is not None else None
 
         snapshot_conditions = {
             'name_is_not_empty': {
-                'condition': len(item_name)>0,
+                'condition': lambda: len(item_name)>0,
                 'exception': EmptyName()
             },
             'has_name_format': {
-                'condition': not re.search("#\d+$", item_name),
+                'condition': lambda: not re.search("#\d+$", item_name),
                 'exception': WrongNameFormat()
             }
         }        
@@ -58,13 +70,14 @@ class Item(mongoengine.Document):
         conditions_for_this_item = {**conditions_for_this_item, **snapshot_conditions}
 
         if local_room is not None:
+            get_registry = functools.cache(lambda: registry if registry is not None else cls._get_name_registry(local_room, item_name))
             item_conditions = {
                 'unique_in_room': {
-                    'condition': item_name not in [item.name for item in local_room.items+local_room.exits if item != ignore_item],
+                    'condition': lambda: not get_registry().used_in_room(item_name, local_room.id, ignore_id),
                     'exception': RoomNameClash(f"Repeated name {item_name} in room {local_room.alias}")
                 },
                 'there_is_no_takable_with_same_name': {
-                    'condition': item_name not in [takable_item.name for takable_item in Item.get_items_in_world_state(local_room.world_state) if takable_item != ignore_item and takable_item.visible=='takable'],
+                    'condition': lambda: not get_registry().used_by_takable(item_name, ignore_id),
                     'exception': TakableItemNameClash()
                 }
             }
@@ -73,10 +86,7 @@ class Item(mongoengine.Document):
         if local_room is not None and takable:
             takable_item_conditions = {
                 'name_is_globally_unique': {
-                    'condition': (
-                            item_name not in [item.name for item in Item.get_items_in_world_state(local_room.world_state) if item != ignore_item]
-                            and item_name not in [item.name for item in exit_module.Exit.get_exits_in_world_state(local_room.world_state) if item != ignore_item]
-                        ),
+                    'condition': lambda: not get_registry().used_globally(item_name, ignore_id),
                     'exception': NameNotGloballyUnique()
                 }
             }
@@ -84,11 +94,44 @@ class Item(mongoengine.Document):
 
         return conditions_for_this_item
 
+    @classmethod
+    def _get_name_registry(cls, local_room, item_name):
+        # only item_name has to be looked up in the registry
+        world_state_id = world_graph_module.reference_id(local_room._data.get('world_state'))
+        if world_state_id is not None:
+            graph = world_graph_module.cache.get_loaded(world_state_id)
+            if graph is not None:
+                return graph.get_name_registry()
+            return cls._get_name_registry_from_database(world_state_id, item_name)
+        # a world that is being created: only the room itself can have names in use
+        registry = name_registry_module.NameRegistry()
+        for item in local_room.items:
+            registry.add_item(item, local_room.id)
+        for exit in local_room.exits:
+            registry.add_exit(exit, local_room.id)
+        return registry
+
+    @staticmethod
+    def _get_name_registry_from_database(world_state_id, item_name):
+        # NameRegistry of the items and exits of a world state that have that
+        # name, for worlds whose graph isn't loaded
+        registry = name_registry_module.NameRegistry()
+        room_ids = [room['_id'] for room in room_module.Room._get_collection().find({'world_state': world_state_id}, {'_id': 1})]
+        inventories = inventory_module.Inventory._get_collection().find({'world_state': world_state_id}, {'items': 1})
+        carried_item_ids = [item_id for inventory in inventories for item_id in inventory.get('items', [])]
+        for item in Item.objects(name=item_name, room__in=room_ids).only('name', 'visible', 'room'):
+            registry.add_item(item, world_graph_module.reference_id(item._data.get('room')))
+        for item in Item.objects(name=item_name, id__in=carried_item_ids).only('name', 'visible'):
+            registry.add_item(item)
+        for exit in exit_module.Exit.objects(name=item_name, room__in=room_ids).only('name', 'room'):
+            registry.add_exit(exit, world_graph_module.reference_id(exit._data.get('room')))
+        return registry
+
     @classmethod
     def name_is_valid(cls, item_name, local_room, ignore_item=None, takable=False):
         conditions = cls._get_name_validation_conditions(item_name, local_room, ignore_item, takable)
         for condition in conditions.values():
-            if not condition['condition']:
+            if not condition['condition']():
                 return False
         return True
 
@@ -120,6 +163,10 @@ class Item(mongoengine.Document):
 
     @classmethod
     def get_items_in_world_state(cls, world_state):
+        graph = world_graph_module.cache.get_loaded(world_state.id)
+        if graph is not None:
+            return graph.get_all_items() + list(graph.carried_items.values())
+
         items_at_rooms = []
         for room in room_module.Room.objects(world_state=world_state):
             items_at_rooms += room.items
@@ -141,4 +188,5 @@ class Item(mongoengine.Document):
     def delete(self):
         for custom_verb in self.custom_verbs:
             custom_verb.delete()
-        super().delete()
\ No newline at end of file
+        super().delete()
+        world_graph_module.cache.item_deleted(self)
\ No newline at end of file
@@ -5,6 +5,8 @@ class LocationSave(mongoengine.Document):
     world = mongoengine.ReferenceField('World', required=True)
     room  = mongoengine.ReferenceField('Room', required=True)
 
+    meta = {'indexes': [('user', 'world'), 'room'], 'auto_create_index': False, 'index_background': True}
+
     def __init__(self, *args, save_on_creation=True, **kwargs):
         super().__init__(*args, **kwargs)
         if self.id is None and save_on_creation:
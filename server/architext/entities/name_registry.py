@@ -0,0 +1,55 @@
+import collections
+
+class NameRegistry():
+    """Names used by the items and exits of a world state, to validate new
+    names without going through all of them (see Item._get_name_validation_conditions).
+
+    The world graph builds it from its rooms and the items carried in the
+    world's inventories, and drops it whenever any of them changes.
+    """
+
+    def __init__(self):
+        self._in_room = collections.defaultdict(lambda: collections.defaultdict(set))  # room id: name: ids of the items and exits with that name
+        self._takable = collections.defaultdict(set)  # name: ids of the takable items (in rooms or carried) with that name
+        self._global = collections.defaultdict(set)   # name: ids of the items (in rooms or carried) and exits with that name
+
+    @classmethod
+    def from_graph(cls, graph):
+        registry = cls()
+        for room_id, items in graph.items_by_room.items():
+            for item in items:
+                registry.add_item(item, room_id)
+        for item in graph.carried_items.values():
+            registry.add_item(item)
+        for room_id, exits in graph.exits_by_room.items():
+            for exit in exits:
+                registry.add_exit(exit, room_id)
+        return registry
+
+    def add_item(self, item, room_id=None):
+        if room_id is not None:
+            self._in_room[room_id][item.name].add(item.id)
+        if item.visible == 'takable':
+            self._takable[item.name].add(item.id)
+        self._global[item.name].add(item.id)
+
+    def add_exit(self, exit, room_id):
+        self._in_room[room_id][exit.name].add(exit.id)
+        self._global[exit.name].add(exit.id)
+
+    @staticmethod
+    def _used(ids, ignore_id):
+        return any(entity_id != ignore_id for entity_id in ids)
+
+    def used_in_room(self, name, room_id, ignore_id=None):
+        """True if an item or exit of the room, other than ignore_id, has that name."""
+        room_names = self._in_room.get(room_id)
+        return room_names is not None and self._used(room_names.get(name, ()), ignore_id)
+
+    def used_by_takable(self, name, ignore_id=None):
+        """True if a takable item of the world, other than ignore_id, has that name."""
+        return self._used(self._takable.get(name, ()), ignore_id)
+
+    def used_globally(self, name, ignore_id=None):
+        """True if any item or exit of the world, other than ignore_id, has that name."""
+        return self._used(self._global.get(name, ()), ignore_id)
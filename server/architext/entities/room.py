@@ -2,6 +2,8 @@ import mongoengine
 from . import exit as exit_module
 from . import item as item_module
 from . import user as user_module
+from . import world_graph as world_graph_module
+from .. import name_index
 
 class Room(mongoengine.Document):
     name        = mongoengine.StringField(required=True)
@@ -10,6 +12,8 @@ class Room(mongoengine.Document):
     description = mongoengine.StringField()
     custom_verbs = mongoengine.ListField(mongoengine.ReferenceField('CustomVerb'))
 
+    meta = {'indexes': [('world_state', 'alias')], 'auto_create_index': False, 'index_background': True}
+
     def __init__(self, *args, save_on_creation=True, **kwargs):
         if 'alias' in kwargs:
             super().__init__(*args, **kwargs)
@@ -23,27 +27,69 @@ class Room(mongoengine.Document):
         self.custom_verbs.append(custom_verb)
         self.save()
 
+    def save(self, *args, **kwargs):
+        with world_graph_module.cache.saving(self):
+            super().save(*args, **kwargs)
+        world_graph_module.cache.room_saved(self)
+
     def get_exit(self, exit_name=None, destination=None):
-        if exit_name is not None and destination is not None:
-            return next(exit_module.Exit.objects(room=self, name=exit_name, destination=destination), None)
-        if exit_name is not None:
-            return next(exit_module.Exit.objects(room=self, name=exit_name), None)
-        if destination is not None:
-            return next(exit_module.Exit.objects(room=self, destination=destination), None)
+        if exit_name is None and destination is None:
+            return None
+        for exit in self.exits:
+            if exit_name is not None and exit.name != exit_name:
+                continue
+            if destination is not None and world_graph_module.reference_id(exit._data.get('destination')) != destination.id:
+                continue
+            return exit
+        return None
+
+    def _get_graph(self):
+        # the graph of the room's world, if the room is part of one
+        graph = world_graph_module.cache.for_room(self)
+        if graph is not None and graph.get_room(self.id) is not None:
+            return graph
         return None
 
     @property
     def items(self):
         if self.id is None:  # if the room is not yet saved into db it cannot have any items
             return []
+        graph = self._get_graph()
+        if graph is not None:
+            return graph.get_items(self.id)
         return list(item_module.Item.objects(room=self))
 
     @property
     def exits(self):
         if self.id is None:  # if the room is not yet saved into db it cannot have any items
             return []
+        graph = self._get_graph()
+        if graph is not None:
+            return graph.get_exits(self.id)
         return list(exit_module.Exit.objects(room=self))
 
+    def get_items_index(self):
+        """NameIndex of the items of the room (see name_index)."""
+        graph = self._get_graph()
+        if graph is not None:
+            return graph.get_items_index(self.id)
+        return name_index.NameIndex(self.items)
+
+    def get_exits_index(self):
+        """NameIndex of the exits of the room (see name_index)."""
+        graph = self._get_graph()
+        if graph is not None:
+            return graph.get_exits_index(self.id)
+        return name_index.NameIndex(self.exits)
+
+    def get_custom_verb_table(self):
+        """CustomVerbTable of the room's world (see custom_verb_table), or None
+        if the room isn't part of a saved world."""
+        graph = self._get_graph()
+        if graph is not None:
+            return graph.get_custom_verb_table()
+        return None
+
     @property
     def users(self):
         if self.id is None:  # if the room is not yet saved into db it cannot have any items
@@ -64,4 +110,5 @@ class Room(mongoengine.Document):
     def delete(self):
         for custom_verb in self.custom_verbs:
             custom_verb.delete()
-        super().delete()
\ No newline at end of file
+        super().delete()
+        world_graph_module.cache.room_deleted(self)
\ No newline at end of file
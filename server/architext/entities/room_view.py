@@ -0,0 +1,170 @@
+import dataclasses
+import typing
+from . import room as room_module
+from . import exit as exit_module
+from . import item as item_module
+from . import user as user_module
+from . import world as world_module
+from . import world_graph as world_graph_module
+from .. import presence
+
+@dataclasses.dataclass
+class ExitView():
+    name: str
+    description: typing.Optional[str]
+    visible: str
+    destination_name: typing.Optional[str]
+    destination_alias: typing.Optional[str]
+
+    def is_obvious(self):
+        return self.visible == 'obvious'
+
+    def is_listed(self):
+        return self.visible == 'listed'
+
+    def is_hidden(self):
+        return self.visible == 'hidden'
+
+@dataclasses.dataclass
+class ItemView():
+    name: str
+    description: typing.Optional[str]
+    visible: str
+
+    def is_obvious(self):
+        return self.visible == 'obvious'
+
+    def is_listed(self):
+        return self.visible == 'listed' or self.visible == 'takable'
+
+    def is_hidden(self):
+        return self.visible == 'hidden'
+
+    def is_takable(self):
+        return self.visible == 'takable'
+
+@dataclasses.dataclass
+class PlayerView():
+    id: typing.Any
+    name: str
+    online: bool
+    master_mode: bool
+
+@dataclasses.dataclass
+class RoomView():
+    """Read-only picture of a room and everything that is in it: exits, items,
+    players and the name of its world. It is loaded with a single aggregation,
+    so verbs that only need to show the room (Look, Items, Exits, Info) don't have
+    to query each of those collections separately.
+
+    If the world of the room is in the world graph cache, it is built without
+    querying the database. Online players are always taken from the presence
+    registry; offline players are only queried when asked for.
+    """
+    id: typing.Any
+    name: str
+    alias: str
+    description: typing.Optional[str]
+    world_name: typing.Optional[str]
+    exits: typing.List[ExitView]
+    items: typing.List[ItemView]
+    players: typing.List[PlayerView]
+
+    @classmethod
+    def load(cls, room):
+        graph = world_graph_module.cache.for_room(room)
+        if graph is not None and graph.get_room(room.id) is not None:
+            return cls.load_from_graph(graph, room.id)
+
+        pipeline = [
+            {'$match': {'_id': room.id}},
+            {'$lookup': {'from': exit_module.Exit._get_collection_name(), 'localField': '_id', 'foreignField': 'room', 'as': 'exits'}},
+            {'$lookup': {'from': room_module.Room._get_collection_name(), 'localField': 'exits.destination', 'foreignField': '_id', 'as': 'destinations'}},
+            {'$lookup': {'from': item_module.Item._get_collection_name(), 'localField': '_id', 'foreignField': 'room', 'as': 'items'}},
+            {'$lookup': {'from': world_module.World._get_collection_name(), 'localField': 'world_state', 'foreignField': 'world_state', 'as': 'world'}},
+            {'$project': {
+                'name': 1, 'alias': 1, 'description': 1,
+                'exits.name': 1, 'exits.description': 1, 'exits.visible': 1, 'exits.destination': 1,
+                'destinations._id': 1, 'destinations.name': 1, 'destinations.alias': 1,
+                'items.name': 1, 'items.description': 1, 'items.visible': 1,
+                'world.name': 1,
+            }},
+        ]
+        document = next(room_module.Room._get_collection().aggregate(pipeline), None)
+        if document is None:
+            raise room_module.Room.DoesNotExist(f'Room {room.id} not found.')
+
+        destinations = {destination['_id']: destination for destination in document['destinations']}
+        exits = []
+        for exit_document in document['exits']:
+            destination = destinations.get(exit_document['destination'], {})
+            exits.append(ExitView(
+                name=exit_document['name'],
+                description=exit_document.get('description'),
+                visible=exit_document.get('visible', 'listed'),
+                destination_name=destination.get('name'),
+                destination_alias=destination.get('alias'),
+            ))
+
+        items = [
+            ItemView(name=item_document['name'], description=item_document.get('description'), visible=item_document.get('visible', 'listed'))
+            for item_document in document['items']
+        ]
+
+        world_name = document['world'][0]['name'] if document['world'] else None
+
+        return cls(
+            id=document['_id'],
+            name=document['name'],
+            alias=document['alias'],
+            description=document.get('description'),
+            world_name=world_name,
+            exits=exits,
+            items=items,
+            players=cls.load_online_players(document['_id']),
+        )
+
+    @classmethod
+    def load_from_graph(cls, graph, room_id):
+        room = graph.get_room(room_id)
+        exits = [
+            ExitView(
+                name=exit.name,
+                description=exit.description,
+                visible=exit.visible,
+                destination_name=exit.destination.name,
+                destination_alias=exit.destination.alias,
+            )
+            for exit in graph.get_exits(room_id)
+        ]
+        items = [ItemView(name=item.name, description=item.description, visible=item.visible) for item in graph.get_items(room_id)]
+
+        return cls(
+            id=room.id,
+            name=room.name,
+            alias=room.alias,
+            description=room.description,
+            world_name=graph.world.name if graph.world is not None else None,
+            exits=exits,
+            items=items,
+            players=cls.load_online_players(room_id),
+        )
+
+    @staticmethod
+    def load_online_players(room_id):
+        return [
+            PlayerView(id=user.user_id, name=user.name, online=True, master_mode=user.master_mode)
+            for user in presence.registry.in_room(room_id)
+        ]
+
+    def online_players(self):
+        return [player for player in self.players if player.online]
+
+    def offline_players(self):
+        """Offline players are not in the presence registry, so they are queried."""
+        online_ids = [player.id for player in self.online_players()]
+        user_documents = user_module.User._get_collection().find({'room': self.id, '_id': {'$nin': online_ids}}, {'name': 1, 'master_mode': 1})
+        return [
+            PlayerView(id=user_document['_id'], name=user_document['name'], online=False, master_mode=user_document.get('master_mode', False))
+            for user_document in user_documents
+        ]
@@ -4,6 +4,8 @@ from . import location_save as location_save_module
 from . import exceptions
 from .. import util
 from .. import entities
+from .. import presence
+from .. import ownership
 import hashlib
 
 def validate_user_name(name):
@@ -24,6 +26,9 @@ class User(mongoengine.Document):
     joined_worlds = mongoengine.ListField(mongoengine.ReferenceField('World'))
     email = mongoengine.StringField(default=None)
     _password_hash = mongoengine.BinaryField(required=True)
+    session_version = mongoengine.IntField(default=0)  # incremented on each log in, see ownership.py
+
+    meta = {'indexes': ['name', 'room', 'client_id', 'joined_worlds'], 'auto_create_index': False, 'index_background': True}
 
     def __init__(self, *args, password=None, save_on_creation=True,  **kwargs):
         super().__init__(*args, **kwargs)
@@ -31,6 +36,12 @@ class User(mongoengine.Document):
             self._password_hash = self.hash_password(password)
             self.save()
 
+    def save(self, *args, **kwargs):
+        # e.g. joined_worlds.1 when a world is joined
+        changed_fields = {field.split('.')[0] for field in self._get_changed_fields()}
+        super().save(*args, **kwargs)
+        ownership.registry.user_saved(self, changed_fields)
+
     def match_password(self, password):
         hash = self.hash_password(password)
         return self._password_hash == hash
@@ -42,10 +53,12 @@ class User(mongoengine.Document):
         if exit_name in [exit.name for exit in self.room.exits]:
             self.room = self.room.get_exit(exit_name).destination
             self.save()
+            presence.registry.move(self, self.room)
 
     def teleport(self, room):
         self.room = room
         self.save()
+        presence.registry.move(self, room)
 
     def get_location_save(self, world):
         return next(location_save_module.LocationSave.objects(user=self, world=world), None)
@@ -59,6 +72,7 @@ class User(mongoengine.Document):
         if world not in self.joined_worlds:
             self.joined_worlds.append(world)
         self.save()
+        presence.registry.move(self, self.room)
 
     def leave_world(self):
         if self.room is not None:
@@ -70,6 +84,7 @@ class User(mongoengine.Document):
                 location_save_module.LocationSave(user=self, world=self.room.world_state.get_world(), room=self.room)
         self.room = None
         self.save()
+        presence.registry.move(self, None)
 
     def save_item(self, item):
         item_snapshot = item.clone()
@@ -80,20 +95,24 @@ class User(mongoengine.Document):
         return item_snapshot
 
     def connect(self, client_id):
-        self.client_id = client_id
-        self.save()
+        self.modify(client_id=client_id, inc__session_version=1)
+        ownership.registry.user_saved(self, {'client_id', 'session_version'})
+        presence.registry.connect(self, client_id)
 
     def disconnect(self):
         self.client_id = None
         self.save()
+        presence.registry.disconnect(self)
 
     def enter_master_mode(self):
         self.master_mode = True
         self.save()
+        presence.registry.set_master_mode(self, True)
 
     def leave_master_mode(self):
         self.master_mode = False
         self.save()
+        presence.registry.set_master_mode(self, False)
 
     def get_inventory_from(self, world_state):
         inventory = next(inventory_module.Inventory.objects(user=self, world_state=world_state), None)
@@ -103,3 +122,7 @@ class User(mongoengine.Document):
 
     def get_current_world_inventory(self):
         return self.get_inventory_from(self.room.world_state)
+
+    def get_current_world_inventory_index(self):
+        """NameIndex of the items in the inventory of the current world (see name_index)."""
+        return self.room.world_state.get_inventory_index(self)
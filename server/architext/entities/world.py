@@ -1,8 +1,10 @@
 import mongoengine
 from .exceptions import *
-from . import user as user_module
 from . import world_state as world_state_module
+from . import world_graph as world_graph_module
 from .. import util
+from .. import config
+from .. import presence
 
 class World(mongoengine.Document):
     NAME_MAX_LENGTH = 36
@@ -15,6 +17,8 @@ class World(mongoengine.Document):
     creator = mongoengine.ReferenceField('User', required=True)
     public = mongoengine.BooleanField(default=False)
 
+    meta = {'indexes': ['world_state', ('creator', 'public'), 'public', 'snapshots'], 'auto_create_index': False, 'index_background': True}
+
     def __init__(self, *args, starting_room=None, save_on_creation=True, **kwargs):
         super().__init__(*args, **kwargs)
         if self.id is None:
@@ -23,6 +27,11 @@ class World(mongoengine.Document):
             if save_on_creation:
                 self.save()
 
+    def save(self, *args, **kwargs):
+        with world_graph_module.cache.saving(self):
+            super().save(*args, **kwargs)
+        world_graph_module.cache.world_saved(self)
+
     # called by mongoengine just before saving the document
     def clean(self):
         self.name = util.fix_string(self.name, max_length=self.NAME_MAX_LENGTH, remove_breaks=True)
@@ -60,15 +69,14 @@ class World(mongoengine.Document):
         # check for public world limit
         if not self.public:
             number_of_public_worlds = len(World.objects(creator=self.creator, public=True))
-            if number_of_public_worlds >= util.get_config()['public_worlds_limit']:
+            if number_of_public_worlds >= config.config.public_worlds_limit:
                 raise PublicWorldLimitReached()
 
         self.public = not self.public
         self.save()
 
     def get_connected_users(self):
-        users = user_module.User.objects(client_id__ne=None, room__ne=None)
-        return len(list(filter(lambda u: u.room.world_state==self.world_state, users)))
+        return len(presence.registry.in_world_state(world_graph_module.reference_id(self._data.get('world_state'))))
 
     def delete(self):
         for snapshot in self.snapshots:
@@ -0,0 +1,652 @@
+"""In-memory model of the worlds that are being played.
+
+The rooms, exits and items of a world barely change while it is being played,
+but verbs read them all the time. A WorldGraph holds them in memory after the
+first time they are needed, and entities read from it instead of querying the
+database (see Room.items, Room.exits and Room.get_exit).
+
+Entities keep writing to the database as usual when they are saved or deleted.
+Then they notify the cache, which updates the loaded graph of their world (or
+drops it when the change can't be applied in memory) so it never serves stale
+data. When the server runs in several processes, the change is also published
+on the bus, and the other processes drop the graphs it affects.
+
+The instances of a graph are shared by all the sessions in its world, and they
+are not thread safe. Entrypoints that process the messages of several sessions
+at the same time wrap each message in locks.message(), so the thread holds the
+lock of every graph it reads until the message is done (see WorldLocks).
+"""
+import bisect
+import collections
+import contextlib
+import threading
+import bson
+from mongoengine.base import BaseList
+from .. import bus as bus_module
+from .. import name_index
+from . import custom_verb as custom_verb_module
+from . import custom_verb_table as custom_verb_table_module
+from . import exit as exit_module
+from . import inventory as inventory_module
+from . import item as item_module
+from . import name_registry as name_registry_module
+from . import room as room_module
+from . import world as world_module
+from . import world_state as world_state_module
+
+WORLD_CHANGED_TOPIC = 'world_changed'
+
+def reference_id(value):
+    """Returns the id of a reference field value without dereferencing it.
+    The value may be a Document, a DBRef, an ObjectId or None."""
+    return getattr(value, 'id', value)
+
+
+def _set_reference(document, field_name, value):
+    # Sets an already dereferenced value into a document without marking the
+    # field as changed, so the document does not query nor save it again.
+    document._data[field_name] = value
+
+
+def _set_reference_list(document, field_name, values):
+    reference_list = BaseList(values, document, field_name)
+    reference_list._dereferenced = True
+    document._data[field_name] = reference_list
+
+
+class WorldGraph():
+    """Rooms, exits, items and custom verbs of a world state, loaded in memory.
+    References between them point to the instances of the graph, so following
+    them (e.g. exit.destination or item.room) does not query the database."""
+
+    def __init__(self, world_state_id):
+        self.world_state_id = world_state_id
+        self.world_state = None
+        self.world = None
+        self.rooms = {}            # room id: Room
+        self.rooms_by_alias = {}   # room alias: Room
+        self.exits_by_room = {}    # room id: list of Exits, sorted by id
+        self.items_by_room = {}    # room id: list of Items, sorted by id
+        self.saved_items = []      # Items saved in the world state, sorted by id
+        self.carried_items = {}    # item id: Item, for the items in the inventories of the world state
+        self.inventory_item_ids = {}  # inventory id: ids of its items
+        self.inventory_of_user = {}   # user id: id of their inventory in the world state
+        self._item_keys = {}       # item id: (Item, key) of every item of the graph, see _item_key
+        self.custom_verb_ids = set()
+        self._name_indexes = {}    # ('items' or 'exits', room id), ('inventory', user id) or 'saved_items': NameIndex, built when needed
+        self._name_registry = None # NameRegistry, built when needed
+        self._custom_verb_table = None  # CustomVerbTable, built when needed
+
+    def load(self):
+        self.world_state = world_state_module.WorldState.objects(id=self.world_state_id).first()
+        if self.world_state is None:
+            raise world_state_module.WorldState.DoesNotExist(f'WorldState {self.world_state_id} not found.')
+        self.world = world_module.World.objects(world_state=self.world_state_id).first()
+
+        rooms = list(room_module.Room.objects(world_state=self.world_state_id))
+        room_ids = [room.id for room in rooms]
+        exits = list(exit_module.Exit.objects(room__in=room_ids).order_by('id'))
+        items = list(item_module.Item.objects(room__in=room_ids).order_by('id'))
+        self.saved_items = list(item_module.Item.objects(room=None, saved_in=self.world_state_id).order_by('id'))
+        inventories = list(inventory_module.Inventory._get_collection().find({'world_state': self.world_state_id}, {'items': 1, 'user': 1}))
+        self.inventory_item_ids = {inventory['_id']: inventory.get('items', []) for inventory in inventories}
+        self.inventory_of_user = {inventory['user']: inventory['_id'] for inventory in inventories}
+        carried_item_ids = [item_id for item_ids in self.inventory_item_ids.values() for item_id in item_ids]
+        self.carried_items = {item.id: item for item in item_module.Item.objects(id__in=carried_item_ids)}
+
+        # all custom verbs are fetched with a single query
+        entities_with_verbs = [self.world_state] + rooms + items + self.saved_items + list(self.carried_items.values())
+        verb_ids = set(reference_id(verb) for entity in entities_with_verbs for verb in entity._data.get('custom_verbs', []))
+        custom_verbs = {verb.id: verb for verb in custom_verb_module.CustomVerb.objects(id__in=list(verb_ids))}
+        self.custom_verb_ids = set(custom_verbs.keys())
+        for entity in entities_with_verbs:
+            verb_ids_of_entity = [reference_id(verb) for verb in entity._data.get('custom_verbs', [])]
+            _set_reference_list(entity, 'custom_verbs', [custom_verbs[verb_id] for verb_id in verb_ids_of_entity if verb_id in custom_verbs])
+
+        for room in rooms:
+            _set_reference(room, 'world_state', self.world_state)
+            self.rooms[room.id] = room
+            self.rooms_by_alias[room.alias] = room
+            self.exits_by_room[room.id] = []
+            self.items_by_room[room.id] = []
+
+        starting_room = self.rooms.get(reference_id(self.world_state._data.get('starting_room')))
+        if starting_room is not None:
+            _set_reference(self.world_state, 'starting_room', starting_room)
+
+        for exit in exits:
+            self._link_exit(exit)
+            self.exits_by_room[exit.room.id].append(exit)
+
+        for item in items:
+            self._link_item(item)
+            self.items_by_room[item.room.id].append(item)
+
+        for item in items + self.saved_items + list(self.carried_items.values()):
+            self._item_keys[item.id] = (item, self._item_key(item))
+
+    def _link_exit(self, exit):
+        room = self.rooms.get(reference_id(exit._data.get('room')))
+        destination = self.rooms.get(reference_id(exit._data.get('destination')))
+        if room is not None:
+            _set_reference(exit, 'room', room)
+        if destination is not None:
+            _set_reference(exit, 'destination', destination)
+
+    def _link_item(self, item):
+        room = self.rooms.get(reference_id(item._data.get('room')))
+        if room is not None:
+            _set_reference(item, 'room', room)
+
+    @staticmethod
+    def _remove_by_id(entities, entity_id):
+        for index, entity in enumerate(entities):
+            if entity.id == entity_id:
+                del entities[index]
+                return
+
+    @staticmethod
+    def _insert_by_id(entities, entity):
+        # Entities are kept in id order, which is the order the database returns them.
+        ids = [e.id for e in entities]
+        entities.insert(bisect.bisect(ids, entity.id), entity)
+
+    def get_room(self, room_id):
+        return self.rooms.get(room_id)
+
+    def get_room_by_alias(self, alias):
+        return self.rooms_by_alias.get(alias)
+
+    def get_exits(self, room_id):
+        return list(self.exits_by_room.get(room_id, []))
+
+    def get_items(self, room_id):
+        return list(self.items_by_room.get(room_id, []))
+
+    def get_all_items(self):
+        return [item for items in self.items_by_room.values() for item in items]
+
+    def get_all_exits(self):
+        return [exit for exits in self.exits_by_room.values() for exit in exits]
+
+    def get_saved_items(self):
+        return list(self.saved_items)
+
+    def get_items_index(self, room_id):
+        """NameIndex of the items of a room."""
+        return self._get_name_index(('items', room_id), lambda: self.items_by_room.get(room_id, []))
+
+    def get_exits_index(self, room_id):
+        """NameIndex of the exits of a room."""
+        return self._get_name_index(('exits', room_id), lambda: self.exits_by_room.get(room_id, []))
+
+    def get_inventory_index(self, user_id):
+        """NameIndex of the items in the inventory of a user."""
+        def get_items():
+            item_ids = self.inventory_item_ids.get(self.inventory_of_user.get(user_id), [])
+            return [self.carried_items[item_id] for item_id in item_ids if item_id in self.carried_items]
+        return self._get_name_index(('inventory', user_id), get_items)
+
+    def get_saved_items_index(self):
+        """NameIndex of the saved items of the world state, by their item_id."""
+        return self._get_name_index('saved_items', lambda: self.saved_items, key=lambda item: item.item_id or '')
+
+    def _get_name_index(self, index_key, get_entities, key=lambda entity: entity.name):
+        index = self._name_indexes.get(index_key)
+        if index is None:
+            index = name_index.NameIndex(get_entities(), key=key)
+            self._name_indexes[index_key] = index
+        return index
+
+    def get_name_registry(self):
+        """NameRegistry of the items and exits of the world state."""
+        if self._name_registry is None:
+            self._name_registry = name_registry_module.NameRegistry.from_graph(self)
+        return self._name_registry
+
+    def get_custom_verb_table(self):
+        """CustomVerbTable of the world state."""
+        if self._custom_verb_table is None:
+            self._custom_verb_table = custom_verb_table_module.CustomVerbTable.from_graph(self)
+        return self._custom_verb_table
+
+    def _names_changed(self):
+        self._name_indexes.clear()
+        self._name_registry = None
+        self._custom_verb_table = None  # items have been moved
+
+    def update_exit(self, exit):
+        """Puts the saved version of an exit in the graph. Returns False if
+        the change can't be applied."""
+        self.remove_exit(exit)
+        room_id = reference_id(exit._data.get('room'))
+        if room_id not in self.rooms or reference_id(exit._data.get('destination')) not in self.rooms:
+            return False
+        self._link_exit(exit)
+        self._insert_by_id(self.exits_by_room[room_id], exit)
+        return True
+
+    def remove_exit(self, exit):
+        for exits in self.exits_by_room.values():
+            self._remove_by_id(exits, exit.id)
+        self._names_changed()
+
+    def _item_key(self, item):
+        # What the name indexes, the NameRegistry and the CustomVerbTable read
+        # from an item of the graph: where it is, its names and its custom verbs.
+        room_id = reference_id(item._data.get('room'))
+        return (
+            item.id in self.carried_items, room_id if room_id in self.rooms else None, self.is_saved_here(item),
+            item.name, item.item_id, item.visible, tuple(reference_id(verb) for verb in item._data.get('custom_verbs', [])),
+        )
+
+    def _unlist_item(self, item_id):
+        # Removes an item from the room or saved items list it was put in.
+        item, (carried, room_id, saved, *rest) = self._item_keys[item_id]
+        if room_id is not None:
+            self._remove_by_id(self.items_by_room[room_id], item_id)
+        if saved:
+            self._remove_by_id(self.saved_items, item_id)
+
+    def update_item(self, item):
+        """Puts the saved version of an item in the graph. Items that are
+        neither in a room of this world, saved in it nor carried in one of its
+        inventories are removed from it. What is built from the items is only
+        dropped if the item has changed its names, place or custom verbs."""
+        if not self.contains_item(item):
+            self.remove_item(item)
+            return
+        previous = self._item_keys.get(item.id)
+        if previous is not None:
+            self._unlist_item(item.id)
+        room_id = reference_id(item._data.get('room'))
+        if item.id in self.carried_items:
+            self.carried_items[item.id] = item
+        if room_id in self.rooms:
+            self._link_item(item)
+            self._insert_by_id(self.items_by_room[room_id], item)
+        elif self.is_saved_here(item):
+            self._insert_by_id(self.saved_items, item)
+        self.custom_verb_ids.update(reference_id(verb) for verb in item._data.get('custom_verbs', []))
+        key = self._item_key(item)
+        self._item_keys[item.id] = (item, key)
+        if previous is None or previous[0] is not item or previous[1] != key:
+            # the indexes hold the instances of the items, so they are rebuilt for a new instance too
+            self._names_changed()
+
+    def remove_item(self, item):
+        if item.id not in self._item_keys:
+            return
+        self._unlist_item(item.id)
+        self.carried_items.pop(item.id, None)
+        del self._item_keys[item.id]
+        self._names_changed()
+
+    def item_ids(self):
+        return self._item_keys.keys()
+
+    def contains_item_id(self, item_id):
+        return item_id in self._item_keys
+
+    def contains_item(self, item):
+        return reference_id(item._data.get('room')) in self.rooms or self.is_saved_here(item) or item.id in self.carried_items
+
+    def is_saved_here(self, item):
+        return item._data.get('room') is None and reference_id(item._data.get('saved_in')) == self.world_state_id
+
+    def update_inventory(self, inventory):
+        """Updates the carried items with the saved version of an inventory.
+        Returns the ids of the items that it had or has now."""
+        previous_ids = self.inventory_item_ids.pop(inventory.id, [])
+        items = [item for item in inventory.items if isinstance(item, item_module.Item)]
+        item_ids = [item.id for item in items]
+        self.inventory_item_ids[inventory.id] = item_ids
+        self.inventory_of_user[reference_id(inventory._data.get('user'))] = inventory.id
+        removed_ids = set(previous_ids) - set(item_ids)
+        if removed_ids:
+            # an item given to another user is already in the other inventory
+            carried_ids = {item_id for ids in self.inventory_item_ids.values() for item_id in ids}
+            for item_id in removed_ids - carried_ids:
+                item = self.carried_items.pop(item_id, None)
+                if item is not None:
+                    self.update_item(item)  # it may still be in a room, or it is gone from the world
+        for item in items:
+            self.carried_items[item.id] = item
+            self.update_item(item)
+        if item_ids != previous_ids:
+            self._names_changed()  # the inventory index has changed
+        return set(previous_ids) | set(item_ids)
+
+    def track_custom_verbs(self, entity):
+        self.custom_verb_ids.update(reference_id(verb) for verb in entity._data.get('custom_verbs', []))
+        self._custom_verb_table = None
+
+    def add_room(self, room):
+        self.rooms[room.id] = room
+        self.rooms_by_alias[room.alias] = room
+        self.exits_by_room[room.id] = []
+        self.items_by_room[room.id] = []
+        self._names_changed()
+        _set_reference(room, 'world_state', self.world_state)
+        self.track_custom_verbs(room)
+
+
+class WorldLocks():
+    """Locks of the world states, for entrypoints that process messages in
+    several threads (see asyncio_server).
+
+    Inside message(), the first time a thread reads the graph of a world (see
+    WorldGraphCache.get) it waits for the lock of that world, and holds it until
+    the message is done. That includes the messages of the lobby that take the
+    user into a world. Outside of message(), nothing is locked.
+
+    A message only uses the graph of the world it starts in, or of the one it
+    enters, apart from the new world states created by snapshots, that nobody
+    else is in yet. So two threads never wait for each other's locks.
+    """
+
+    def __init__(self):
+        self._locks = {}  # world state id: [Lock, threads holding or waiting for it]
+        self._guard = threading.Lock()
+        self._held = threading.local()  # ids of the world states whose locks the thread holds
+
+    @contextlib.contextmanager
+    def message(self):
+        self._held.world_state_ids = []
+        try:
+            yield
+        finally:
+            for world_state_id in reversed(self._held.world_state_ids):
+                self._release(world_state_id)
+            self._held.world_state_ids = None
+
+    def enter(self, world_state_id):
+        """Takes the lock of the world state, if the thread is processing a
+        message and doesn't hold it already."""
+        held = getattr(self._held, 'world_state_ids', None)
+        if held is None or world_state_id in held:
+            return
+        with self._guard:
+            lock = self._locks.setdefault(world_state_id, [threading.Lock(), 0])
+            lock[1] += 1
+        lock[0].acquire()
+        held.append(world_state_id)
+
+    def _release(self, world_state_id):
+        with self._guard:
+            lock = self._locks[world_state_id]
+            lock[0].release()
+            lock[1] -= 1
+            if lock[1] == 0:
+                del self._locks[world_state_id]
+
+
+class WorldGraphCache():
+    """Keeps the WorldGraphs of the most recently used worlds. When there are
+    more than CAPACITY graphs loaded, the least recently used is evicted."""
+
+    CAPACITY = 64
+
+    def __init__(self, capacity=CAPACITY, bus=None):
+        self.capacity = capacity
+        self._graphs = collections.OrderedDict()  # world state id: WorldGraph
+        self._world_state_of_room = {}  # room id: world state id, for loaded graphs
+        self._world_state_of_item = {}  # item id: world state id, for loaded graphs
+        self._lock = threading.RLock()
+        self.bus = bus
+        if bus is not None:
+            bus.subscribe(WORLD_CHANGED_TOPIC, self._on_changed_elsewhere)
+
+    def get(self, world_state_id):
+        """Returns the graph of a world state, loading it if needed."""
+        # before the lock of the cache, which the thread holding the world's lock may need
+        locks.enter(world_state_id)
+        with self._lock:
+            graph = self._graphs.get(world_state_id)
+            if graph is not None:
+                self._graphs.move_to_end(world_state_id)
+                return graph
+
+            graph = WorldGraph(world_state_id)
+            graph.load()
+            self._graphs[world_state_id] = graph
+            for room_id in graph.rooms:
+                self._world_state_of_room[room_id] = world_state_id
+            for item_id in graph.item_ids():
+                self._world_state_of_item[item_id] = world_state_id
+            while len(self._graphs) > self.capacity:
+                self._evict(next(iter(self._graphs)))
+            return graph
+
+    def get_loaded(self, world_state_id):
+        """Returns the graph of a world state only if it is already loaded."""
+        with self._lock:
+            return self._graphs.get(world_state_id)
+
+    def for_room(self, room):
+        """Returns the graph of the world the room belongs to, or None if the
+        room isn't part of a saved world yet."""
+        if room.id is None:
+            return None
+        world_state_id = self._world_state_of_room.get(room.id)
+        if world_state_id is None:
+            world_state_id = reference_id(room._data.get('world_state'))
+        if world_state_id is None:
+            return None
+        try:
+            return self.get(world_state_id)
+        except world_state_module.WorldState.DoesNotExist:
+            return None
+
+    def current_room(self, room_id):
+        """Returns the graph instance of a room given its id, loading its
+        world if needed. Returns None if the room doesn't exist."""
+        world_state_id = self._world_state_of_room.get(room_id)
+        if world_state_id is None:
+            room = room_module.Room.objects(id=room_id).first()
+            if room is None:
+                return None
+            graph = self.for_room(room)
+            return graph.get_room(room_id) if graph is not None else room
+        return self.get(world_state_id).get_room(room_id)
+
+    def attach(self, user):
+        """Points user.room to the graph instance of the room, so the verbs
+        processing the user's messages read the cached world."""
+        room_id = reference_id(user._data.get('room'))
+        if room_id is not None:
+            room = self.current_room(room_id)
+            if room is not None:
+                user._data['room'] = room
+
+    def invalidate(self, world_state_id):
+        with self._lock:
+            if world_state_id in self._graphs:
+                self._evict(world_state_id)
+
+    def clear(self):
+        with self._lock:
+            self._graphs.clear()
+            self._world_state_of_room.clear()
+            self._world_state_of_item.clear()
+
+    def _evict(self, world_state_id):
+        graph = self._graphs.pop(world_state_id)
+        for room_id in graph.rooms:
+            self._world_state_of_room.pop(room_id, None)
+        for item_id in graph.item_ids():
+            if self._world_state_of_item.get(item_id) == world_state_id:
+                del self._world_state_of_item[item_id]
+
+    def _loaded_graph_of_room_id(self, room_id):
+        world_state_id = self._world_state_of_room.get(room_id)
+        return self._graphs.get(world_state_id) if world_state_id is not None else None
+
+    def _loaded_graphs_of_item(self, item):
+        # the graph the item was in, and the one of the room or world state it is now in
+        world_state_ids = [
+            self._world_state_of_item.get(item.id),
+            self._world_state_of_room.get(reference_id(item._data.get('room'))),
+            reference_id(item._data.get('saved_in')),
+        ]
+        graphs = [self._graphs.get(world_state_id) for world_state_id in dict.fromkeys(world_state_ids) if world_state_id is not None]
+        return [graph for graph in graphs if graph is not None]
+
+    def _loaded_graph_of(self, entity):
+        # the loaded graph that may hold an instance of the entity
+        if isinstance(entity, room_module.Room):
+            return self._loaded_graph_of_room_id(entity.id)
+        if isinstance(entity, exit_module.Exit):
+            return self._loaded_graph_of_room_id(reference_id(entity._data.get('room')))
+        if isinstance(entity, item_module.Item):
+            return self._graphs.get(self._world_state_of_item.get(entity.id))
+        if isinstance(entity, world_state_module.WorldState):
+            return self._graphs.get(entity.id)
+        if isinstance(entity, world_module.World):
+            return self._graphs.get(reference_id(entity._data.get('world_state')))
+        return None
+
+    def _track_item(self, graph, item_id):
+        if graph.contains_item_id(item_id):
+            self._world_state_of_item[item_id] = graph.world_state_id
+        elif self._world_state_of_item.get(item_id) == graph.world_state_id:
+            del self._world_state_of_item[item_id]
+
+    def _tell_others(self, world_state_ids=(), world_ids=(), room_ids=(), item_ids=(), custom_verb_ids=()):
+        """Publishes a change to the other processes of the server (see _on_changed_elsewhere)."""
+        if self.bus is None:
+            return
+        change = {'world_state_ids': world_state_ids, 'world_ids': world_ids, 'room_ids': room_ids, 'item_ids': item_ids, 'custom_verb_ids': custom_verb_ids}
+        self.bus.publish_to_others(WORLD_CHANGED_TOPIC, {key: [str(entity_id) for entity_id in ids if entity_id is not None] for key, ids in change.items()})
+
+    def _on_changed_elsewhere(self, payload):
+        # the change has been made through other instances of the entities, so the graphs it affects are dropped
+        change = {key: set(bson.ObjectId(entity_id) for entity_id in ids) for key, ids in payload.items()}
+        with self._lock:
+            for graph in list(self._graphs.values()):
+                if (
+                    graph.world_state_id in change['world_state_ids']
+                    or (graph.world is not None and graph.world.id in change['world_ids'])
+                    or any(room_id in graph.rooms for room_id in change['room_ids'])
+                    or any(graph.contains_item_id(item_id) for item_id in change['item_ids'])
+                    or graph.custom_verb_ids & change['custom_verb_ids']
+                ):
+                    self.invalidate(graph.world_state_id)
+
+    @contextlib.contextmanager
+    def saving(self, entity):
+        """Wraps the validation and save of an entity. If they fail, the graph
+        that may hold the instance is dropped, since the instance may have been
+        changed in memory already (e.g. given a name that is rejected), and the
+        graph can't keep changes that are not in the database."""
+        try:
+            yield
+        except Exception:
+            with self._lock:
+                graph = self._loaded_graph_of(entity)
+                if graph is not None:
+                    self.invalidate(graph.world_state_id)
+            raise
+
+    # Write-through notifications, called by the entities after saving or deleting.
+
+    def room_saved(self, room):
+        with self._lock:
+            graph = self._loaded_graph_of_room_id(room.id)
+            if graph is not None:
+                if graph.get_room(room.id) is not room:
+                    # another instance of the room has changed: reload the world when needed
+                    self.invalidate(graph.world_state_id)
+                else:
+                    graph.rooms_by_alias[room.alias] = room
+                    graph.track_custom_verbs(room)
+            else:
+                graph = self.get_loaded(reference_id(room._data.get('world_state')))
+                if graph is not None:
+                    graph.add_room(room)
+                    self._world_state_of_room[room.id] = graph.world_state_id
+        self._tell_others(world_state_ids=[reference_id(room._data.get('world_state'))], room_ids=[room.id])
+
+    def room_deleted(self, room):
+        # deleting a room cascades to its items and exits, and to the exits leading to it
+        with self._lock:
+            graph = self._loaded_graph_of_room_id(room.id)
+            if graph is not None:
+                self.invalidate(graph.world_state_id)
+        self._tell_others(world_state_ids=[reference_id(room._data.get('world_state'))], room_ids=[room.id])
+
+    def exit_saved(self, exit):
+        with self._lock:
+            graph = self._loaded_graph_of_room_id(reference_id(exit._data.get('room')))
+            if graph is None:
+                graph = self._loaded_graph_of_room_id(reference_id(exit._data.get('destination')))
+            if graph is not None and not graph.update_exit(exit):
+                self.invalidate(graph.world_state_id)
+        self._tell_others(room_ids=[reference_id(exit._data.get('room')), reference_id(exit._data.get('destination'))])
+
+    def exit_deleted(self, exit):
+        with self._lock:
+            graph = self._loaded_graph_of_room_id(reference_id(exit._data.get('room')))
+            if graph is not None:
+                graph.remove_exit(exit)
+        self._tell_others(room_ids=[reference_id(exit._data.get('room')), reference_id(exit._data.get('destination'))])
+
+    def item_saved(self, item):
+        with self._lock:
+            for graph in self._loaded_graphs_of_item(item):
+                graph.update_item(item)
+                self._track_item(graph, item.id)
+        self._tell_others(world_state_ids=[reference_id(item._data.get('saved_in'))], room_ids=[reference_id(item._data.get('room'))], item_ids=[item.id])
+
+    def item_deleted(self, item):
+        with self._lock:
+            for graph in self._loaded_graphs_of_item(item):
+                graph.remove_item(item)
+                self._track_item(graph, item.id)
+        self._tell_others(world_state_ids=[reference_id(item._data.get('saved_in'))], room_ids=[reference_id(item._data.get('room'))], item_ids=[item.id])
+
+    def inventory_saved(self, inventory):
+        with self._lock:
+            graph = self.get_loaded(reference_id(inventory._data.get('world_state')))
+            if graph is not None:
+                for item_id in graph.update_inventory(inventory):
+                    self._track_item(graph, item_id)
+        self._tell_others(world_state_ids=[reference_id(inventory._data.get('world_state'))])
+
+    def world_state_saved(self, world_state):
+        with self._lock:
+            graph = self.get_loaded(world_state.id)
+            if graph is not None:
+                if graph.world_state is not world_state:
+                    self.invalidate(world_state.id)
+                else:
+                    graph.track_custom_verbs(world_state)
+        self._tell_others(world_state_ids=[world_state.id])
+
+    def world_state_deleted(self, world_state):
+        self.invalidate(world_state.id)
+        self._tell_others(world_state_ids=[world_state.id])
+
+    def world_saved(self, world):
+        with self._lock:
+            graph = self.get_loaded(reference_id(world._data.get('world_state')))
+            if graph is not None:
+                graph.world = world
+            # the world may have been pointed to another world state (e.g. deploying a snapshot)
+            for other_graph in list(self._graphs.values()):
+                if other_graph is not graph and other_graph.world is not None and other_graph.world.id == world.id:
+                    self.invalidate(other_graph.world_state_id)
+        self._tell_others(world_state_ids=[reference_id(world._data.get('world_state'))], world_ids=[world.id])
+
+    def custom_verb_deleted(self, custom_verb):
+        # the verb is pulled from its rooms, items and world states in the database
+        with self._lock:
+            for graph in list(self._graphs.values()):
+                if custom_verb.id in graph.custom_verb_ids:
+                    self.invalidate(graph.world_state_id)
+        self._tell_others(custom_verb_ids=[custom_verb.id])
+
+
+# Locks and cache shared by the whole process.
+locks = WorldLocks()
+cache = WorldGraphCache(bus=bus_module.bus)
@@ -0,0 +1,78 @@
+import dataclasses
+import typing
+from . import user as user_module
+from . import world as world_module
+from .. import presence
+
+@dataclasses.dataclass
+class WorldListEntry():
+    id: typing.Any
+    name: str
+    creator_name: typing.Optional[str]
+    public: bool
+    connected_users: int
+
+@dataclasses.dataclass
+class WorldList():
+    """Page of the worlds shown to a user at the lobby: public worlds, the worlds
+    created by the user and the worlds they have joined.
+
+    Worlds are filtered, sorted and paginated by the database, and the names of
+    their creators are loaded in the same aggregation. The number of connected
+    users of each world is taken from the presence registry.
+
+    Entries are numbered from 0 across pages, in the order worlds were created.
+    """
+    PAGE_SIZE = 50
+
+    first_index: int
+    total: int
+    entries: typing.List[WorldListEntry]
+
+    @staticmethod
+    def visibility_filter(user):
+        return {'$or': [
+            {'public': True},
+            {'creator': user.id},
+            {'_id': {'$in': [world.id for world in user._data.get('joined_worlds', [])]}},
+        ]}
+
+    @classmethod
+    def load(cls, user, first_index=0, page_size=None):
+        page_size = page_size if page_size is not None else cls.PAGE_SIZE
+        collection = world_module.World._get_collection()
+        visibility_filter = cls.visibility_filter(user)
+        pipeline = [
+            {'$match': visibility_filter},
+            {'$sort': {'_id': 1}},
+            {'$skip': first_index},
+            {'$limit': page_size},
+            {'$lookup': {'from': user_module.User._get_collection_name(), 'localField': 'creator', 'foreignField': '_id', 'as': 'creator'}},
+            {'$project': {'name': 1, 'public': 1, 'world_state': 1, 'creator.name': 1}},
+        ]
+        world_documents = list(collection.aggregate(pipeline))
+
+        entries = [
+            WorldListEntry(
+                id=world_document['_id'],
+                name=world_document['name'],
+                creator_name=world_document['creator'][0]['name'] if world_document['creator'] else None,
+                public=world_document.get('public', False),
+                connected_users=len(presence.registry.in_world_state(world_document['world_state'])),
+            )
+            for world_document in world_documents
+        ]
+
+        return cls(first_index=first_index, total=collection.count_documents(visibility_filter), entries=entries)
+
+    def get(self, index):
+        """Returns the entry with the given index, or None if it is not in this page."""
+        if self.first_index <= index < self.first_index + len(self.entries):
+            return self.entries[index - self.first_index]
+        return None
+
+    def has_next_page(self):
+        return self.first_index + len(self.entries) < self.total
+
+    def has_previous_page(self):
+        return self.first_index > 0
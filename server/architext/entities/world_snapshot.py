@@ -9,6 +9,8 @@ class WorldSnapshot(mongoengine.Document):
     public = mongoengine.BooleanField(default=False)
     snapshoted_state = mongoengine.ReferenceField('WorldState', required=True)
 
+    meta = {'indexes': ['public'], 'auto_create_index': False, 'index_background': True}
+
     def __init__(self, *args, save_on_creation=True, **kwargs):
         super().__init__(*args, **kwargs)
         if self.id is None and save_on_creation:
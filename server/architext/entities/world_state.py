@@ -1,8 +1,13 @@
+import bson
 import mongoengine
+from . import custom_verb as custom_verb_module
+from . import exit as exit_module
 from . import inventory as inventory_module
 from . import item as item_module
 from . import room as room_module
 from . import world as world_module
+from . import world_graph as world_graph_module
+from .. import name_index
 
 class WorldState(mongoengine.Document):
     starting_room = mongoengine.ReferenceField('Room', required=True)
@@ -20,11 +25,38 @@ class WorldState(mongoengine.Document):
                 self.starting_room.world_state = self
                 self.starting_room.save()
 
+    def save(self, *args, **kwargs):
+        with world_graph_module.cache.saving(self):
+            super().save(*args, **kwargs)
+        world_graph_module.cache.world_state_saved(self)
+
     def get_unique_room_id(self):
-        id_to_serve = str(self._next_room_id)
-        self._next_room_id = self._next_room_id + 1
-        self.save()
-        return id_to_serve
+        if self.id is None:
+            id_to_serve = str(self._next_room_id)
+            self._next_room_id = self._next_room_id + 1
+            self.save()
+            return id_to_serve
+        # incremented atomically, so other instances of this world state can't serve the same id
+        self.modify(inc___next_room_id=1)
+        return str(self._next_room_id - 1)
+
+    def get_room_by_alias(self, alias):
+        if self.id is not None:
+            graph = world_graph_module.cache.get(self.id)
+            return graph.get_room_by_alias(alias)
+        return next(room_module.Room.objects(world_state=self, alias=alias), None)
+
+    def get_saved_items_index(self):
+        """NameIndex of the items saved in this world state, by their item_id."""
+        if self.id is not None:
+            return world_graph_module.cache.get(self.id).get_saved_items_index()
+        return name_index.NameIndex(item_module.Item.objects(room=None, saved_in=self), key=lambda item: item.item_id or '')
+
+    def get_inventory_index(self, user):
+        """NameIndex of the items in the inventory of a user in this world state."""
+        if self.id is not None:
+            return world_graph_module.cache.get(self.id).get_inventory_index(user.id)
+        return name_index.NameIndex(user.get_inventory_from(self).items)
 
     def get_world(self):
         return next(world_module.World.objects(world_state=self))
@@ -34,35 +66,101 @@ class WorldState(mongoengine.Document):
         self.save()
 
     def clone(self):
-        new_world_state = WorldState(_next_room_id=self._next_room_id, save_on_creation=False)
-
-        new_world_state.starting_room = self.starting_room.clone()
-        new_world_state.save()
-        new_world_state.starting_room.world_state = new_world_state
-        new_world_state.starting_room.save()
-
-        for custom_verb in self.custom_verbs:
-            new_world_state.custom_verbs.append(custom_verb.clone())
-
-        for room in room_module.Room.objects(world_state=self, alias__ne=self.starting_room.alias):
-            room.clone(new_world_state=new_world_state)
-
-        cloned_rooms = room_module.Room.objects(world_state=new_world_state)
-        exits_to_clone = [exit_to_clone for room in room_module.Room.objects(world_state=self) for exit_to_clone in room.exits]
-        for exit in exits_to_clone:
-            new_exit_location = next(filter(lambda r: r.alias==exit.room.alias, cloned_rooms))
-            new_exit_destination = next(filter(lambda r: r.alias==exit.destination.alias, cloned_rooms))
-            exit.clone(new_destination=new_exit_destination, new_room=new_exit_location)
-
-        for inventory in inventory_module.Inventory.objects(world_state=self):
-            inventory.clone(new_world_state=new_world_state)
-
-        saved_items = item_module.Item.objects(saved_in=self)
-        for saved_item in saved_items:
-            cloned_item = saved_item.clone(new_item_id=saved_item.item_id, new_saved_in=new_world_state)
-
-        new_world_state.save()
-        return new_world_state
+        """Returns a copy of this world state, with copies of all its rooms, exits,
+        items (in rooms, in inventories and saved), inventories and custom verbs.
+
+        The world state is read with a few queries, references are remapped
+        in memory and the copies are written with one insert_many per collection,
+        in dependency order.
+        """
+        world_state_collection = WorldState._get_collection()
+        room_collection = room_module.Room._get_collection()
+        exit_collection = exit_module.Exit._get_collection()
+        item_collection = item_module.Item._get_collection()
+        inventory_collection = inventory_module.Inventory._get_collection()
+        custom_verb_collection = custom_verb_module.CustomVerb._get_collection()
+
+        # read the source world state
+        world_state_document = world_state_collection.find_one({'_id': self.id})
+        rooms = list(room_collection.find({'world_state': self.id}))
+        room_ids = [room['_id'] for room in rooms]
+        exits = list(exit_collection.find({'room': {'$in': room_ids}}))
+        room_items = list(item_collection.find({'room': {'$in': room_ids}}))
+        inventories = list(inventory_collection.find({'world_state': self.id}))
+        carried_item_ids = [item_id for inventory in inventories for item_id in inventory.get('items', [])]
+        carried_items = {item['_id']: item for item in item_collection.find({'_id': {'$in': carried_item_ids}})}
+        saved_items = list(item_collection.find({'saved_in': self.id}))
+
+        documents_with_verbs = [world_state_document] + rooms + room_items + list(carried_items.values()) + saved_items
+        verb_ids = set(verb_id for document in documents_with_verbs for verb_id in document.get('custom_verbs', []))
+        custom_verbs = {verb['_id']: verb for verb in custom_verb_collection.find({'_id': {'$in': list(verb_ids)}})}
+
+        # build the copies
+        new_custom_verbs = []
+        def clone_custom_verbs(document):
+            # each entity gets its own copy of its verbs
+            new_verb_ids = []
+            for verb_id in document.get('custom_verbs', []):
+                if verb_id in custom_verbs:
+                    new_verb = {**custom_verbs[verb_id], '_id': bson.ObjectId()}
+                    new_custom_verbs.append(new_verb)
+                    new_verb_ids.append(new_verb['_id'])
+            return new_verb_ids
+
+        new_world_state_id = bson.ObjectId()
+        new_room_ids = {room['_id']: bson.ObjectId() for room in rooms}  # old room id: new room id
+
+        new_rooms = [
+            {**room, '_id': new_room_ids[room['_id']], 'world_state': new_world_state_id, 'custom_verbs': clone_custom_verbs(room)}
+            for room in rooms
+        ]
+
+        new_world_state = {
+            **world_state_document,
+            '_id': new_world_state_id,
+            'starting_room': new_room_ids[world_state_document['starting_room']],
+            'custom_verbs': clone_custom_verbs(world_state_document),
+        }
+
+        new_exits = [
+            {**exit, '_id': bson.ObjectId(), 'room': new_room_ids[exit['room']], 'destination': new_room_ids[exit['destination']]}
+            for exit in exits
+            if exit['destination'] in new_room_ids
+        ]
+
+        def clone_item(item, room=None, saved_in=None, item_id=None):
+            new_item = {**item, '_id': bson.ObjectId(), 'room': room, 'saved_in': saved_in, 'item_id': item_id, 'custom_verbs': clone_custom_verbs(item)}
+            # unset fields are not stored, as mongoengine does
+            return {key: value for key, value in new_item.items() if value is not None}
+
+        new_items = [clone_item(item, room=new_room_ids[item['room']]) for item in room_items]
+
+        new_inventories = []
+        for inventory in inventories:
+            new_inventory_items = [clone_item(carried_items[item_id]) for item_id in inventory.get('items', []) if item_id in carried_items]
+            new_items += new_inventory_items
+            new_inventories.append({
+                **inventory,
+                '_id': bson.ObjectId(),
+                'world_state': new_world_state_id,
+                'items': [item['_id'] for item in new_inventory_items]
+            })
+
+        new_items += [clone_item(item, saved_in=new_world_state_id, item_id=item.get('item_id')) for item in saved_items]
+
+        # write them, each document after the ones it references
+        for collection, documents in [
+            (custom_verb_collection, new_custom_verbs),
+            (room_collection, new_rooms),
+            (world_state_collection, [new_world_state]),
+            (exit_collection, new_exits),
+            (item_collection, new_items),
+            (inventory_collection, new_inventories),
+        ]:
+            if documents:
+                collection.insert_many(documents)
+
+        return WorldState.objects.get(id=new_world_state_id)
 
     def get_rooms(self):
         return room_module.Room.objects(world_state=self)
@@ -70,4 +168,5 @@ class WorldState(mongoengine.Document):
     def delete(self):
         for custom_verb in self.custom_verbs:
             custom_verb.delete()
-        super().delete()
\ No newline at end of file
+        super().delete()
+        world_graph_module.cache.world_state_deleted(self)
\ No newline at end of file
@@ -0,0 +1,196 @@
+"""Socket.IO server running on asyncio, an alternative to socketio_server.
+
+Database access is blocking, so sessions don't process messages in the event
+loop: each message is processed in a bounded pool of worker threads, while
+the event loop keeps handling the connections of every other player. The
+messages of each session are still processed one at a time and in order.
+
+Sessions in the same world share the instances of its cached graph (see
+entities.world_graph), which are not thread safe, so messages are also
+serialized by world state: only sessions in different worlds process messages
+at the same time. The messages of sessions in a world wait for each other in
+the event loop, so they don't take up the threads. Then, in the thread, each
+message holds the lock of every graph it reads (see world_graph.WorldLocks),
+which also covers the messages of the lobby that enter a world, or logging in
+to a user that is in one.
+
+Users left connected in the database by a previous run are only disconnected
+with -c, since the database may be shared with another server. To run both
+entrypoints side by side, e.g. to benchmark them, start socketio_server first,
+as it always disconnects everyone, and then this one without -c, listening at
+another port (-p).
+"""
+import asyncio
+import concurrent.futures
+import contextlib
+import json
+import os
+import signal
+import typing
+from aiohttp import web
+import socketio
+from dotenv import load_dotenv
+import architext
+import architext.metrics
+import architext.presence
+from architext.session import Session
+from architext.adapters.sender import AsyncBatchingSocketIOSender
+from architext.entrypoints.socketio.server_setup import database_connect, client_ids_cleanup, register_gauges, METRICS_PATH
+
+PORT = 5000
+THREADS = 8  # sessions processing a message at the same time
+
+
+class KeyedLocks():
+    """asyncio locks created on demand for each key, and forgotten once nobody
+    holds them or waits for them. The None key is never locked."""
+
+    def __init__(self):
+        self._locks: typing.Dict[typing.Any, asyncio.Lock] = {}
+        self._users: typing.Dict[typing.Any, int] = {}  # key: tasks holding or waiting for its lock
+
+    @contextlib.asynccontextmanager
+    async def hold(self, key):
+        if key is None:
+            yield
+            return
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        self._users[key] = self._users.get(key, 0) + 1
+        try:
+            async with lock:
+                yield
+        finally:
+            self._users[key] -= 1
+            if self._users[key] == 0:
+                del self._users[key]
+                del self._locks[key]
+
+
+def world_state_of(session):
+    """Id of the world state whose graph the messages of the session use. None
+    at the lobby, or before logging in."""
+    if session.user is None:
+        return None
+    user_presence = architext.presence.registry.get(session.user.id)
+    return user_presence.world_state_id if user_presence is not None else None
+
+
+def create_app(logger, allowed_origins, threads=THREADS):
+    """Returns the aiohttp application serving the Socket.IO server."""
+    sio = socketio.AsyncServer(async_mode='aiohttp', cors_allowed_origins=allowed_origins)
+    app = web.Application()
+    sio.attach(app)
+
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=threads, thread_name_prefix='session')
+    sessions: typing.Dict[str, Session] = {}
+    session_locks: typing.Dict[str, asyncio.Lock] = {}  # the messages of a session wait here for the previous ones
+    world_state_locks = KeyedLocks()  # and then for the messages of other sessions in the same world
+    sender = None  # created once the event loop is running
+
+    async def run_in_worker_thread(function, *args):
+        return await asyncio.get_running_loop().run_in_executor(executor, function, *args)
+
+    def process_message(session, data):
+        try:
+            with architext.entities.world_graph.locks.message():
+                session.process_message(data)
+        finally:
+            sender.flush()
+
+    def end_session(session):
+        with architext.entities.world_graph.locks.message():
+            session.disconnect()
+        sender.flush()
+
+    async def on_startup(app):
+        nonlocal sender
+        # Shared by all sessions, so the messages sent to each client keep their order.
+        sender = AsyncBatchingSocketIOSender(sio=sio, loop=asyncio.get_running_loop())
+        register_gauges(sessions, sender)
+        # config.yml is reloaded when it changes, or right away on SIGHUP
+        asyncio.get_running_loop().add_signal_handler(signal.SIGHUP, architext.config.config.reload)
+        # Missing indexes are built while the server is already serving
+        asyncio.get_running_loop().run_in_executor(executor, architext.entities.indexes.check, logger)
+
+    async def on_cleanup(app):
+        executor.shutdown(wait=True)
+        logger.info('server stopped')
+
+    async def serve_metrics(request):
+        return web.Response(text=architext.metrics.registry.render(), content_type='text/plain', charset='utf-8')
+
+    app.router.add_get(METRICS_PATH, serve_metrics)
+    app.on_startup.append(on_startup)
+    app.on_cleanup.append(on_cleanup)
+
+    # Each handler holds the lock of its session while it runs. asyncio.Lock
+    # wakes up its waiters in order, so messages are processed in order.
+    # Handlers that process a message, or end a session, also hold the lock of
+    # the world state the user is in. The session lock is always taken first.
+
+    @sio.event
+    async def connect(sid, environ):
+        session_locks[sid] = asyncio.Lock()
+        async with session_locks[sid]:
+            # creating a session sends the log in banner, so it is done in a worker thread too
+            sessions[sid] = await run_in_worker_thread(Session, sid, sender)
+            sender.flush()
+        logger.info(f'New connection, client_id {sid}')
+
+    @sio.event
+    async def message(sid, data):
+        if sid not in session_locks:
+            return
+        async with session_locks[sid]:
+            if sid in sessions:
+                session = sessions[sid]
+                if session.client_id is None:  # the session has disconnected by itself
+                    sessions.pop(sid)
+                else:
+                    async with world_state_locks.hold(world_state_of(session)):
+                        await run_in_worker_thread(process_message, session, data)
+
+    @sio.event
+    async def disconnect(sid, reason=None):
+        if sid not in session_locks:
+            return
+        async with session_locks[sid]:
+            if sid in sessions:
+                ended_session = sessions.pop(sid)
+                if ended_session.user:
+                    logger.info(f'{ended_session.user.name} has disconnected.')
+                else:
+                    logger.info(f'Disconnected before login: client_id {sid}')
+                async with world_state_locks.hold(world_state_of(ended_session)):
+                    await run_in_worker_thread(end_session, ended_session)
+        session_locks.pop(sid, None)
+
+    return app
+
+
+if __name__ == "__main__":
+    # Server setup starts here
+    import sys, getopt
+
+    load_dotenv()
+
+    # Sets up logger for main server logs
+    logger = architext.util.setup_logger('server_logger', 'server.txt', console=True)
+
+    # Process commmand line args
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], "d:p:t:c")
+    except getopt.GetoptError:
+        print("Usage: python -m architext.entrypoints.socketio.asyncio_server [-d mongo_db_database_uri] [-p port] [-t threads] [-c]\nIf you don't specify an URI, will try to connect to default docker-compose db.\n-p is the port to listen at, 5000 by default.\n-t is the number of messages processed at the same time, 8 by default.\n-c disconnects the users left connected in the database, e.g. if the server has crashed. Don't use it if another server is using the database.")
+        sys.exit(2)
+    options = dict(opts)
+
+    database_connect(options.get('-d'))
+
+    # Ensure there isn't any connected players at this point, if no other server uses the database.
+    if '-c' in options:
+        client_ids_cleanup()
+
+    allowed = json.loads(os.environ['ALLOWED_ORIGINS'])
+    app = create_app(logger, allowed, threads=int(options.get('-t', THREADS)))
+    web.run_app(app, port=int(options.get('-p', PORT)))
@@ -0,0 +1,46 @@
+"""Setup shared by the socketio entrypoints (socketio_server and asyncio_server)."""
+import os
+import mongoengine
+import architext
+import architext.presence
+import architext.logs
+import architext.metrics
+import architext.query_tracing
+
+METRICS_PATH = '/metrics'
+
+def database_connect(uri=None):
+    """Connects to the mongodb database specified in docker-compose file,
+    or a custom provided URI. Commands are traced (see query_tracing).
+    """
+    if uri:
+        mongoengine.connect(host=uri, event_listeners=[architext.query_tracing.tracer])
+    else:
+        database = os.getenv('DATABASE', default='architext')
+        host     = host=os.environ['DB_HOST']
+        mongoengine.connect(database, host=host, event_listeners=[architext.query_tracing.tracer])
+
+def client_ids_cleanup():
+    """Cleans client connection id in the database, disconnecting everyone.
+    """
+    for user in architext.entities.User.objects(client_id__ne=None):
+        user.disconnect()
+    architext.presence.registry.clear()
+
+def register_gauges(sessions, sender):
+    """Exposes the sessions and the sender of the entrypoint in the metrics."""
+    registry = architext.metrics.registry
+    registry.register_gauge('architext_active_sessions', 'Sessions of clients connected to this process.', lambda: len(sessions))
+    registry.register_gauge('architext_sender_queued_messages', 'Messages waiting to be emitted to the clients.', sender.queued_messages)
+    registry.register_gauge('architext_sender_dropped_messages', 'Messages dropped because their client was too slow, since the server started.', lambda: sender.dropped_messages)
+    registry.register_gauge('architext_log_dropped_records', 'Log records dropped because the log queue was full, since the server started.', lambda: architext.logs.pipeline.dropped_records)
+
+def metrics_wsgi_app(environ, start_response):
+    """WSGI application serving the metrics at METRICS_PATH, in the Prometheus
+    text format. The Socket.IO application passes it every other request."""
+    if environ.get('PATH_INFO') != METRICS_PATH:
+        start_response('404 Not Found', [('Content-Type', 'text/plain')])
+        return [b'Not Found']
+    body = architext.metrics.registry.render().encode('utf-8')
+    start_response('200 OK', [('Content-Type', 'text/plain; version=0.0.4; charset=utf-8'), ('Content-Length', str(len(body)))])
+    return [body]
@@ -2,31 +2,50 @@ import eventlet
 eventlet.monkey_patch(socket=True, time=True)
 import socketio
 from architext.session import Session
-from architext.adapters.sender import SocketIOSender
+import architext.presence
+import architext.bus
+import architext.logs
+from architext.adapters.sender import BatchingSocketIOSender
+from architext.adapters import message_queue
+from architext.entrypoints.socketio.server_setup import database_connect, client_ids_cleanup, register_gauges, metrics_wsgi_app
 import typing
 import architext
-import mongoengine
 import atexit
 import os
 import json
+import signal
+import subprocess
 from dotenv import load_dotenv
 
-def database_connect(uri=None):
-    """Connects to the mongodb database specified in docker-compose file,
-    or a custom provided URI.
-    """
-    if uri:
-        mongoengine.connect(host=uri)
-    else:
-        database = os.getenv('DATABASE', default='architext')
-        host     = host=os.environ['DB_HOST']
-        mongoengine.connect(database, host=host)
+PORT = 5000  # workers listen at consecutive ports, starting at this one
 
-def client_ids_cleanup():
-    """Cleans client connection id in the database, disconnecting everyone.
+def run_workers(count, worker_args, logger):
+    """Runs count server processes, listening at consecutive ports, and waits
+    for them. They must share a message queue (see adapters.message_queue).
+    If any of them stops, the others are stopped too, so that the whole server
+    is restarted and no worker keeps players connected to a dead one.
+    Returns the exit code of the first worker that stopped.
     """
-    for user in architext.entities.User.objects(client_id__ne=None):
-        user.disconnect()
+    workers = [
+        subprocess.Popen([sys.executable, '-m', 'architext.entrypoints.socketio.socketio_server', *worker_args, f'--worker-port={PORT + index}'])
+        for index in range(count)
+    ]
+    logger.info(f'Started {count} workers, listening at ports {PORT} to {PORT + count - 1}.')
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    # each worker reloads its configuration
+    signal.signal(signal.SIGHUP, lambda signum, frame: [worker.send_signal(signal.SIGHUP) for worker in workers if worker.poll() is None])
+    exit_code = 0
+    try:
+        pid, status = os.wait()
+        exit_code = os.waitstatus_to_exitcode(status)
+        logger.warning(f'Worker {pid} stopped with exit code {exit_code}, stopping the server.')
+    finally:
+        for worker in workers:
+            if worker.poll() is None:
+                worker.terminate()
+        for worker in workers:
+            worker.wait()
+    return exit_code
 
 if __name__ == "__main__":
     # Server setup starts here
@@ -36,16 +55,22 @@ if __name__ == "__main__":
 
     connected_to_db = False
     
-    # Sets up logger for main server logs
-    logger = architext.util.setup_logger('server_logger', 'server.txt', console=True)
-
     # Process commmand line args
     command_line_args = sys.argv[1:]
     try:
-       opts, args = getopt.getopt(command_line_args,"d:")
+       opts, args = getopt.getopt(command_line_args,"d:iw:", ["worker-port="])
     except getopt.GetoptError:
-        print("Usage: python server.py [-d mongo_db_database_uri]\nIf you don't specify an URI, will try to connect to default docker-compose db.")
+        print("Usage: python server.py [-d mongo_db_database_uri] [-i] [-w number_of_workers]\nIf you don't specify an URI, will try to connect to default docker-compose db.\n-i builds the missing indexes, reports the queries that scan whole collections and exits.\n-w runs that many server processes, listening at consecutive ports from 5000. They share the message queue at the MESSAGE_QUEUE environment variable (e.g. redis://host:6379/0).")
         sys.exit(2)
+    options = dict(opts)
+    message_queue_url = os.getenv('MESSAGE_QUEUE')
+    message_queue_channel = os.getenv('MESSAGE_QUEUE_CHANNEL', default='architext')  # servers sharing a message queue must use different channels
+    worker_port = int(options['--worker-port']) if '--worker-port' in options else None  # set when started by run_workers
+
+    # Sets up logger for main server logs. Each worker rotates its own files.
+    if worker_port is not None:
+        architext.logs.pipeline.directory = os.path.join(architext.logs.LOGS_DIRECTORY, f'worker_{worker_port}')
+    logger = architext.util.setup_logger('server_logger', 'server.txt', console=True)
     
     # Try to connect to user-provided db
     for opt, arg in opts:
@@ -56,19 +81,47 @@ if __name__ == "__main__":
     # If not connected yet, try to connect to the default db specified in the docker-compose file
     if not connected_to_db:
         database_connect()
-        
+
+    if ("-i", "") in opts:
+        architext.entities.indexes.check(logger)
+        sys.exit(0)
+
+    if '-w' in options:
+        if message_queue_url is None:
+            print("Running several workers requires a message queue. Set it in the MESSAGE_QUEUE environment variable.")
+            sys.exit(2)
+        client_ids_cleanup()
+        architext.entities.indexes.check(logger)
+        worker_args = ['-d', options['-d']] if '-d' in options else []
+        sys.exit(run_workers(int(options['-w']), worker_args, logger))
 
     # Dict of current session. Keys are ids provided by TelnetServer, values are the user's Session object.
     sessions = {}
 
-    # Ensure there isn't any connected players at this point.
-    client_ids_cleanup()
+    # Ensure there isn't any connected players at this point. Workers are
+    # cleaned up by run_workers before they start.
+    if worker_port is None:
+        client_ids_cleanup()
 
     # Add exit handler: something that will be done when server stops
     atexit.register(lambda: logger.info('server stopped'))
 
+    # config.yml is reloaded when it changes, or right away on SIGHUP
+    signal.signal(signal.SIGHUP, lambda signum, frame: architext.config.config.reload())
+
     allowed = json.loads(os.environ['ALLOWED_ORIGINS'])
-    sio = socketio.Server(cors_allowed_origins=allowed)
+    if message_queue_url is not None:
+        # messages to clients of other processes, and bus messages, go through the message queue
+        sio = socketio.Server(cors_allowed_origins=allowed, client_manager=message_queue.create_manager(message_queue_url, channel=message_queue_channel))
+        bus_transport = message_queue.create_bus_transport(message_queue_url, channel=message_queue_channel)
+        architext.bus.bus.set_transport(bus_transport)
+        sio.start_background_task(bus_transport.listen)
+    else:
+        sio = socketio.Server(cors_allowed_origins=allowed)
+
+    # Missing indexes are built while the server is already serving
+    if worker_port is None:
+        sio.start_background_task(architext.entities.indexes.check, logger)
 
     sessions: typing.Dict[str, Session] = {}
     userid_to_sid: typing.Dict[str, str] = {}
@@ -76,10 +129,14 @@ if __name__ == "__main__":
     def get_sid(user_id):
         return userid_to_sid[user_id]
 
+    # Shared by all sessions, so the messages sent to each client keep their order.
+    sender = BatchingSocketIOSender(sio=sio)
+    register_gauges(sessions, sender)
+
     @sio.event
     def connect(sid, environ):
-        sender = SocketIOSender(sio=sio)
         sessions[sid] = Session(sender=sender, client_id=sid)
+        sender.flush()
         logger.info(f'New connection, client_id {sid}')
 
     @sio.event
@@ -89,7 +146,10 @@ if __name__ == "__main__":
             if session.client_id is None:  # the session has disconnected by itself
                 sessions.pop(sid)
             else:
-                session.process_message(data)
+                try:
+                    session.process_message(data)
+                finally:
+                    sender.flush()
 
     @sio.event
     def disconnect(sid):
@@ -100,9 +160,10 @@ if __name__ == "__main__":
             else:
                 logger.info(f'Disconnected before login: client_id {sid}')
             ended_session.disconnect()
+            sender.flush()
 
-    # Create a simple server application
-    app = socketio.WSGIApp(sio)
+    # Create a simple server application. It also serves the metrics, at /metrics.
+    app = socketio.WSGIApp(sio, metrics_wsgi_app)
 
     # Use eventlet or gevent for asynchronous server
-    eventlet.wsgi.server(eventlet.listen(('', 5000)), app)
+    eventlet.wsgi.server(eventlet.listen(('', worker_port or PORT)), app)
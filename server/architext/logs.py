@@ -0,0 +1,125 @@
+"""Logging pipeline of the server (see util.setup_logger).
+
+Loggers don't write to their files in the thread that logs: their records are
+put in a queue, and a single background thread (a QueueListener) writes them.
+A busy disk then slows down the writing thread only, not the sessions.
+
+Each player has a log file, so files are opened when needed by a pool that
+keeps at most MAX_OPEN_FILES of them open, closing the least recently used
+one. Files are rotated when they reach MAX_BYTES.
+"""
+import atexit
+import collections
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+
+LOGS_DIRECTORY = 'logs'
+MAX_OPEN_FILES = 64
+MAX_BYTES = 10 * 1024 * 1024
+BACKUP_COUNT = 3
+MAX_QUEUED_RECORDS = 10000
+
+
+class FilePoolHandler(logging.Handler):
+    """Writes each record to the file of the logger that created it
+    (record.log_file), rotating files that reach max_bytes."""
+
+    def __init__(self, directory=LOGS_DIRECTORY, max_open_files=MAX_OPEN_FILES, max_bytes=MAX_BYTES, backup_count=BACKUP_COUNT):
+        super().__init__()
+        self.directory = directory
+        self.max_open_files = max_open_files
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self._handlers = collections.OrderedDict()  # log file: RotatingFileHandler, least recently used first
+
+    def emit(self, record):
+        handler = self._handlers.pop(record.log_file, None)
+        if handler is None:
+            if len(self._handlers) >= self.max_open_files:
+                _log_file, least_recently_used = self._handlers.popitem(last=False)
+                least_recently_used.close()
+            handler = logging.handlers.RotatingFileHandler(
+                os.path.join(self.directory, record.log_file), 'a', self.max_bytes, self.backup_count, encoding='utf-8'
+            )
+            handler.setFormatter(self.formatter)
+        self._handlers[record.log_file] = handler
+        handler.handle(record)
+
+    def close(self):
+        for handler in self._handlers.values():
+            handler.close()
+        self._handlers.clear()
+        super().close()
+
+
+class LogFileQueueHandler(logging.handlers.QueueHandler):
+    """Puts the records of a logger in the queue of the pipeline, along with the
+    file they must be written to. Records are dropped when the queue is full."""
+
+    def __init__(self, pipeline, log_file, console=False):
+        super().__init__(pipeline.queue)
+        self.pipeline = pipeline
+        self.log_file = log_file
+        self.console = console
+
+    def prepare(self, record):
+        record = super().prepare(record)
+        record.log_file = self.log_file
+        record.console = self.console
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.pipeline.dropped_records += 1
+
+
+class LogPipeline():
+    def __init__(self, directory=LOGS_DIRECTORY, max_queued_records=MAX_QUEUED_RECORDS):
+        self.directory = directory
+        self.queue = queue.Queue(maxsize=max_queued_records)
+        self.dropped_records = 0
+        self._listener = None
+        self._lock = threading.Lock()
+
+    def _start(self):
+        if not os.path.exists(self.directory):
+            os.makedirs(self.directory)
+        formatter = logging.Formatter('%(asctime)s: %(message)s')
+        file_handler = FilePoolHandler(self.directory)
+        file_handler.setFormatter(formatter)
+        console_handler = logging.StreamHandler()
+        console_handler.setFormatter(formatter)
+        console_handler.addFilter(lambda record: record.console)
+        self._listener = logging.handlers.QueueListener(self.queue, file_handler, console_handler)
+        self._listener.start()
+        atexit.register(self.stop)
+
+    def stop(self):
+        """Writes the records that are still queued and stops the writing thread."""
+        with self._lock:
+            if self._listener is not None:
+                self._listener.stop()
+                for handler in self._listener.handlers:
+                    handler.close()
+                self._listener = None
+
+    def setup_logger(self, logger_name, log_file, console=False, level=logging.INFO):
+        """Sets up the logger to write to log_file through the pipeline. Loggers
+        that are already set up are left as they are."""
+        logger = logging.getLogger(logger_name)
+        with self._lock:
+            if self._listener is None:
+                self._start()
+            if not any(isinstance(handler, LogFileQueueHandler) for handler in logger.handlers):
+                logger.addHandler(LogFileQueueHandler(self, log_file, console=console))
+                logger.setLevel(level)
+        return logger
+
+
+# Pipeline shared by the whole process.
+pipeline = LogPipeline()
@@ -0,0 +1,185 @@
+"""Metrics of the server process, exposed in the Prometheus text format (see
+render) and summarized in game by the ServerStats verb.
+
+Sessions record how long it takes to find the verb of each message (dispatch,
+which includes bringing the user up to date) and to execute it, by verb class,
+and the errors raised by verbs. Entrypoints register gauges for what only they
+know, like the number of connected sessions or the messages waiting in the
+sender.
+
+When the server runs in several workers each of them has its own metrics, so
+each worker must be scraped at its own port.
+"""
+import bisect
+import collections
+import threading
+import time
+import typing
+
+# Upper bounds of the latency buckets, in seconds.
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram():
+    """Counts the observed values in each bucket. Not thread safe, the Registry
+    serializes the access."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # the last one is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def cumulative_counts(self):
+        """Pairs of (upper bound, values lower or equal to it), as Prometheus expects."""
+        total = 0
+        for upper_bound, count in zip(list(self.buckets) + [float('inf')], self.counts):
+            total += count
+            yield upper_bound, total
+
+    def quantile(self, fraction):
+        """Upper bound of the bucket the quantile falls in. Values over the last
+        bucket are estimated with the maximum observed value."""
+        rank = fraction * self.count
+        for upper_bound, total in self.cumulative_counts():
+            if total >= rank:
+                return min(upper_bound, self.max)
+        return self.max
+
+
+class RateMeter():
+    """Events per second over the last window seconds, counted by second."""
+
+    def __init__(self, window=60):
+        self.window = window
+        self._seconds: typing.Deque[typing.List[int]] = collections.deque()  # [second, events] pairs
+
+    def mark(self, now=None):
+        second = int(time.monotonic() if now is None else now)
+        if self._seconds and self._seconds[-1][0] == second:
+            self._seconds[-1][1] += 1
+        else:
+            self._seconds.append([second, 1])
+        self._forget_before(second - self.window)
+
+    def rate(self, now=None):
+        second = int(time.monotonic() if now is None else now)
+        self._forget_before(second - self.window)
+        return sum(events for event_second, events in self._seconds) / self.window
+
+    def _forget_before(self, second):
+        while self._seconds and self._seconds[0][0] <= second:
+            self._seconds.popleft()
+
+
+class Registry():
+    def __init__(self):
+        self.started_at = time.time()
+        self.messages = 0
+        self.message_rate = RateMeter()
+        self.dispatch_latency = Histogram()
+        self.verb_latency: typing.Dict[str, Histogram] = {}
+        self.errors: typing.Dict[str, int] = collections.Counter()
+        # database commands of the messages of each verb (see query_tracing)
+        self.queries: typing.Dict[str, int] = collections.Counter()
+        self.query_seconds: typing.Dict[str, float] = collections.Counter()
+        self.duplicate_queries: typing.Dict[str, int] = collections.Counter()
+        self._gauges: typing.Dict[str, typing.Tuple[str, typing.Callable[[], float]]] = {}
+        self._lock = threading.Lock()
+
+    def record_message(self, verb_name, dispatch_seconds, execute_seconds, failed=False, trace=None):
+        """Records a message processed by a session. verb_name is None if no verb
+        processed it, and so nothing was executed. trace is the query_tracing.Trace
+        of the message, if it was traced."""
+        with self._lock:
+            self.messages += 1
+            self.message_rate.mark()
+            self.dispatch_latency.observe(dispatch_seconds)
+            if verb_name is not None:
+                self.verb_latency.setdefault(verb_name, Histogram()).observe(execute_seconds)
+                if trace is not None:
+                    self.queries[verb_name] += trace.queries
+                    self.query_seconds[verb_name] += trace.query_seconds
+                    self.duplicate_queries[verb_name] += trace.duplicates
+            if failed:
+                self.errors[verb_name] += 1
+
+    def register_gauge(self, name, help_text, read):
+        """Exposes the value returned by read() as the gauge name. Gauges are read
+        when the metrics are rendered."""
+        self._gauges[name] = (help_text, read)
+
+    def gauge_values(self):
+        return {name: read() for name, (help_text, read) in self._gauges.items()}
+
+    def render(self) -> str:
+        """Returns the metrics in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            lines += [
+                '# HELP architext_messages_total Messages processed by the sessions.',
+                '# TYPE architext_messages_total counter',
+                f'architext_messages_total {self.messages}',
+                '# HELP architext_messages_per_second Messages processed per second over the last minute.',
+                '# TYPE architext_messages_per_second gauge',
+                f'architext_messages_per_second {self.message_rate.rate()}',
+                '# HELP architext_dispatch_seconds Time spent before executing each message: refreshing the user and finding its verb.',
+                '# TYPE architext_dispatch_seconds histogram',
+            ]
+            lines += self._render_histogram('architext_dispatch_seconds', '', self.dispatch_latency)
+            lines += [
+                '# HELP architext_verb_seconds Time spent executing each message, by verb.',
+                '# TYPE architext_verb_seconds histogram',
+            ]
+            for verb_name, histogram in sorted(self.verb_latency.items()):
+                lines += self._render_histogram('architext_verb_seconds', f'verb="{verb_name}"', histogram)
+            lines += [
+                '# HELP architext_verb_errors_total Unexpected errors raised by verbs.',
+                '# TYPE architext_verb_errors_total counter',
+            ]
+            lines += [f'architext_verb_errors_total{{verb="{verb_name}"}} {count}' for verb_name, count in sorted(self.errors.items())]
+            for name, help_text, values in [
+                ('architext_verb_queries_total', 'Database commands sent while processing the messages of each verb.', self.queries),
+                ('architext_verb_query_seconds_total', 'Time the database took to run the commands of each verb.', self.query_seconds),
+                ('architext_verb_duplicate_queries_total', 'Commands identical to another one of the same message, by verb.', self.duplicate_queries),
+            ]:
+                lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+                lines += [f'{name}{{verb="{verb_name}"}} {value}' for verb_name, value in sorted(values.items())]
+        for name, (help_text, read) in sorted(self._gauges.items()):
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} gauge', f'{name} {read()}']
+        return '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def _render_histogram(name, labels, histogram):
+        separator = ',' if labels else ''
+        lines = [
+            f'{name}_bucket{{{labels}{separator}le="{"+Inf" if upper_bound == float("inf") else upper_bound}"}} {count}'
+            for upper_bound, count in histogram.cumulative_counts()
+        ]
+        labels = f'{{{labels}}}' if labels else ''
+        lines += [f'{name}_sum{labels} {histogram.sum}', f'{name}_count{labels} {histogram.count}']
+        return lines
+
+    def verb_summary(self):
+        """Returns a list of (verb name, messages, p50, p99, max seconds, errors,
+        mean queries) rows, the slowest verbs (by p99) first."""
+        with self._lock:
+            rows = [
+                (
+                    verb_name, histogram.count, histogram.quantile(0.5), histogram.quantile(0.99), histogram.max,
+                    self.errors.get(verb_name, 0), self.queries.get(verb_name, 0) / histogram.count,
+                )
+                for verb_name, histogram in self.verb_latency.items()
+            ]
+        return sorted(rows, key=lambda row: row[3], reverse=True)
+
+
+# Metrics of the whole process.
+registry = Registry()
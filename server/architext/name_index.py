@@ -0,0 +1,87 @@
+"""Resolution of the names players type to the entities they refer to.
+
+Names are compared in three levels (see NameIndex.possible_meanings): exactly,
+loosely (ignoring case and accents) and by substring (loosely too). A NameIndex
+folds the names of its entities once, when it is built, so resolving a name
+only folds the name that has been typed.
+
+The indexes of the items and exits of each room, of the items of each inventory
+and of the saved items of each world are kept by the world graph (see
+WorldGraph.get_items_index), and are rebuilt only when those entities change.
+"""
+import collections
+import functools
+import unicodedata
+
+@functools.lru_cache(maxsize=4096)
+def fold(text):
+    """Lowercases a text and removes its accents and other diacritics."""
+    decomposed = unicodedata.normalize('NFKD', text.lower())
+    return ''.join(character for character in decomposed if not unicodedata.combining(character))
+
+
+class NameIndex():
+    """Entities indexed by their names. By default the name of an entity is
+    its name attribute; another one can be given with the key argument."""
+
+    def __init__(self, entities=(), key=lambda entity: entity.name):
+        self._entries = []  # (entity, name, folded name), in the order they were given
+        self._by_name = collections.defaultdict(list)
+        self._by_folded_name = collections.defaultdict(list)
+        for entity in entities:
+            self._add(entity, key(entity))
+
+    def _add(self, entity, name, folded_name=None):
+        folded_name = fold(name) if folded_name is None else folded_name
+        self._entries.append((entity, name, folded_name))
+        self._by_name[name].append(entity)
+        self._by_folded_name[folded_name].append(entity)
+
+    @classmethod
+    def combine(cls, *indexes):
+        """Returns an index with the entities of all the given indexes, which
+        searches them without copying their entries."""
+        return CombinedIndex(indexes)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def exact(self, name):
+        return list(self._by_name.get(name, []))
+
+    def loose(self, name):
+        return list(self._by_folded_name.get(fold(name), []))
+
+    def containing(self, name):
+        folded_name = fold(name)
+        return [entity for entity, entity_name, entity_folded_name in self._entries if folded_name in entity_folded_name]
+
+    def possible_meanings(self, name, loose_match=True, substr_match=True):
+        """Returns the entities the name may refer to: the ones with exactly
+        that name if there are any. If not, the loose matches, and if there
+        aren't any either, the entities whose name contains it."""
+        matches = self.exact(name)
+        if not matches and loose_match:
+            matches = self.loose(name)
+        if not matches and substr_match:
+            matches = self.containing(name)
+        return matches
+
+
+class CombinedIndex(NameIndex):
+    """Several indexes searched as one, in order (see NameIndex.combine)."""
+
+    def __init__(self, indexes):
+        self._indexes = indexes
+
+    def __len__(self):
+        return sum(len(index) for index in self._indexes)
+
+    def exact(self, name):
+        return [entity for index in self._indexes for entity in index.exact(name)]
+
+    def loose(self, name):
+        return [entity for index in self._indexes for entity in index.loose(name)]
+
+    def containing(self, name):
+        return [entity for index in self._indexes for entity in index.containing(name)]
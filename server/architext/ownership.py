@@ -0,0 +1,96 @@
+"""Keeps track of which session owns each user, and of changes to users made
+from other sessions.
+
+A user can only be played from one session at a time. Each time a user logs in,
+its session_version is incremented in the database and a takeover message is
+published on the bus, so any session that still has the user with an older
+version gets closed right away, in this process or in any other.
+
+Sessions keep their User instance between messages instead of reading it again
+each time. When a user is saved with changes in WATCHED_FIELDS, a message is
+published too, so sessions holding another instance of that user (e.g. a player
+that has been teleported by a game master) know they have to reload it. Only the
+saves of online users are kept track of, and they are forgotten when the user
+disconnects.
+"""
+import itertools
+import threading
+import bson
+from .bus import bus as default_bus
+from . import presence
+
+TAKEOVER_TOPIC = 'user_takeover'
+USER_SAVED_TOPIC = 'user_saved'
+# Fields of a user that other sessions change: where the user is and what
+# presence knows about them, and the worlds they have joined.
+WATCHED_FIELDS = {'room', 'client_id', 'master_mode', 'joined_worlds'}
+
+
+class OwnershipRegistry():
+    def __init__(self, bus):
+        self.bus = bus
+        self._sessions = {}   # user id: list of sessions of this process that own the user
+        self._revisions = {}  # id of an online user: revision of its last save
+        # Revisions are unique in the process, so a user that disconnects and
+        # comes back never gets a revision that an old instance has already seen.
+        self._next_revision = itertools.count(1)
+        self._lock = threading.RLock()
+        bus.subscribe(TAKEOVER_TOPIC, self._on_takeover)
+        bus.subscribe(USER_SAVED_TOPIC, self._on_user_saved)
+        bus.subscribe(presence.DISCONNECTED_TOPIC, self._on_user_disconnected)
+
+    def claim(self, session):
+        """Makes the session the owner of its user. Sessions with an older
+        session_version of the same user are closed."""
+        user_id = str(session.user.id)
+        with self._lock:
+            self._sessions.setdefault(user_id, []).append(session)
+        self.bus.publish(TAKEOVER_TOPIC, {'user_id': user_id, 'version': session.user.session_version})
+
+    def release(self, session):
+        user_id = str(session.user.id)
+        with self._lock:
+            sessions = self._sessions.get(user_id, [])
+            if session in sessions:
+                sessions.remove(session)
+            if not sessions:
+                self._sessions.pop(user_id, None)
+
+    def user_saved(self, user, changed_fields):
+        """Called by the User entity after saving it, with the names of the
+        fields that have changed."""
+        if WATCHED_FIELDS.intersection(changed_fields):
+            self.bus.publish(USER_SAVED_TOPIC, {'user_id': str(user.id)})
+        self.mark_up_to_date(user)
+
+    def is_outdated(self, user):
+        """True if the user has been saved through another instance since this
+        one was loaded or saved. Users whose revision has been forgotten are
+        reloaded once, to be safe."""
+        return getattr(user, '_seen_revision', 0) != self._revisions.get(str(user.id), 0)
+
+    def mark_up_to_date(self, user):
+        user._seen_revision = self._revisions.get(str(user.id), 0)
+
+    def _on_takeover(self, payload):
+        with self._lock:
+            sessions = self._sessions.get(payload['user_id'], [])
+            taken_over = [session for session in sessions if session.user.session_version < payload['version']]
+            for session in taken_over:
+                sessions.remove(session)
+        for session in taken_over:
+            session.close_taken_over()
+
+    def _on_user_saved(self, payload):
+        if not presence.registry.is_online(bson.ObjectId(payload['user_id'])):
+            return
+        with self._lock:
+            self._revisions[payload['user_id']] = next(self._next_revision)
+
+    def _on_user_disconnected(self, payload):
+        with self._lock:
+            self._revisions.pop(payload['user_id'], None)
+
+
+# Registry shared by the whole process.
+registry = OwnershipRegistry(default_bus)
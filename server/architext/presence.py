@@ -0,0 +1,197 @@
+"""Keeps track of the users that are connected to this server and where they are.
+
+The registry is kept in memory and updated by the User entity when users
+connect, disconnect, move, teleport, or enter and leave worlds. Sending
+messages to a room or listing who is online reads from it, instead of querying
+the users collection.
+
+User.client_id is still written to the database, since it is what the rest of
+the data relies on when the server restarts (see client_ids_cleanup in the
+socketio entrypoint).
+
+Changes are published on the bus and applied by the registry when they are
+delivered, so when the server runs in several processes each of them knows the
+users connected to the others too.
+"""
+import dataclasses
+import threading
+import typing
+import bson
+from .bus import bus as default_bus
+from . import name_index as name_index_module
+
+CONNECTED_TOPIC = 'user_connected'
+DISCONNECTED_TOPIC = 'user_disconnected'
+MOVED_TOPIC = 'user_moved'
+MASTER_MODE_TOPIC = 'user_master_mode'
+
+@dataclasses.dataclass
+class Presence():
+    """A connected user."""
+    user_id: typing.Any
+    name: str
+    client_id: str
+    room_id: typing.Any = None         # None when the user is at the lobby
+    world_state_id: typing.Any = None  # world state of the room
+    master_mode: bool = False
+
+    def is_in_lobby(self):
+        return self.room_id is None
+
+
+def _reference_id(value):
+    return getattr(value, 'id', value)
+
+
+def _location_of(room):
+    if room is None:
+        return None, None
+    return room.id, _reference_id(room._data.get('world_state'))
+
+
+# Bus payloads must be JSON serializable, so ids travel as strings.
+def _dump_id(value):
+    return str(value) if value is not None else None
+
+
+def _load_id(value):
+    return bson.ObjectId(value) if value is not None else None
+
+
+class PresenceRegistry():
+    """Connected users indexed by user, room and world state."""
+
+    def __init__(self, bus):
+        self.bus = bus
+        self._by_user = {}         # user id: Presence
+        self._by_room = {}         # room id (None for the lobby): {user id: Presence}
+        self._by_world_state = {}  # world state id: {user id: Presence}
+        self._name_index = None    # NameIndex of the connected users, built when needed
+        self._lock = threading.RLock()
+        bus.subscribe(CONNECTED_TOPIC, self._on_connected)
+        bus.subscribe(DISCONNECTED_TOPIC, self._on_disconnected)
+        bus.subscribe(MOVED_TOPIC, self._on_moved)
+        bus.subscribe(MASTER_MODE_TOPIC, self._on_master_mode)
+
+    def connect(self, user, client_id):
+        room_id, world_state_id = _location_of(user.room)
+        self.bus.publish(CONNECTED_TOPIC, {
+            'user_id': _dump_id(user.id),
+            'name': user.name,
+            'client_id': client_id,
+            'room_id': _dump_id(room_id),
+            'world_state_id': _dump_id(world_state_id),
+            'master_mode': user.master_mode
+        })
+
+    def disconnect(self, user):
+        self.bus.publish(DISCONNECTED_TOPIC, {'user_id': _dump_id(user.id)})
+
+    def move(self, user, room):
+        """Updates the location of a user. room is None when going to the lobby."""
+        if user.id not in self._by_user:  # offline users are not tracked
+            return
+        room_id, world_state_id = _location_of(room)
+        self.bus.publish(MOVED_TOPIC, {'user_id': _dump_id(user.id), 'room_id': _dump_id(room_id), 'world_state_id': _dump_id(world_state_id)})
+
+    def set_master_mode(self, user, master_mode):
+        if user.id in self._by_user:
+            self.bus.publish(MASTER_MODE_TOPIC, {'user_id': _dump_id(user.id), 'master_mode': master_mode})
+
+    def _on_connected(self, payload):
+        presence = Presence(
+            user_id=_load_id(payload['user_id']),
+            name=payload['name'],
+            client_id=payload['client_id'],
+            room_id=_load_id(payload['room_id']),
+            world_state_id=_load_id(payload['world_state_id']),
+            master_mode=payload['master_mode']
+        )
+        with self._lock:
+            self._remove(presence.user_id)
+            self._by_user[presence.user_id] = presence
+            self._index(presence)
+            self._name_index = None
+
+    def _on_disconnected(self, payload):
+        with self._lock:
+            self._remove(_load_id(payload['user_id']))
+            self._name_index = None
+
+    def _on_moved(self, payload):
+        with self._lock:
+            presence = self._by_user.get(_load_id(payload['user_id']))
+            if presence is None:
+                return
+            self._unindex(presence)
+            presence.room_id, presence.world_state_id = _load_id(payload['room_id']), _load_id(payload['world_state_id'])
+            self._index(presence)
+
+    def _on_master_mode(self, payload):
+        with self._lock:
+            presence = self._by_user.get(_load_id(payload['user_id']))
+            if presence is not None:
+                presence.master_mode = payload['master_mode']
+
+    def clear(self):
+        with self._lock:
+            self._by_user.clear()
+            self._by_room.clear()
+            self._by_world_state.clear()
+            self._name_index = None
+
+    def get(self, user_id):
+        """Returns the Presence of a user, or None if they are offline."""
+        return self._by_user.get(user_id)
+
+    def is_online(self, user_id):
+        return user_id in self._by_user
+
+    def client_id_of(self, user_id):
+        presence = self._by_user.get(user_id)
+        return presence.client_id if presence is not None else None
+
+    def all(self):
+        with self._lock:
+            return list(self._by_user.values())
+
+    def get_name_index(self):
+        """NameIndex of the connected users, by name (see name_index)."""
+        with self._lock:
+            if self._name_index is None:
+                self._name_index = name_index_module.NameIndex(list(self._by_user.values()))
+            return self._name_index
+
+    def in_room(self, room_id):
+        with self._lock:
+            return list(self._by_room.get(room_id, {}).values())
+
+    def in_world_state(self, world_state_id):
+        with self._lock:
+            return list(self._by_world_state.get(world_state_id, {}).values())
+
+    def with_name(self, name):
+        with self._lock:
+            return next((presence for presence in self._by_user.values() if presence.name == name), None)
+
+    def _index(self, presence):
+        self._by_room.setdefault(presence.room_id, {})[presence.user_id] = presence
+        if presence.world_state_id is not None:
+            self._by_world_state.setdefault(presence.world_state_id, {})[presence.user_id] = presence
+
+    def _unindex(self, presence):
+        for index, key in [(self._by_room, presence.room_id), (self._by_world_state, presence.world_state_id)]:
+            users = index.get(key)
+            if users is not None:
+                users.pop(presence.user_id, None)
+                if not users:
+                    del index[key]
+
+    def _remove(self, user_id):
+        presence = self._by_user.pop(user_id, None)
+        if presence is not None:
+            self._unindex(presence)
+
+
+# Registry of the users connected to the server, shared by the whole process.
+registry = PresenceRegistry(default_bus)
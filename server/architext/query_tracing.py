@@ -0,0 +1,123 @@
+"""Attributes the database commands to the message that caused them.
+
+Reading a ReferenceField or a property like Room.items sends queries that the
+verb doesn't see, so a verb may end up making dozens of them to print a line.
+The tracer is a pymongo command listener (see server_setup.database_connect)
+that counts the commands sent while a session processes a message, the time
+MongoDB took to run them and how many of them repeat an identical command of
+the same message.
+
+Messages that go over the thresholds of config.yml (slow_command_milliseconds
+and slow_command_queries) are written to SLOW_COMMANDS_LOG_FILE, along with
+their most repeated commands. Like every log, it goes through the logging
+pipeline, so it ends up in the logs directory of the process (logs.LOGS_DIRECTORY,
+or the directory of its worker), which is kept out of the repository. Totals by
+verb are part of the server metrics.
+
+The trace of the message being processed is kept in a context variable, so
+the green threads of eventlet and the worker threads of the asyncio entrypoint
+each have their own. Custom verbs process their messages inside the message
+that runs them, so their commands count towards it.
+"""
+import collections
+import contextvars
+import time
+import typing
+import pymongo.monitoring
+from . import config
+from . import util
+
+SLOW_COMMANDS_LOG_FILE = 'slow_commands.txt'  # in the logs directory, see logs.LogPipeline
+SHOWN_REPEATED_COMMANDS = 5  # in each entry of the slow commands log
+
+
+class Trace():
+    """Database commands sent while processing a message."""
+
+    def __init__(self, user_name, message):
+        self.user_name = user_name
+        self.message = message
+        self.verb_name = None
+        self.start = time.perf_counter()
+        self.seconds = None  # set when the message is finished
+        self.queries = 0
+        self.query_seconds = 0.0
+        self.duplicates = 0
+        self.commands: typing.Dict[str, int] = collections.Counter()  # description of each command: times sent
+
+    def add_command(self, description):
+        if description in self.commands:
+            self.duplicates += 1
+        self.commands[description] += 1
+        self.queries += 1
+
+    def repeated_commands(self):
+        return [(description, times) for description, times in self.commands.most_common(SHOWN_REPEATED_COMMANDS) if times > 1]
+
+
+class QueryTracer(pymongo.monitoring.CommandListener):
+    # command fields that change with each command without changing what it does
+    IGNORED_FIELDS = {'lsid', 'txnNumber', 'signature'}
+
+    def __init__(self):
+        self._current: contextvars.ContextVar[typing.Optional[Trace]] = contextvars.ContextVar('query_trace', default=None)
+        self._logger = None
+
+    def start(self, user_name, message) -> typing.Optional[Trace]:
+        """Starts tracing the commands of a message. Returns None if a message is
+        already being traced, as the commands count towards it."""
+        if self._current.get() is not None:
+            return None
+        trace = Trace(user_name, message)
+        self._current.set(trace)
+        return trace
+
+    def finish(self, trace: typing.Optional[Trace]) -> None:
+        """Stops tracing the message and logs it if it was slow. The session sets
+        the verb_name of the trace once the verb of the message is known."""
+        if trace is None:
+            return
+        self._current.set(None)
+        trace.seconds = time.perf_counter() - trace.start
+        if trace.seconds * 1000 > config.config.slow_command_milliseconds or trace.queries > config.config.slow_command_queries:
+            self.log_slow_command(trace)
+
+    def log_slow_command(self, trace):
+        if self._logger is None:
+            self._logger = util.setup_logger('slow_commands', SLOW_COMMANDS_LOG_FILE)
+        if trace.user_name is not None:
+            sender = f'{trace.user_name} "{trace.message}"'
+        else:
+            sender = 'a client logging in'  # its messages are user names and passwords
+        lines = [
+            f'{trace.verb_name} of {sender}: {round(trace.seconds * 1000, 1)} ms, '
+            f'{trace.queries} queries taking {round(trace.query_seconds * 1000, 1)} ms, {trace.duplicates} of them repeated'
+        ]
+        lines += [f'  {times} times: {description}' for description, times in trace.repeated_commands()]
+        self._logger.info('\n'.join(lines))
+
+    def started(self, event):
+        trace = self._current.get()
+        if trace is not None:
+            trace.add_command(self.describe(event))
+
+    def succeeded(self, event):
+        trace = self._current.get()
+        if trace is not None:
+            trace.query_seconds += event.duration_micros / 1_000_000
+
+    def failed(self, event):
+        self.succeeded(event)
+
+    @classmethod
+    def describe(cls, event):
+        """Text of the command, the same for identical commands."""
+        fields = ', '.join(
+            f'{name}: {value!r}' for name, value in event.command.items()
+            if name not in cls.IGNORED_FIELDS and not name.startswith('$')
+        )
+        return f'{event.database_name} {{{fields}}}'
+
+
+# Tracer of the whole process.
+tracer = QueryTracer()
@@ -3,7 +3,12 @@
 from . import entities
 from . import verbs as v
 from . import util
+from . import presence
+from . import ownership
+from . import metrics
+from . import query_tracing
 import textwrap
+import time
 from architext.adapters.sender import MessageOptions, Message, AbstractSender
 import architext.strings as strings
 
@@ -17,48 +22,68 @@ class Session:
     """
 
     # List of all verbs supported by the session, ordered by priority: if two verbs can handle the same message, the first will have preference.
-    verbs = [v.ExportWorld, v.ImportWorld, v.DeleteWorld, v.JoinByInviteCode, v.EnterWorld, v.CreateWorld, v.DeployPublicSnapshot, v.GoToLobby, v.CustomVerb, v.Build, v.Emote, v.Go, v.Help, v.Look, v.Remodel, v.Say, v.Shout, v.Craft, v.EditItem, v.Connect, v.TeleportClient, v.TeleportUser, v.TeleportAllInRoom, v.TeleportAllInWorld, v.DeleteRoom, v.DeleteItem, v.DeleteExit, v.WorldInfo, v.Info, v.Items, v.Exits, v.AddVerb, v.MasterMode, v.TextToOne, v.TextToRoom, v.TextToRoomUnless, v.TextToWorld, v.Take, v.Drop, v.Inventory, v.MasterOpen, v.MasterClose, v.AssignKey, v.Open, v.SaveItem, v.PlaceItem, v.CreateSnapshot, v.DeploySnapshot, v.CheckForItem, v.Give, v.TakeFrom, v.MakeEditor, v.RemoveEditor, v.PubishSnapshot, v.UnpubishSnapshot, v.DeleteSnapshot, v.InspectCustomVerb, v.DeleteCustomVerb, v.EditWorld, v.DeleteKey, v.Who, v.RefreshLobby, v.Recall, v.LobbyHelp, v.RollDice]
+    verbs = [v.ExportWorld, v.ImportWorld, v.DeleteWorld, v.JoinByInviteCode, v.EnterWorld, v.CreateWorld, v.DeployPublicSnapshot, v.GoToLobby, v.CustomVerb, v.Build, v.Emote, v.Go, v.Help, v.Look, v.Remodel, v.Say, v.Shout, v.Craft, v.EditItem, v.Connect, v.TeleportClient, v.TeleportUser, v.TeleportAllInRoom, v.TeleportAllInWorld, v.DeleteRoom, v.DeleteItem, v.DeleteExit, v.WorldInfo, v.Info, v.Items, v.Exits, v.AddVerb, v.MasterMode, v.TextToOne, v.TextToRoom, v.TextToRoomUnless, v.TextToWorld, v.Take, v.Drop, v.Inventory, v.MasterOpen, v.MasterClose, v.AssignKey, v.Open, v.SaveItem, v.PlaceItem, v.CreateSnapshot, v.DeploySnapshot, v.CheckForItem, v.Give, v.TakeFrom, v.MakeEditor, v.RemoveEditor, v.PubishSnapshot, v.UnpubishSnapshot, v.DeleteSnapshot, v.InspectCustomVerb, v.DeleteCustomVerb, v.EditWorld, v.DeleteKey, v.Who, v.RefreshLobby, v.NextLobbyPage, v.PreviousLobbyPage, v.Recall, v.LobbyHelp, v.RollDice, v.ServerStats]
+    # Index of the verbs above, used to poll only the verbs that may process each message.
+    verb_index = v.VerbIndex(verbs)
+    # Verb that handles the interaction when the session starts: the log-in process.
+    first_verb = v.Login
+    # Whether the messages of the session are recorded in the metrics of the server.
+    records_metrics = True
 
     def __init__(self, client_id, sender: AbstractSender):
         self.sender = sender
         self.logger = None  # logger for recording user interaction
         self.client_id = client_id  # direction to send messages to our client
-        self.current_verb = v.Login(self)  # verb that is currently handling interaction. It starts with the log-in process.
+        self.current_verb = self.first_verb(self) if self.first_verb is not None else None  # verb that is currently handling interaction.
         self.user = None  # here we'll have an User entity once the log-in is completed.
         self.world_list_cache = None  # when the lobby is shown its values are cached here (see #122).
 
-    def process_message(self, message: str):
+    def process_message(self, message: str, resolved_verb=None):
         """This method processes a message sent by the client.
-        It polls all verbs, using their can_process method to find a verb that can process the message.
+        It polls the verbs that may process the message in the current context (see verbs.VerbIndex),
+        using their can_process method to find a verb that can process the message.
         Then makes that verb the current_verb and lets it handle the message.
+        If the verb that has to process the message is already known (resolved_verb), no verb is polled.
+        The time spent finding the verb and executing it, and the database commands sent meanwhile
+        (see query_tracing), are recorded in the metrics of the server.
         """
+        trace = query_tracing.tracer.start(self.user.name if self.user is not None else None, message.strip())
+        try:
+            self._process_message(message, resolved_verb, trace)
+        finally:
+            query_tracing.tracer.finish(trace)
+
+    def _process_message(self, message, resolved_verb, trace):
+        start = time.perf_counter()
         message = message.strip()
         if self.user is not None:
-            self.user.reload()
-            if self.user.client_id != self.client_id:  # another session has been opened for the same user
-                self.send_to_client('Otra sesión ha sido abierta para el mismo usuario. Tu sesión ha sido cerrada.')
-                self.disconnect()
-                return
+            self.refresh_user()
 
         if self.logger:
             self.logger.info('client\n'+message)
         
-        if self.current_verb is None:
-            for verb in self.verbs:
+        if self.current_verb is None and resolved_verb is not None:
+            self.current_verb = resolved_verb(self)
+        elif self.current_verb is None:
+            for verb in self.verb_index.candidates(message, self.get_context()):
                 if verb.can_process(message, self):
                     self.current_verb = verb(self)
                     break
+        dispatched = time.perf_counter()
         
         if self.current_verb is not None:
+            verb_name = type(self.current_verb).__name__
             try:
                 self.current_verb.execute(message)
             except Exception as e:
+                self.record_message(trace, verb_name, start, dispatched, failed=True)
                 self.send_to_client(_("An unexpected error ocurred. It has been notified and it will be soon fixed. You probably can continue playing without further issues."))
                 if self.logger:
                     self.logger.exception('ERROR: ' + str(e))
                 else:
                     print('ERROR: ' + str(e))
                 raise e
+            self.record_message(trace, verb_name, start, dispatched)
             
             if self.current_verb.command_finished():
                 self.current_verb = None
@@ -67,12 +92,51 @@ class Session:
                 self.send_to_client(_('I don\'t understand that. You can enter "r" to show the lobby menu again.'))
             else: 
                 self.send_to_client(_('I don\'t understand that.'))
+            self.record_message(trace, None, start, dispatched)
+
+    def record_message(self, trace, verb_name, start, dispatched, failed=False):
+        """Records a processed message in the metrics. verb_name is None if no verb processed it."""
+        if trace is not None:
+            trace.verb_name = verb_name
+        if self.records_metrics:
+            execute_seconds = time.perf_counter() - dispatched if verb_name is not None else 0.0
+            metrics.registry.record_message(verb_name, dispatched - start, execute_seconds, failed=failed, trace=trace)
+
+    def refresh_user(self):
+        """Brings the user up to date before processing a message."""
+        # the user is only read again if it has been changed by another session, see ownership.py
+        if ownership.registry.is_outdated(self.user):
+            self.user.reload()
+            ownership.registry.mark_up_to_date(self.user)
+        # verbs work with the instances of the cached world, see entities.world_graph
+        entities.world_graph.cache.attach(self.user)
+
+    def get_context(self):
+        """Returns the type of verbs that can be used right now: lobby or world verbs."""
+        if self.user.room is None:
+            return v.verb.LOBBYVERB
+        else:
+            return v.verb.WORLDVERB
+
+    def get_room_id(self):
+        """Returns the id of the user's room, or None if they are at the lobby."""
+        return self.user.room.id if self.user.room is not None else None
 
     def disconnect(self):
         if self.user is not None and self.user.client_id == self.client_id:
             if not self.user.master_mode:
                 self.send_to_others_in_room(_("Whoop! {player_name} has gone.").format(player_name=self.user.name))
             self.user.disconnect()
+            ownership.registry.release(self)
+        self.client_id = None
+
+    def claim_user(self):
+        """Called once the user has logged in. Other sessions of the same user are closed."""
+        ownership.registry.claim(self)
+
+    def close_taken_over(self):
+        """Called when another session has been opened for the same user."""
+        self.send_to_client('Otra sesión ha sido abierta para el mismo usuario. Tu sesión ha sido cerrada.')
         self.client_id = None
 
     def send_to_client(self, message, options: MessageOptions = MessageOptions()):
@@ -81,26 +145,25 @@ class Session:
             self.logger.info('server\n'+message)
 
     def send_to_user(self, user, message, options: MessageOptions = MessageOptions()):
-        if user.client_id is not None:
-            self.send(user.client_id, message, options=options)
+        client_id = presence.registry.client_id_of(user.id)
+        if client_id is not None:
+            self.send(client_id, message, options=options)
 
     def send_to_room_except(self, exception_user, message, options: MessageOptions = MessageOptions(section=False)):
-        users_in_this_room = entities.User.objects(room=self.user.room)
-        for user in users_in_this_room:
-            if user != exception_user:
-                self.send(user.client_id, message, options=options)
+        for user_presence in presence.registry.in_room(self.get_room_id()):
+            if user_presence.user_id != exception_user.id:
+                self.send(user_presence.client_id, message, options=options)
 
     def send_to_others_in_room(self, message, options: MessageOptions = MessageOptions(section=False)):
         self.send_to_room_except(self.user, message, options=options)
 
     def send_to_room(self, message, options: MessageOptions = MessageOptions(section=False)):
-        users_in_this_room = entities.User.objects(room=self.user.room)
-        for user in users_in_this_room:
-            self.send(user.client_id, message, options=options)
+        for user_presence in presence.registry.in_room(self.get_room_id()):
+            self.send(user_presence.client_id, message, options=options)
 
     def send_to_all(self, message, options: MessageOptions = MessageOptions(section=False)):
-        for user in entities.User.objects:
-            self.send(user.client_id, message, options=options)
+        for user_presence in presence.registry.all():
+            self.send(user_presence.client_id, message, options=options)
 
     def send(self, client_id, message, wrap=False, options: MessageOptions = MessageOptions()):
         if wrap:
@@ -137,35 +200,102 @@ class GhostSession(Session):
     The differences whith a normal session are:
      - A ghost session doesn't respond to the client that is issuing it
        messages, because there is none.
-     - A ghost session belongs to the user specified in the field GHOST_USER_NAME.
-       This user cannot be used by normal sessions.
+     - A ghost session's user is a SystemActor, that lives only in memory
+       while the task is being executed. Each ghost session has its own, so
+       tasks can run at the same time.
      - A ghost session ends as soon as the automated task does.
     """
 
     MAX_DEPTH = 10  # max number of recursive GhostSessions
+    first_verb = None  # there is nobody to log in, nor a client to show the log-in banner to
+    records_metrics = False  # its messages are part of the custom verb that runs it
 
     def __init__(self, sender: AbstractSender, start_room, creator_session, depth=0):
-        GHOST_USER_NAME = util.GHOST_USER_NAME  # name of the ghost user
         PLACEHOLDER_SESSION_ID = 'thisisthesessionid'  # with this invalid id, the server won't send messages meant to the session's client 
         super().__init__(PLACEHOLDER_SESSION_ID, sender)  # normal session __init__. Assigns session id and server.
-        self.current_verb = None  # we want to not have an assigned verb at session creation.
         self.depth = depth
         self.creator_session = creator_session
         if self.depth > self.MAX_DEPTH:
             raise GhostSessionMaxDepthExceeded()
+        self.user = SystemActor(start_room)
 
-        # retrieve or create ghost user and put in in the right room.
-        if entities.User.objects(name=GHOST_USER_NAME):
-            self.user = entities.User.objects(name=GHOST_USER_NAME).first()
-            self.user.connect(self.client_id)
-            self.user.teleport(start_room)
-        else:
-            self.user = entities.User(name=GHOST_USER_NAME, room=start_room, master_mode=True, password='patata frita')
-            self.user.connect(self.client_id)
+    def refresh_user(self):
+        # nobody else changes the actor, but its room may have been reloaded in the world graph
+        if self.user.room is not None:
+            room = entities.world_graph.cache.current_room(self.user.room.id)
+            if room is not None:
+                self.user.room = room
 
     def disconnect(self):
-        if self.user is not None:
-            self.user.disconnect()
+        self.client_id = None
+
+
+class SystemActor():
+    """The user of a GhostSession. It acts like a User in master mode, but it
+    is never connected nor saved: its position only changes in memory.
+
+    It is backed by the user named GHOST_USER_NAME, which is never modified
+    either. That user is only there for what needs to reference a saved user,
+    like the inventories where the items taken by the actor are kept.
+    """
+    _ghost_user_id = None  # id of the ghost user, looked up once per process
+
+    def __init__(self, room):
+        self.room = room
+        self.master_mode = True
+        self.client_id = None
+        self.name = util.GHOST_USER_NAME
+        self.id = self.get_ghost_user_id()
+        self.session_version = 0
+        self.joined_worlds = []
+
+    @classmethod
+    def get_ghost_user_id(cls):
+        if cls._ghost_user_id is None:
+            ghost_user = entities.User.objects(name=util.GHOST_USER_NAME).first()
+            if ghost_user is None:
+                ghost_user = entities.User(name=util.GHOST_USER_NAME, room=None, master_mode=True, password='patata frita')
+            cls._ghost_user_id = ghost_user.id
+        return cls._ghost_user_id
+
+    def get_ghost_user(self):
+        return entities.User.objects(id=self.id).first()
+
+    def move(self, exit_name):
+        exit = self.room.get_exit(exit_name)
+        if exit is not None:
+            self.room = exit.destination
+
+    def teleport(self, room):
+        self.room = room
+
+    def get_inventory_from(self, world_state):
+        return self.get_ghost_user().get_inventory_from(world_state)
+
+    def get_current_world_inventory(self):
+        return self.get_inventory_from(self.room.world_state)
+
+    def get_current_world_inventory_index(self):
+        return self.room.world_state.get_inventory_index(self)
+
+    def save_item(self, item):
+        item_snapshot = item.clone()
+        item_snapshot.saved_in = self.room.world_state
+        item_snapshot.item_id = item_snapshot._generate_item_id()
+        item_snapshot.save()
+        return item_snapshot
+
+    def enter_master_mode(self):
+        self.master_mode = True
+
+    def leave_master_mode(self):
+        self.master_mode = False
+
+    def save(self):
+        pass
+
+    def reload(self):
+        pass
 
 
 class GhostSessionMaxDepthExceeded(Exception):
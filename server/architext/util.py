@@ -1,35 +1,27 @@
 import logging
 from . import entities
-import os
-import re
-import io
-import yaml
+from . import presence
+from . import name_index
+from . import config as config_module
+from . import logs
 import regex
 import json
 import unicodedata
 import json, zlib, base64, binascii
 import typing
+import collections
+import itertools
+import bson
 
 
 # username to be used by the ghost session (see ghost_session.py)
 GHOST_USER_NAME = "-nadie-"
 
 def possible_meanings(partial_string, list_of_options, loose_match=True, substr_match=True):
-    # first check for exact matches
-    if partial_string in list_of_options:
-        return [string for string in list_of_options if partial_string == string]
-
-    # then check for complete easy text matches
-    elif loose_match and next(filter(lambda s: similar(s, partial_string), list_of_options), None) is not None:
-        return list(filter(lambda s: similar(s, partial_string), list_of_options))
-
-    # then check for easy text containment
-    elif substr_match:
-        return [string for string in list_of_options if contains_similar(partial_string, string)]
-
-    # if nothing found with the given options, return an empty list
-    else:
-        return []
+    # first exact matches, then complete easy text matches, then easy text containment
+    # (see name_index.NameIndex.possible_meanings)
+    index = name_index.NameIndex(list_of_options, key=lambda string: string)
+    return index.possible_meanings(partial_string, loose_match=loose_match, substr_match=substr_match)
 
 
 def find_name_matches(input_string, items, item_to_string, loose_match=True, substr_match=True):
@@ -48,10 +40,8 @@ def find_name_matches(input_string, items, item_to_string, loose_match=True, sub
     the items whose strings are the most similar to the input string, according to the
     possible_meanings function.
     """
-    item_strings = [item_to_string(item) for item in items]
-    strings_she_refers_to = possible_meanings(input_string, item_strings, loose_match=loose_match, substr_match=substr_match)
-    items_she_refers_to = [item for item in items if item_to_string(item) in strings_she_refers_to]
-    return items_she_refers_to
+    index = name_index.NameIndex(items, key=item_to_string)
+    return index.possible_meanings(input_string, loose_match=loose_match, substr_match=substr_match)
 
 
 def name_to_entity(session, name, loose_match=[], substr_match=[], strict_match=[]):
@@ -81,29 +71,28 @@ def name_to_entity(session, name, loose_match=[], substr_match=[], strict_match=
     Returns "many" if there are many matches at a given level.
     """
 
+    def candidates_index(places):
+        indexes = []
+        if "room_items" in places:
+            indexes.append(session.user.room.get_items_index())
+        if "room_exits" in places:
+            indexes.append(session.user.room.get_exits_index())
+        if "inventory" in places:
+            indexes.append(session.user.get_current_world_inventory_index())
+        return name_index.NameIndex.combine(*indexes)
+
     if strict_match:
-        candidates = []
         matches = []
 
         if "saved_items" in strict_match:
-            saved_items = list(entities.Item.objects(room=None, saved_in=session.user.room.world_state))
-            matches += find_name_matches(name, saved_items, lambda i: i.item_id, loose_match=False, substr_match=False)
+            matches += session.user.room.world_state.get_saved_items_index().exact(name)
 
         if "connected_users" in strict_match:
-            match = next(entities.User.objects(name=name, client_id__ne=None), None)
+            match = presence.registry.with_name(name)
             if match is not None:
-                matches += [match]
-
-        if "room_items" in strict_match:
-            candidates += session.user.room.items
-
-        if "room_exits" in strict_match:
-            candidates += session.user.room.exits
-
-        if "inventory" in strict_match:
-            candidates += session.user.get_current_world_inventory().items
+                matches += [get_user(match)]
 
-        matches += find_name_matches(name, candidates, lambda e: e.name, loose_match=False, substr_match=False)
+        matches += candidates_index(strict_match).exact(name)
 
         if len(matches) == 1:
             return matches[0]
@@ -114,46 +103,33 @@ def name_to_entity(session, name, loose_match=[], substr_match=[], strict_match=
     if loose_match:
         # saved items take preference and are evaluated separately
         if "saved_items" in loose_match:
-            saved_items = list(entities.Item.objects(room=None, saved_in=session.user.room.world_state))
-            matches = find_name_matches(name, saved_items, lambda i: i.item_id, loose_match=True, substr_match=False)
+            matches = session.user.room.world_state.get_saved_items_index().possible_meanings(name, substr_match=False)
             if len(matches) == 1:
                 return matches[0]
             elif len(matches) > 1:
                 return "many"
 
         if "connected_users" in loose_match:
-            connected_users = list(entities.User.objects(client_id__ne=None))
-            matches = find_name_matches(name, connected_users, lambda u: u.name, loose_match=True, substr_match=False)
+            matches = presence.registry.get_name_index().possible_meanings(name, substr_match=False)
             if len(matches) == 1:
-                return matches[0]
+                return get_user(matches[0])
             elif len(matches) > 1:
                 return "many"
 
         if "world_users" in loose_match:
-            target_user = next(entities.User.objects(name=name, room__ne=None, client_id__ne=None), None)
-            if target_user and target_user.room.world_state == session.user.room.world_state:
-                return target_user
+            target_user = presence.registry.with_name(name)
+            if target_user and target_user.world_state_id == session.user.room.world_state.id:
+                return get_user(target_user)
 
         if "room_users" in loose_match:
-            room_users = list(entities.User.objects(room=session.user.room, client_id__ne=None))
+            room_users = presence.registry.in_room(session.get_room_id())
             matches = find_name_matches(name, room_users, lambda u: u.name, loose_match=True, substr_match=False)
             if len(matches) == 1:
-                return matches[0]
+                return get_user(matches[0])
             elif len(matches) > 1:
                 return "many"
 
-        candidates = []
-
-        if "room_items" in loose_match:
-            candidates += session.user.room.items
-
-        if "room_exits" in loose_match:
-            candidates += session.user.room.exits
-        
-        if "inventory" in loose_match:
-            candidates += session.user.get_current_world_inventory().items
-
-        matches = find_name_matches(name, candidates, lambda e: e.name, loose_match=True, substr_match=False)
+        matches = candidates_index(loose_match).possible_meanings(name, substr_match=False)
 
         if len(matches) == 1:
             return matches[0]
@@ -161,18 +137,7 @@ def name_to_entity(session, name, loose_match=[], substr_match=[], strict_match=
             return "many"
 
     if substr_match:
-        candidates = []
-
-        if "room_items" in substr_match:
-            candidates += session.user.room.items
-
-        if "room_exits" in substr_match:
-            candidates += session.user.room.exits
-
-        if "inventory" in substr_match:
-            candidates += session.user.get_current_world_inventory().items
-
-        matches = find_name_matches(name, candidates, lambda e: e.name, loose_match=True, substr_match=True)
+        matches = candidates_index(substr_match).possible_meanings(name)
 
         if len(matches) == 1:
             return matches[0]
@@ -182,33 +147,29 @@ def name_to_entity(session, name, loose_match=[], substr_match=[], strict_match=
     # no matches found in any level
     return None
 
+def get_user(user_presence):
+    """Returns the User entity of a connected user (see presence.Presence)."""
+    return next(iter(get_users([user_presence])), None)
+
+def get_users(user_presences):
+    """Returns the User entities of connected users (see presence.Presence), in
+    the same order, reading them with a single query."""
+    user_ids = [user_presence.user_id for user_presence in user_presences]
+    if not user_ids:
+        return []
+    users = {user.id: user for user in entities.User.objects(id__in=user_ids)}
+    return [users[user_id] for user_id in user_ids if user_id in users]
+
 def setup_logger(logger_name, log_file, console=False, level=logging.INFO):
     """Sets up a logger that can be used across all modules.
+    Its records are written to logs/log_file by a background thread (see logs.py).
+    Setting up a logger again does nothing.
     Example:
         setup_logger('log1', "logs.txt")  # Sets up the logger
         logger_1 = logging.getLogger('log1')  # Gets the logger (works from anywhere)
         logger_1.info('Some info to log')  # logs something
     """
-    if not os.path.exists('logs'):
-        os.makedirs('logs')
-
-# handler = logging.handlers.RotatingFileHandler(
-#              LOG_FILENAME, maxBytes=20, backupCount=5)
-
-    logger = logging.getLogger(logger_name)
-    formatter = logging.Formatter('%(asctime)s: %(message)s')
-    fileHandler = logging.FileHandler(os.getcwd() + '/logs/' + log_file, 'a', 'utf-8')
-    fileHandler.setFormatter(formatter)
-    if console:
-        streamHandler = logging.StreamHandler()
-        streamHandler.setFormatter(formatter)
-        logger.addHandler(streamHandler)  
-
-    logger.setLevel(level)
-    logger.addHandler(fileHandler)
-      
-
-    return logger
+    return logs.pipeline.setup_logger(logger_name, log_file, console=console, level=level)
 
 def fix_string(string, remove_breaks=False, max_length=None):
     if remove_breaks:
@@ -218,43 +179,22 @@ def fix_string(string, remove_breaks=False, max_length=None):
     return string
 
 def similar(text_one, text_two):
-    text_one = easy_text(text_one)
-    text_two = easy_text(text_two)
-
-    return text_one == text_two
+    return easy_text(text_one) == easy_text(text_two)
 
 def contains_similar(substring, bigstring):
-    substring = easy_text(substring)
-    bigstring = easy_text(bigstring)
-
-    return substring in bigstring
+    return easy_text(substring) in easy_text(bigstring)
 
 def easy_text(text):
-    text = text.lower()
-    text = remove_accents(text)
-    return text
-
-def remove_accents(text):
-    """Removes common accent characters."""
-
-    text = re.sub(u"[àáâãäå]", 'a', text)
-    text = re.sub(u"[èéêë]", 'e', text)
-    text = re.sub(u"[ìíîï]", 'i', text)
-    text = re.sub(u"[òóôõö]", 'o', text)
-    text = re.sub(u"[ùúûü]", 'u', text)
-    text = re.sub(u"[ýÿ]", 'y', text)
-    text = re.sub(u"[ñ]", 'n', text)
-
-    return text 
+    """Lowercases the text and removes its accents."""
+    return name_index.fold(text)
 
 def get_config():
-    with io.open('config.yml') as file:
-        config = yaml.load(file, Loader=yaml.FullLoader)
-    return config
+    """The values of config.yml. Prefer the typed accessors of config.config."""
+    return config_module.config.as_dict()
 
 
 def create_world(user, world=typing.Literal['riddle', 'tutorial'], public=False):
-    locale = get_config()['locale']
+    locale = config_module.config.locale
     if world == 'riddle':
         if locale == 'es_ES':
             filename = './architext/resources/monks_riddle_es.json'
@@ -275,11 +215,74 @@ def create_world(user, world=typing.Literal['riddle', 'tutorial'], public=False)
         world_dict = json.load(file)
     return world_from_dict(world_dict, world_name, user, public)
 
+# Process-wide registry of compiled patterns. Keys are the pattern strings
+# (or tuples of them), so each localized command is only compiled once.
+_compiled_patterns = {}
+_pattern_sets = {}
+
+def compile_pattern(pattern):
+    """Returns the compiled version of a regex pattern, compiling it only the
+    first time it is requested."""
+    compiled_pattern = _compiled_patterns.get(pattern)
+    if compiled_pattern is None:
+        compiled_pattern = regex.compile(pattern)
+        _compiled_patterns[pattern] = compiled_pattern
+    return compiled_pattern
+
+def get_pattern_set(pattern):
+    """Returns the PatternSet of one or more regex patterns, creating it only
+    the first time it is requested."""
+    key = tuple(pattern) if type(pattern) == list else pattern
+    pattern_set = _pattern_sets.get(key)
+    if pattern_set is None:
+        pattern_set = PatternSet(pattern)
+        _pattern_sets[key] = pattern_set
+    return pattern_set
+
+
+class PatternSet():
+    """A group of precompiled regex patterns that are checked together against
+    a string. See the match function for details about the matching rules."""
+
+    def __init__(self, pattern):
+        patterns = pattern if type(pattern) == list else [pattern]
+        self.compiled_patterns = [(p, compile_pattern(p)) for p in patterns]
+
+    def matches(self, string):
+        """True if the string fully matches any of the patterns."""
+        for p, compiled_pattern in self.compiled_patterns:
+            if compiled_pattern.fullmatch(string) is not None:
+                return True
+        return False
+
+    def match(self, string):
+        """Returns the captures dict of the first pattern that fully matches the
+        string, or None if there is no match."""
+        for p, compiled_pattern in self.compiled_patterns:
+            the_match = compiled_pattern.fullmatch(string)
+
+            if the_match is not None:
+                capturesdict = the_match.capturesdict()
+
+                for group in capturesdict:
+                    if len(capturesdict[group]) == 1:
+                        capturesdict[group] = capturesdict[group][0]
+                    elif len(capturesdict[group]) == 0:
+                        capturesdict[group] = None
+
+                capturesdict['pattern'] = p
+
+                return capturesdict
+
+        return None
+
+
 def match(pattern, string):
     """
     Checkes one or more regex patterns against a given string.
     For a match to ocurr, the string must fully match the pattern (see Python's
     re.Pattern.fullmatch function docs for more info.)
+    Patterns are compiled once and then reused (see get_pattern_set).
 
     Parameters
     ----------
@@ -301,31 +304,62 @@ def match(pattern, string):
     one match for that group, its key will contain a list with all the 
     matches.
     """
-    if type(pattern) != list:
-        pattern = [pattern]
-    
-    for p in pattern:
-        compiled_pattern = regex.compile(p)
-        the_match = compiled_pattern.fullmatch(string)
-        
-        if the_match is not None:
-            capturesdict = the_match.capturesdict()
-
-            for group in capturesdict:
-                if len(capturesdict[group]) == 1:
-                    capturesdict[group] = capturesdict[group][0]
-                elif len(capturesdict[group]) == 0:
-                    capturesdict[group] = None
+    return get_pattern_set(pattern).match(string)
+ 
 
-            capturesdict['pattern'] = p
+def literal_prefix(pattern):
+    """
+    Returns the literal text that any string fully matching the regex pattern
+    must start with. e.g. "give (?P<user_name>.+)" returns "give ".
+    Returns an empty string if the pattern has no fixed prefix.
+    """
+    if '|' in pattern:  # with alternatives there is no single prefix
+        return ''
+
+    special_characters = '.^$*+?{}[]\\|()'
+    quantifiers = '*+?{'
+    prefix = ''
+    for index, char in enumerate(pattern):
+        if char in special_characters:
+            # a quantifier applies to the last literal char, that is then optional
+            if char in quantifiers and prefix:
+                prefix = prefix[:-1]
+            break
+        prefix += char
+    return prefix
+
+
+def world_from_dict(world_dict, world_name, creator, public=False, progress=None):
+    """Creates a new world from a world dict, like the ones made by the
+    ExportWorld verb.
+
+    The dict is validated in memory before anything is written, so invalid
+    worlds are not partially created. Then all entities are written with
+    one batched insert per collection.
 
-            return capturesdict
+    Parameters
+    ----------
+    world_dict: dict
+        the world to create.
+    world_name: str
+        name of the new world.
+    creator: User
+        creator of the world. Items in the inventories of the world dict are
+        put in their inventory.
+    public: bool
+        whether the world is listed for everyone.
+    progress: callable
+        optional function that is called with messages that report the progress
+        of the import.
+
+    Raises
+    ------
+    entities.BadItem if an item or exit of the dict is not valid.
+    """
+    report_progress = progress if progress is not None else lambda message: None
 
-    return None
- 
+    validate_world_dict(world_dict)
 
-def world_from_dict(world_dict, world_name, creator, public=False):
-    
     new_world_state = entities.WorldState(save_on_creation=False)
     new_world = entities.World(save_on_creation=False, name=world_name, creator=creator, world_state=new_world_state, public=public)
     
@@ -336,7 +370,7 @@ def world_from_dict(world_dict, world_name, creator, public=False):
     inventories = []
     saved_items = []
 
-    new_world_state.starting_room, added_items = room_from_dict(world_dict['starting_room'])
+    new_world_state.starting_room, added_items = room_from_dict(world_dict['starting_room'], world_state=new_world_state)
     items += added_items
 
     for room_dict in world_dict['other_rooms']:
@@ -346,8 +380,9 @@ def world_from_dict(world_dict, world_name, creator, public=False):
     
     for verb_dict in world_dict['custom_verbs']:
         custom_verbs.append(custom_verb_from_dict(verb_dict))
+    new_world_state.custom_verbs = custom_verbs
 
-    all_rooms = other_rooms + [new_world_state.starting_room]
+    all_rooms = [new_world_state.starting_room] + other_rooms
     rooms_dict_by_alias = { room.alias: room for room in all_rooms }
     for exit_dict in world_dict['exits']:
         new_exit = exit_from_dict(exit_dict, rooms_dict_by_alias)
@@ -362,48 +397,84 @@ def world_from_dict(world_dict, world_name, creator, public=False):
 
     new_world_state._next_room_id = world_dict['next_room_id']
 
-    # todo: save all in the correct order
-    # save all entities that world_state references
-    for verb in new_world_state.starting_room.custom_verbs:
-        verb.save()
-    new_world_state.starting_room.save()
-    for verb in custom_verbs:
-        verb.save()
-    new_world_state.custom_verbs = custom_verbs
-    # now the world state can be saved
-    new_world_state.save()
-    # now we can add the world_state reference to the starting room
-    new_world_state.starting_room.world_state = new_world_state
-    new_world_state.starting_room.save()
-    # and save the saved items
-    for item in saved_items:
-        for verb in item.custom_verbs:
-            verb.save()
-        item.save()
-    # now we can save the rest of the rooms
-    for room in other_rooms:
-        for verb in room.custom_verbs:
-            verb.save()
-        room.save()
-    # now we can save the exits and items
-    for exit in exits:
-        exit.save()
-    for item in items:
-        for verb in item.custom_verbs:
-            verb.save()
-        item.save()
-    # we finally save the inventories
-    for inventory in inventories:
-        for item in inventory.items:
-            for verb in item.custom_verbs:
-                verb.save()
-            item.save()
-        inventory.save()
+    all_items = items + saved_items + [item for inventory in inventories for item in inventory.items]
+    all_custom_verbs = custom_verbs + [verb for entity in all_rooms + all_items for verb in entity.custom_verbs]
+
+    # documents are written in dependency order: each one after the ones it references
+    batches = [
+        (entities.CustomVerb, all_custom_verbs),
+        (entities.Room, all_rooms),
+        (entities.WorldState, [new_world_state]),
+        (entities.Exit, exits),
+        (entities.Item, all_items),
+        (entities.Inventory, inventories),
+    ]
+
+    # ids are given beforehand, so references can be written before the referenced documents
+    for document_class, documents in batches:
+        for document in documents:
+            document.id = bson.ObjectId()
+
+    total = sum(len(documents) for document_class, documents in batches)
+    saved = 0
+    for document_class, documents in batches:
+        if not documents:
+            continue
+        bulk_insert(document_class, documents)
+        saved += len(documents)
+        report_progress(_('{saved} of {total} entities saved.').format(saved=saved, total=total))
+
     # and the world itself
     new_world.save()
     return new_world
-    
 
+def bulk_insert(document_class, documents, batch_size=1000):
+    """Inserts new documents with insert_many, in batches of batch_size.
+    Fields are validated, but unlike Document.save the entities' own checks
+    (e.g. Item.ensure_i_am_valid) are not run."""
+    collection = document_class._get_collection()
+    for document in documents:
+        document.validate()
+    for start in range(0, len(documents), batch_size):
+        batch = documents[start:start+batch_size]
+        collection.insert_many([document.to_mongo() for document in batch], ordered=True)
+    for document in documents:
+        # from now on, saving these instances updates their documents
+        document._created = False
+        document._clear_changed_fields()
+
+# Stand-ins for the rooms, items and exits of a world dict, which have no ids
+# until they are saved. Rooms are identified by their alias.
+_DictRoom = collections.namedtuple('_DictRoom', ['id', 'alias'])
+_DictEntity = collections.namedtuple('_DictEntity', ['id', 'name', 'visible'])
+
+def validate_world_dict(world_dict):
+    """Checks in memory the name rules that Item and Exit enforce when they
+    are saved (see Item._get_name_validation_conditions), for all the items and
+    exits of a world dict. Their names are added to a NameRegistry in the order
+    they used to be saved, each one checked against the ones before it, so the
+    same exceptions are raised."""
+    registry = entities.name_registry.NameRegistry()
+    ids = itertools.count()
+
+    def validate(name, alias=None, takable=False):
+        local_room = _DictRoom(alias, alias) if alias is not None else None
+        conditions = entities.Item._get_name_validation_conditions(name, local_room, takable=takable, registry=registry)
+        for condition in conditions.values():
+            if not condition['condition']():
+                raise condition['exception']
+
+    for item_dict in world_dict['saved_items']:
+        validate(item_dict['name'])
+    for exit_dict in world_dict['exits']:
+        validate(exit_dict['name'], exit_dict['room'])
+        registry.add_exit(_DictEntity(next(ids), exit_dict['name'], None), exit_dict['room'])
+    for room_dict in [world_dict['starting_room']] + world_dict['other_rooms']:
+        for item_dict in room_dict['items']:
+            validate(item_dict['name'], room_dict['alias'], takable=item_dict['visible'] == 'takable')
+            registry.add_item(_DictEntity(next(ids), item_dict['name'], item_dict['visible']), room_dict['alias'])
+    for item_dict in world_dict['inventory']:
+        validate(item_dict['name'])
 
 def room_from_dict(room_dict, world_state=None):
     custom_verbs = [custom_verb_from_dict(verb_dict) for verb_dict in room_dict['custom_verbs']]
@@ -26,8 +26,10 @@ from .custom_verb import CustomVerb
 from .snapshots import CreateSnapshot, DeploySnapshot, PubishSnapshot, UnpubishSnapshot, DeleteSnapshot
 from .checks import CheckForItem
 from .privileges import MakeEditor, RemoveEditor
-from .lobby import EnterWorld, CreateWorld, DeployPublicSnapshot, GoToLobby, DeleteWorld, ImportWorld, JoinByInviteCode, RefreshLobby, LobbyHelp
+from .lobby import EnterWorld, CreateWorld, DeployPublicSnapshot, GoToLobby, DeleteWorld, ImportWorld, JoinByInviteCode, RefreshLobby, NextLobbyPage, PreviousLobbyPage, LobbyHelp
 from .edit_world import EditWorld
 from .export import ExportWorld
 from .who import Who
-from .roll import RollDice
\ No newline at end of file
+from .roll import RollDice
+from .server_stats import ServerStats
+from .dispatch import VerbIndex
\ No newline at end of file
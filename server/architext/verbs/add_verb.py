@@ -1,6 +1,7 @@
 from . import verb
 from .. import entities
 from .. import util
+from . import custom_verb_program
 import functools
 import textwrap
 import architext.strings as strings
@@ -148,6 +149,7 @@ class AddVerb(verb.Verb):
 
     def build_verb(self):
         new_verb = entities.CustomVerb(names=self.verb_names, commands=self.command_list)
+        custom_verb_program.compile_program(tuple(new_verb.commands))  # compiled now, so its first use is as fast as the rest
         if self.item is not None:
             self.item.add_custom_verb(new_verb)
             self.session.send_to_client(_('Verb created. Write "{verb_name} {item_name}" to unleash its power!').format(verb_name=self.verb_names[0], item_name=self.item.name))
@@ -1,6 +1,5 @@
 from . import verb
 from .. import  session
-import architext.util as util
 import regex
 
 class CheckForItem(verb.Verb):
@@ -11,6 +10,13 @@ class CheckForItem(verb.Verb):
     check_room_and_inv_command = _('if (?P<item_name>.+) in room or inventory')
     command = [check_room_command, check_inv_command, check_room_and_inv_command]
 
+    ok_messages = ['OK', 'ok', 'Ok', 'oK']
+
+    # places where the item is looked for
+    ROOM = 'room'
+    INVENTORY = 'inventory'
+    ROOM_OR_INVENTORY = 'room or inventory'
+
     def __init__(self, session):
         super().__init__(session)        
         self.current_process_function = self.process_first_message
@@ -22,20 +28,58 @@ class CheckForItem(verb.Verb):
     def process(self, message):
         self.current_process_function(message)
 
-    def process_first_message(self, message):
-        match = util.match(self.command, message)
+    @classmethod
+    def parse_condition(cls, message):
+        """Returns where the item has to be looked for and its name."""
+        match = cls.match_command(message)
+        locations = {
+            cls.check_room_command: cls.ROOM,
+            cls.check_inv_command: cls.INVENTORY,
+            cls.check_room_and_inv_command: cls.ROOM_OR_INVENTORY,
+        }
+        return locations[match['pattern']], match['item_name']
+
+    @classmethod
+    def parse_actions(cls, messages):
+        """Splits the messages that follow the condition into the actions of each
+        case, as they are processed one by one. Returns both lists of actions
+        and whether the messages include the end of the false case."""
+        actions = ([], [])
+        current_case = 0
+        for message in messages:
+            if not message.startswith('-'):
+                continue
+            message = message[1:]
+            if message in cls.ok_messages:
+                current_case += 1
+                if current_case == len(actions):
+                    return actions[0], actions[1], True
+            elif message:
+                actions[current_case].append(message)
+        return actions[0], actions[1], False
 
-        self.item_name = match['item_name']
+    @classmethod
+    def actions_length(cls, messages):
+        """Number of the messages that follow the condition that would be
+        processed as its actions."""
+        ok_count = 0
+        for length, message in enumerate(messages, start=1):
+            if message.startswith('-') and message[1:] in cls.ok_messages:
+                ok_count += 1
+                if ok_count == 2:
+                    return length
+        return len(messages)
+
+    def process_first_message(self, message):
+        location, self.item_name = self.parse_condition(message)
         
-        if match['pattern'] == self.check_room_command:
+        if location == self.ROOM:
             condition = _('there is an item called {item_name} in this room').format(item_name=self.item_name)
-            self.condition_to_check = self.item_name_is_at_room
-        elif match['pattern'] == self.check_inv_command:
+        elif location == self.INVENTORY:
             condition = _('there is an item called {item_name} in your inventory').format(item_name=self.item_name)
-            self.condition_to_check = self.item_name_is_at_inv
-        elif match['pattern'] == self.check_room_and_inv_command:
+        elif location == self.ROOM_OR_INVENTORY:
             condition = _('there is an item called {item_name} in this room or your inventory').format(item_name=self.item_name)
-            self.condition_to_check = self.item_name_is_at_room_or_inv
+        self.condition_to_check = lambda: self.check(self.session, location, self.item_name)
 
         self.session.send_to_client(_(
             'Write the actions to perform if {condition}.\n'
@@ -52,7 +96,7 @@ class CheckForItem(verb.Verb):
         
         message = message[1:]    
 
-        if message in ['OK', 'ok', 'Ok', 'oK']:
+        if message in self.ok_messages:
             self.session.send_to_client(_('Received. Now do the same with the actions you want to perform if the condition is not met.'))
             self.current_process_function = self.process_false_case_action 
         elif message:
@@ -67,7 +111,7 @@ class CheckForItem(verb.Verb):
         
         message = message[1:]
 
-        if message in ['OK', 'ok', 'Ok', 'oK']:
+        if message in self.ok_messages:
             self.session.send_to_client(_('OK, lets run it!'))
             self.check_and_run()
             self.finish_interaction()
@@ -82,21 +126,29 @@ class CheckForItem(verb.Verb):
         else:
             self.run(self.false_case_actions, self.session)
 
-    def item_name_is_at_room(self):
-        item_names = [item.name for item in self.session.user.room.items]
-        return self.item_name in item_names
-
-    def item_name_is_at_inv(self):
-        if isinstance(self.session, session.GhostSession):
-            working_session = self.session.creator_session
+    @classmethod
+    def check(cls, session, location, item_name):
+        """True if there is an item with that name at the given location."""
+        if location == cls.ROOM:
+            return cls.item_name_is_at_room(session, item_name)
+        elif location == cls.INVENTORY:
+            return cls.item_name_is_at_inv(session, item_name)
+        elif location == cls.ROOM_OR_INVENTORY:
+            return cls.item_name_is_at_room(session, item_name) or cls.item_name_is_at_inv(session, item_name)
+
+    @staticmethod
+    def item_name_is_at_room(session, item_name):
+        return len(session.user.room.get_items_index().exact(item_name)) > 0
+
+    @staticmethod
+    def item_name_is_at_inv(session_to_check, item_name):
+        if isinstance(session_to_check, session.GhostSession):
+            working_session = session_to_check.creator_session
         else:
-            working_session = self.session
+            working_session = session_to_check
 
         inventory = working_session.user.get_current_world_inventory()
-        return self.item_name in [item.name for item in inventory.items]
-
-    def item_name_is_at_room_or_inv(self):
-        return self.item_name_is_at_room() or self.item_name_is_at_inv()
+        return item_name in [item.name for item in inventory.items]
 
     @classmethod
     def run(cls, actions, session):
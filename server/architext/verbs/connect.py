@@ -40,8 +40,8 @@ class Connect(verb.Verb):
     def process_room_alias(self, message):
         if not message:
             self.session.send_to_client(strings.is_empty)
-        elif entities.Room.objects(alias=message, world_state=self.session.user.room.world_state):
-            self.other_room = entities.Room.objects(alias=message, world_state=self.session.user.room.world_state).first()
+        elif self.session.user.room.world_state.get_room_by_alias(message) is not None:
+            self.other_room = self.session.user.room.world_state.get_room_by_alias(message)
             self.exit_from_here.destination = self.other_room
             self.exit_from_there.room = self.other_room
             out_message = _(
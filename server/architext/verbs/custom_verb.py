@@ -1,8 +1,7 @@
 from .. import entities
-from .. import util
+from .. import name_index
 from .verb import Verb
-from .. import session
-import architext.strings as strings
+from . import custom_verb_program
 
 class CustomVerb(Verb):
     command = ''
@@ -14,22 +13,30 @@ class CustomVerb(Verb):
 
     @classmethod
     def search_for_custom_verb(cls, message, session):
+        room = session.user.room
+        table = room.get_custom_verb_table()  # None if the room isn't part of a saved world
         if len(message.split(" ", 1)) == 2:  # if the message has the form "verb item"
             target_verb_name, target_item_name = message.split(" ", 1)
-            candidate_items = session.user.room.items + session.user.get_current_world_inventory().items
-            items_they_may_be_referring_to = util.possible_meanings(target_item_name, [i.name for i in candidate_items])
+            if table is not None and not table.may_be_item_verb(target_verb_name, room.id):
+                return None
+            candidate_items = name_index.NameIndex.combine(
+                room.get_items_index(),
+                session.user.get_current_world_inventory_index()
+            )
+            items_they_may_be_referring_to = candidate_items.possible_meanings(target_item_name)
             if len(items_they_may_be_referring_to) == 1:
-                target_item_name = items_they_may_be_referring_to[0]
-                suitable_item_found = next(filter(lambda i: i.name==target_item_name, candidate_items))
+                suitable_item_found = items_they_may_be_referring_to[0]
                 suitable_verb_found_in_item = next(filter(lambda v: v.is_name(target_verb_name), suitable_item_found.custom_verbs), None)
                 if suitable_verb_found_in_item is not None:
                     return suitable_verb_found_in_item
+        elif table is not None:
+            return table.room_verb(message, room.id) or table.world_verb(message)
         else:
             target_verb_name = message
-            suitable_verb_found_in_room = next(filter(lambda v: v.is_name(target_verb_name), session.user.room.custom_verbs), None)
+            suitable_verb_found_in_room = next(filter(lambda v: v.is_name(target_verb_name), room.custom_verbs), None)
             if suitable_verb_found_in_room is not None:
                 return suitable_verb_found_in_room
-            world = session.user.room.world_state
+            world = room.world_state
             suitable_verb_found_in_world = next(filter(lambda v: v.is_name(target_verb_name), world.custom_verbs), None)
             if suitable_verb_found_in_world is not None:
                 return suitable_verb_found_in_world
@@ -41,6 +48,8 @@ class CustomVerb(Verb):
 
     def process(self, message):
         if self.custom_verb_definition is None:
+            # searched again, since can_process doesn't keep what it finds. It is cheap
+            # with the CustomVerbTable and the name indexes of the world graph.
             self.custom_verb_definition = self.search_for_custom_verb(message, self.session)
         if self.custom_verb_definition is None:
             raise Exception('Invalid message passed to verbs.CustomVerb')
@@ -62,17 +71,6 @@ class CustomVerb(Verb):
             #TODO log max recursion depth exceeded (this self.session has no logger)
             pass
         else:
-            for message in custom_verb.commands:
-                formatted_message = self.format_custom_verb_message(message)
-                ghost.process_message(formatted_message)
-            ghost.disconnect()
-
-    def format_custom_verb_message(self, message):
-        if isinstance(self.session, session.GhostSession):
-            working_session = self.session.creator_session
-        else:
-            working_session = self.session
-  
-        message = message.replace(strings.user_name_placeholder, working_session.user.name)
-  
-        return message
\ No newline at end of file
+            program = custom_verb_program.compile_program(tuple(custom_verb.commands))
+            program.run(ghost, creator_session.user.name)
+            ghost.disconnect()
\ No newline at end of file
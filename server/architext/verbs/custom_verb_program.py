@@ -0,0 +1,122 @@
+"""Custom verbs compiled into programs.
+
+A custom verb is a list of commands that a ghost session executes as if they
+were sent by a player. Instead of dispatching each command through the verb
+list of the session every time the verb is used, the commands are compiled
+once into a Program: the verb that processes each command is resolved in
+advance, and "if ... in room/inventory" blocks (see CheckForItem) become
+Conditions with both branches already compiled.
+
+Whether a command is itself a custom verb depends on the world at the moment it
+runs, so commands that a custom verb may process are still checked against the
+CustomVerb verb first, as the session would do. Likewise, verbs that override
+can_process (e.g. ServerStats, which checks who the user is) can only decide at
+run time, so commands that may reach one of them are dispatched by the session
+as usual.
+
+Programs only depend on the commands, so they are cached by them (see
+compile_program) and shared by all the instances of the same custom verb.
+"""
+import functools
+from .. import session as session_module
+from .. import strings
+from . import verb as verb_module
+from . import custom_verb as custom_verb_module
+from .checks import CheckForItem
+
+
+@functools.lru_cache(maxsize=1024)
+def compile_program(commands):
+    """Returns the Program of a tuple of commands."""
+    return Program(commands)
+
+
+def _format(text, user_name):
+    return text.replace(strings.user_name_placeholder, user_name)
+
+
+class Command():
+    """A command, with the verb that will process it resolved in advance."""
+
+    def __init__(self, text):
+        self.text = text
+        self.verb, self.may_be_custom_verb, self.resolved = self.resolve(text)
+
+    @staticmethod
+    def resolve(text):
+        """Returns the first verb that can process the text in a world, whether a
+        custom verb has priority over it, and whether the verb could be resolved
+        in advance (False if a verb that overrides can_process may process it)."""
+        may_be_custom_verb = False
+        for verb in session_module.Session.verb_index.candidates(text, verb_module.WORLDVERB):
+            if verb is custom_verb_module.CustomVerb:
+                may_be_custom_verb = True
+            elif verb.can_process.__func__ is not verb_module.Verb.can_process.__func__:
+                return None, may_be_custom_verb, False
+            elif verb.message_matches_command(text):
+                return verb, may_be_custom_verb, True
+        return None, may_be_custom_verb, True
+
+    def run(self, session, user_name):
+        message = _format(self.text, user_name)
+        if session.current_verb is not None or not self.resolved:
+            # the message is for a verb that is still being processed (e.g. an item being crafted),
+            # or its verb can only be found by polling the verbs now
+            session.process_message(message)
+        elif self.may_be_custom_verb and custom_verb_module.CustomVerb.can_process(message, session):
+            session.process_message(message, resolved_verb=custom_verb_module.CustomVerb)
+        elif self.verb is not None:
+            session.process_message(message, resolved_verb=self.verb)
+
+
+class Condition():
+    """An "if ... in room/inventory" block, with both branches compiled."""
+
+    def __init__(self, lines):
+        self.lines = lines
+        self.commands = [Command(line) for line in lines]  # to run the block as plain commands, if needed
+        self.location, self.item_name = CheckForItem.parse_condition(lines[0])
+        true_case_actions, false_case_actions, self.complete = CheckForItem.parse_actions(lines[1:])
+        self.true_case = Program(true_case_actions)
+        self.false_case = Program(false_case_actions)
+
+    def run(self, session, user_name):
+        if session.current_verb is not None or (
+            self.commands[0].may_be_custom_verb and custom_verb_module.CustomVerb.can_process(_format(self.lines[0], user_name), session)
+        ):
+            for command in self.commands:
+                command.run(session, user_name)
+            return
+
+        if not self.complete:  # the actions are never run if the block doesn't end
+            return
+
+        item_name = _format(self.item_name, user_name)
+        if CheckForItem.check(session, self.location, item_name):
+            actions = self.true_case
+        else:
+            actions = self.false_case
+        previous_session_verb = session.current_verb
+        session.current_verb = None
+        actions.run(session, user_name)
+        session.current_verb = previous_session_verb
+
+
+class Program():
+    def __init__(self, commands):
+        self.steps = []
+        lines = [command.strip() for command in commands]
+        next_line = 0
+        while next_line < len(lines):
+            command = Command(lines[next_line])
+            if command.verb is CheckForItem:
+                block_length = 1 + CheckForItem.actions_length(lines[next_line+1:])
+                self.steps.append(Condition(lines[next_line:next_line+block_length]))
+                next_line += block_length
+            else:
+                self.steps.append(command)
+                next_line += 1
+
+    def run(self, session, user_name):
+        for step in self.steps:
+            step.run(session, user_name)
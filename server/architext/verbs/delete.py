@@ -1,5 +1,6 @@
 from . import verb
 from .. import entities
+from .. import presence
 
 class DeleteRoom(verb.Verb):
     """This verb allows users to delete their current room.
@@ -13,7 +14,7 @@ class DeleteRoom(verb.Verb):
     def process(self, message):
         room_to_delete = self.session.user.room
 
-        if len([user for user in entities.User.objects(room=room_to_delete) if user.client_id != None]) > 1:
+        if len(presence.registry.in_room(room_to_delete.id)) > 1:
             self.session.send_to_client(_("You can't delete the room if there are other players here."))
         if room_to_delete.alias == "0":
             self.session.send_to_client(_('You can\'t delete the starting room. But you can edit it if you don\'t like it :-)'))
@@ -86,7 +87,7 @@ class DeleteItem(verb.Verb):
     def process(self, message):
         command_length = len(self.command)
         item_name = message[command_length:]
-        selected_item = next(entities.Item.objects(room=self.session.user.room, name=item_name), None)
+        selected_item = next((item for item in self.session.user.room.items if item.name == item_name), None)
 
         if selected_item is None:
             self.session.send_to_client(_(
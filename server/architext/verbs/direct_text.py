@@ -12,7 +12,7 @@ class TextToOne(verb.Verb):
     permissions = verb.PRIVILEGED
 
     def process(self, message):
-        match = util.match(self.command, message)
+        match = self.match_command(message)
         user_name = match['user_name'].strip()
         text = match['text'].strip()
 
@@ -0,0 +1,53 @@
+from . import verb as verb_module
+
+class VerbIndex():
+    """Index of the verbs supported by a session, used to find the verbs that may
+    process a message without polling every verb of the list.
+
+    Verbs are grouped by the context they can be used in (lobby or world) and then
+    by the first character of their command prefixes. Verbs without a fixed prefix
+    (empty commands, regexes starting with a special character...) are candidates
+    for any message of their context.
+
+    Regex commands are compiled when the index is built, once per process.
+
+    The priority order of the verb list is kept: candidates are always returned
+    in the same order they have in the list.
+    """
+
+    CONTEXTS = [verb_module.LOBBYVERB, verb_module.WORLDVERB]
+
+    def __init__(self, verbs):
+        self.verbs = verbs
+        for verb in verbs:
+            verb.compile_command()
+        self._index = {context: self._build_context_index(context) for context in self.CONTEXTS}
+
+    def _build_context_index(self, context):
+        wildcards = []       # (priority, verb) pairs that can process messages starting with anything.
+        by_first_char = {}   # first char of a prefix: list of (priority, verb) pairs.
+
+        for priority, verb in enumerate(self.verbs):
+            if verb.verbtype not in [context, verb_module.VERSATILE]:
+                continue
+
+            prefixes = verb.command_prefixes()
+            if '' in prefixes:
+                wildcards.append((priority, verb))
+            else:
+                for first_char in set(prefix[0] for prefix in prefixes):
+                    by_first_char.setdefault(first_char, []).append((priority, verb))
+
+        # each bucket is merged with the wildcards once, so a lookup is a single dict access
+        candidates_by_first_char = {
+            first_char: [verb for priority, verb in sorted(wildcards + bucket, key=lambda pair: pair[0])]
+            for first_char, bucket in by_first_char.items()
+        }
+        default_candidates = [verb for priority, verb in wildcards]
+        return candidates_by_first_char, default_candidates
+
+    def candidates(self, message, context):
+        """Returns, ordered by priority, the verbs of the given context that may be
+        able to process the message. Their can_process method still has the last word."""
+        candidates_by_first_char, default_candidates = self._index[context]
+        return candidates_by_first_char.get(message[:1], default_candidates)
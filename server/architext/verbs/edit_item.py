@@ -123,23 +123,14 @@ class EditItem(verb.Verb):
         
         if message:
             if self.option_number == 1:  # edit name
+                old_name = object_to_edit.name
                 object_to_edit.name = message
                 try:
                     object_to_edit.ensure_i_am_valid()
-                except entities.NameNotGloballyUnique:
-                    self.session.send_to_client(_('There is another entity with that name in this world. Since the item you are editing is takable, it needs an unique name. Enter another name.'))
-                    return
-                except entities.EmptyName:
-                    self.session.send_to_client(strings.is_empty)
-                    return
-                except entities.WrongNameFormat:
-                    self.session.send_to_client(strings.wrong_format)
-                    return
-                except entities.RoomNameClash:
-                    self.session.send_to_client(strings.room_name_clash)
-                    return
-                except entities.TakableItemNameClash:
-                    self.session.send_to_client(strings.takable_name_clash)
+                except entities.BadItem as bad_name:
+                    # the entity is shared through the world cache, so it can't keep the rejected name
+                    object_to_edit.name = old_name
+                    self.send_bad_name_message(bad_name)
                     return
             elif self.option_number == 2:  # edit description
                 object_to_edit.description = message
@@ -161,9 +152,9 @@ class EditItem(verb.Verb):
                     self.session.send_to_client(strings.wrong_value)
                     return
             elif self.option_number == 4:  # edit exit's destination
-                destination_room = entities.Room.objects(alias=message, world_state=self.session.user.room.world_state)
-                if destination_room:
-                    object_to_edit.destination = destination_room.first()
+                destination_room = self.session.user.room.world_state.get_room_by_alias(message)
+                if destination_room is not None:
+                    object_to_edit.destination = destination_room
                 else:
                     self.session.send_to_client(strings.room_not_found)
                     self.finish_interaction()
@@ -174,6 +165,20 @@ class EditItem(verb.Verb):
         else:
             self.session.send_to_client(strings.is_empty)
 
+    def send_bad_name_message(self, bad_name):
+        if isinstance(bad_name, entities.NameNotGloballyUnique):
+            self.session.send_to_client(_('There is another entity with that name in this world. Since the item you are editing is takable, it needs an unique name. Enter another name.'))
+        elif isinstance(bad_name, entities.EmptyName):
+            self.session.send_to_client(strings.is_empty)
+        elif isinstance(bad_name, entities.WrongNameFormat):
+            self.session.send_to_client(strings.wrong_format)
+        elif isinstance(bad_name, entities.RoomNameClash):
+            self.session.send_to_client(strings.room_name_clash)
+        elif isinstance(bad_name, entities.TakableItemNameClash):
+            self.session.send_to_client(strings.takable_name_clash)
+        else:
+            raise bad_name
+
 
     def can_change_to_takable(self, item_to_change):
         return entities.Item.name_is_valid(item_to_change.name, item_to_change.room, ignore_item=item_to_change, takable=True)
@@ -1,11 +1,13 @@
 from .verb import Verb
+from .. import entities
 
 class Exits(Verb):
     """This verb shows users all exits that are not hidden"""
     command = _('exits')
 
     def process(self, message):
-        exits_names = [exit.name for exit in self.session.user.room.exits if not exit.is_hidden()]
+        room = entities.RoomView.load(self.session.user.room)
+        exits_names = [exit.name for exit in room.exits if not exit.is_hidden()]
 
         if exits_names:
             out_message =_('Obvious exits:') + '\n ⮕ ' + '\n ⮕ '.join(exits_names)
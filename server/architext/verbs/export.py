@@ -1,25 +1,38 @@
 from . import verb
 from .. import entities
+from ..adapters.sender import MessageOptions
+import base64
 import json
-import textwrap
-from .. import util
+import zlib
 
 class ExportWorld(verb.Verb):
+    """Exports the current world as text that can be imported at the lobby.
+
+    The world is read with one query per collection, as raw documents with only
+    the fields the export needs (see WorldStateExport), and those documents are
+    kept in memory while the export is written. The text is produced from them
+    piece by piece.
+
+    The encoded export is sent in chunks of at most CHUNK_SIZE characters, each
+    leaving as soon as it is ready; the import joins them back, since the
+    encoded text has no whitespace. The pretty export is sent as a single
+    message, so that it is not split in the middle of a line and can be copied
+    back as it is.
+    """
+
     command = _("export")
     pretty_command = _("export pretty")
     permissions = verb.PRIVILEGED
 
+    CHUNK_SIZE = 16 * 1024
+
     def process(self, message):
         world_state = self.session.user.room.world_state
-        world_state_dict_representation = self.dump_world_state(world_state)
         if message == self.pretty_command:
-            export = json.dumps(
-                world_state_dict_representation, 
-                indent=4,
-                separators=(',', ': ')
-            )
+            export = self.iter_world_state_json(world_state, indent=4)
         else:
-            export = util.encode_dict(world_state_dict_representation)
+            export = self.iter_encoded(self.iter_world_state_json(world_state))
+
         header = _(
             'Your world:\n'
             '────────────────────────────────────────────────────────────\n'
@@ -31,79 +44,175 @@ class ExportWorld(verb.Verb):
             'You can import this and any exported world at the lobby.\n'
             'Note that the "export pretty" option may mess with the whitespaces in your names and descriptions.'
         )
-        self.session.send_to_client(header + export + '\n' + footer)
+        self.session.send_to_client(header)
+        if message == self.pretty_command:
+            self.session.send_to_client(''.join(export), options=MessageOptions(section=False))
+        else:
+            for chunk in self.iter_chunks(export, self.CHUNK_SIZE):
+                self.session.send_to_client(chunk, options=MessageOptions(section=False))
+                # each chunk leaves as soon as possible, instead of piling up until the command ends
+                self.session.sender.flush()
+        self.session.send_to_client(footer, options=MessageOptions(section=False))
         self.finish_interaction()
 
-    def dump_item(self, item):
-        custom_verbs = [self.dump_custom_verb(verb) for verb in item.custom_verbs]
-        return {
-            "item_id": item.item_id,
-            "name": item.name,
-            "description": item.description,
-            "visible": item.visible,
-            "custom_verbs": custom_verbs
-        }
+    @staticmethod
+    def iter_chunks(pieces, chunk_size):
+        """Regroups an iterable of strings into strings of chunk_size characters
+        (but the last one, which may be shorter)."""
+        buffer = ''
+        for piece in pieces:
+            buffer += piece
+            while len(buffer) >= chunk_size:
+                yield buffer[:chunk_size]
+                buffer = buffer[chunk_size:]
+        if buffer:
+            yield buffer
+
+    @staticmethod
+    def iter_encoded(pieces):
+        """Same as util.encode_dict, but for a JSON string given piece by piece."""
+        compressor = zlib.compressobj()
+        pending = b''  # base64 encodes groups of 3 bytes, the rest waits for more data
+        for piece in pieces:
+            pending += compressor.compress(piece.encode('utf-8'))
+            complete_length = len(pending) - len(pending) % 3
+            if complete_length:
+                yield base64.b64encode(pending[:complete_length]).decode()
+                pending = pending[complete_length:]
+        pending += compressor.flush()
+        yield base64.b64encode(pending).decode()
+
+    def iter_world_state_json(self, world_state, indent=None):
+        """Yields the JSON of the world state export piece by piece. Joined, the
+        pieces are equal to json.dumps of the whole export dict."""
+        export = WorldStateExport(world_state)
+        members = [
+            ("next_room_id", export.next_room_id),
+            ("starting_room", export.starting_room),
+            ("other_rooms", export.iter_other_rooms()),
+            ("custom_verbs", export.custom_verbs),
+            ("exits", export.iter_exits()),
+            ("inventory", export.iter_inventory()),
+            ("saved_items", export.iter_saved_items()),
+        ]
+
+        separators = (',', ': ') if indent else (', ', ': ')
+        member_indent = '\n' + ' ' * indent if indent else ''
+        element_indent = '\n' + ' ' * indent * 2 if indent else ''
+
+        def dumps(value, indentation):
+            value_json = json.dumps(value, indent=indent, separators=separators)
+            return value_json.replace('\n', indentation) if indent else value_json
+
+        yield '{'
+        for member_index, (key, value) in enumerate(members):
+            yield (separators[0] if member_index > 0 else '') + member_indent + json.dumps(key) + separators[1]
+            if isinstance(value, (list, dict, str, int)) or value is None:
+                yield dumps(value, member_indent)
+            else:  # lists given as iterators are written element by element
+                empty = True
+                for element in value:
+                    yield ('[' if empty else separators[0]) + element_indent + dumps(element, element_indent)
+                    empty = False
+                yield '[]' if empty else member_indent + ']'
+        yield ('\n' if indent else '') + '}'
+
 
-    def dump_custom_verb(self, custom_verb):
+class WorldStateExport():
+    """Reads a world state to export it, with one query per collection. Rooms,
+    exits and items are read as raw documents, with only the fields the export needs."""
+
+    def __init__(self, world_state):
+        room_collection = entities.Room._get_collection()
+        exit_collection = entities.Exit._get_collection()
+        item_collection = entities.Item._get_collection()
+        inventory_collection = entities.Inventory._get_collection()
+        custom_verb_collection = entities.CustomVerb._get_collection()
+
+        item_fields = {'item_id': 1, 'name': 1, 'description': 1, 'visible': 1, 'custom_verbs': 1, 'room': 1}
+
+        world_state_document = entities.WorldState._get_collection().find_one({'_id': world_state.id})
+        self.next_room_id = world_state_document.get('_next_room_id', 1)
+        self.rooms = list(room_collection.find({'world_state': world_state.id}, {'name': 1, 'alias': 1, 'description': 1, 'custom_verbs': 1}))
+        room_ids = [room['_id'] for room in self.rooms]
+        self.room_aliases = {room['_id']: room['alias'] for room in self.rooms}
+        self.starting_room_id = world_state_document['starting_room']
+
+        self.items_by_room = {room_id: [] for room_id in room_ids}
+        for item in item_collection.find({'room': {'$in': room_ids}}, item_fields):
+            self.items_by_room[item['room']].append(item)
+
+        self.exits_by_room = {room_id: [] for room_id in room_ids}
+        for exit in exit_collection.find({'room': {'$in': room_ids}}):
+            self.exits_by_room[exit['room']].append(exit)
+
+        inventories = list(inventory_collection.find({'world_state': world_state.id}, {'items': 1}))
+        self.carried_item_ids = [item_id for inventory in inventories for item_id in inventory.get('items', [])]
+        self.carried_items = {item['_id']: item for item in item_collection.find({'_id': {'$in': self.carried_item_ids}}, item_fields)}
+        self.saved_items = list(item_collection.find({'saved_in': world_state.id}, item_fields))
+
+        documents_with_verbs = [world_state_document] + self.rooms + [item for items in self.items_by_room.values() for item in items] + list(self.carried_items.values()) + self.saved_items
+        verb_ids = [verb_id for document in documents_with_verbs for verb_id in document.get('custom_verbs', [])]
+        self.verbs = {verb['_id']: verb for verb in custom_verb_collection.find({'_id': {'$in': verb_ids}})}
+
+        self.custom_verbs = self.dump_custom_verbs(world_state_document)
+        starting_room = next(room for room in self.rooms if room['_id'] == self.starting_room_id)
+        self.starting_room = self.dump_room(starting_room)
+
+    def dump_custom_verbs(self, document):
+        return [
+            {
+                "names":    self.verbs[verb_id].get('names', []),
+                "commands": self.verbs[verb_id].get('commands', []),
+            }
+            for verb_id in document.get('custom_verbs', []) if verb_id in self.verbs
+        ]
+
+    def dump_item(self, item):
         return {
-            "names":    custom_verb.names,
-            "commands": custom_verb.commands,
+            "item_id": item.get('item_id'),
+            "name": item['name'],
+            "description": item.get('description'),
+            "visible": item.get('visible', 'listed'),
+            "custom_verbs": self.dump_custom_verbs(item)
         }
 
     def dump_exit(self, exit):
         return {
-            "name": exit.name,
-            "description": exit.description,
-            "destination": exit.destination.alias,
-            "room": exit.room.alias,
-            "visible": exit.visible,
-            "is_open": exit.is_open,
-            "key_names": exit.key_names
+            "name": exit['name'],
+            "description": exit.get('description'),
+            "destination": self.room_aliases.get(exit['destination']),
+            "room": self.room_aliases[exit['room']],
+            "visible": exit.get('visible', 'listed'),
+            "is_open": exit.get('is_open', True),
+            "key_names": exit.get('key_names', [])
         }
 
     def dump_room(self, room):
-        custom_verbs = [self.dump_custom_verb(verb) for verb in room.custom_verbs]
-        items = [self.dump_item(item) for item in entities.Item.objects(room=room)]
         return {
-            "name": room.name,
-            "alias": room.alias,
-            "description": room.description,
-            "custom_verbs": custom_verbs,
-            "items": items
+            "name": room['name'],
+            "alias": room['alias'],
+            "description": room.get('description'),
+            "custom_verbs": self.dump_custom_verbs(room),
+            "items": [self.dump_item(item) for item in self.items_by_room[room['_id']]]
         }
 
-    def dump_inventories(self, inventories):
-        items = []
-        for inventory in inventories:
-            items += inventory.items
-        return [self.dump_item(item) for item in items]
-
-    def dump_world_state(self, world_state):
-        starting_room = world_state.starting_room
+    def iter_other_rooms(self):
+        for room in self.rooms:
+            if room['_id'] != self.starting_room_id:
+                yield self.dump_room(room)
 
-        other_rooms = entities.Room.objects(world_state=world_state, alias__ne=starting_room.alias)
-        other_rooms = [self.dump_room(room) for room in other_rooms]
+    def iter_exits(self):
+        for room in self.rooms:
+            for exit in self.exits_by_room[room['_id']]:
+                yield self.dump_exit(exit)
 
-        custom_verbs = [self.dump_custom_verb(verb) for verb in world_state.custom_verbs]
-
-        exits = []
-        for room in entities.Room.objects(world_state=world_state):
-            exits += room.exits
-        exits = [self.dump_exit(exit) for exit in exits]
- 
+    def iter_inventory(self):
         # all items in inventories are extracted to be placed at the importer inventory.
-        inventories = entities.Inventory.objects(world_state=world_state)
-        inventory = self.dump_inventories(inventories)
-
-        saved_items = entities.Item.objects(saved_in=world_state)
-        saved_items = [self.dump_item(item) for item in saved_items]
+        for item_id in self.carried_item_ids:
+            if item_id in self.carried_items:
+                yield self.dump_item(self.carried_items[item_id])
 
-        return {
-            "next_room_id": world_state._next_room_id,
-            "starting_room": self.dump_room(starting_room),
-            "other_rooms": other_rooms,
-            "custom_verbs": custom_verbs,
-            "exits": exits,
-            "inventory": inventory,
-            "saved_items": saved_items
-        }
\ No newline at end of file
+    def iter_saved_items(self):
+        for item in self.saved_items:
+            yield self.dump_item(item)
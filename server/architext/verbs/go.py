@@ -1,6 +1,5 @@
 from .verb import Verb
 from .look import Look 
-from .. import util
 from .. import strings
 
 class Go(Verb):
@@ -11,11 +10,9 @@ class Go(Verb):
     def process(self, message):
         command_length = len(self.command)
         partial_exit_name = message[command_length:]
-        available_exits = [exit.name for exit in self.session.user.room.exits]
-        possible_meanings = util.possible_meanings(partial_exit_name, available_exits)
+        possible_meanings = self.session.user.room.get_exits_index().possible_meanings(partial_exit_name)
         if len(possible_meanings) == 1:
-            selected_exit_name = possible_meanings[0]
-            selected_exit = next(filter(lambda e: e.name==selected_exit_name, self.session.user.room.exits))
+            selected_exit = possible_meanings[0]
             self.go(selected_exit)
         elif len(possible_meanings) > 1:
             self.session.send_to_client(_('There is more than one exit with a similar name. Please be more specific.'))
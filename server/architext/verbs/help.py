@@ -1,5 +1,4 @@
 from . import verb
-from .. import util
 import re
 
 class Help(verb.Verb):
@@ -12,7 +11,7 @@ class Help(verb.Verb):
     command = [general_help, topic_help]
 
     def process(self, message):
-        match = util.match(self.command, message)
+        match = self.match_command(message)
         
         topic = match.get('topic')
         if topic is not None:
@@ -110,7 +109,7 @@ class Help(verb.Verb):
                 '  talk <message> ─ to talk with other players in your room.\n'
                 '  emote <action> ─ to dance, gesticulate or whatever you want. Just try it!\n'
                 '  shout <message> ─ all players in your world will hear you.\n'
-                '  who ─ to see who is online\n'
+                '  who ─ to see who is online. "who <name>" and "who in <world>" filter the list\n'
                 '  roll <dice> ─ to roll some dice. Dice can be expressions like 1d6, 2d6+1, etc.\n'
                 '\n'
                 'Don\'t be shy and say hello :)\n'
@@ -86,30 +86,31 @@ class Info(verb.Verb):
 
     
     def show_current_room_info(self):
-        room_name = self.session.user.room.name
-        description = self.session.user.room.description
-        alias = self.session.user.room.alias
+        room = entities.RoomView.load(self.session.user.room)
+        room_name = room.name
+        description = room.description
+        alias = room.alias
 
         exit_list = []
-        for exit in self.session.user.room.exits:
+        for exit in room.exits:
             exit_list.append(
                 _('   "{exit_name}" lleva a "{destination_name}" number {destination_alias} ({exit_visibility})')
                     .format(
                         exit_name=exit.name, 
-                        destination_name=exit.destination.name, 
-                        destination_alias=exit.destination.alias,
+                        destination_name=exit.destination_name, 
+                        destination_alias=exit.destination_alias,
                         exit_visibility=self.visible_output(exit)
                     )
             )
         exit_string = '\n'.join(exit_list)
 
         item_list = []
-        for item in self.session.user.room.items:
+        for item in room.items:
             item_list.append(f'   {item.name} ({self.visible_output(item)})')
         item_string = '\n'.join(item_list)
         
-        players_online = ', '.join(['{}'.format(user.name) for user in entities.User.objects(room=self.session.user.room, client_id__ne=None)])
-        players_offline = ', '.join(['{}'.format(user.name) for user in entities.User.objects(room=self.session.user.room, client_id=None)])
+        players_online = ', '.join(['{}'.format(user.name) for user in room.online_players()])
+        players_offline = ', '.join(['{}'.format(user.name) for user in room.offline_players()])
         title = _('Room "{room_name}"').format(room_name=room_name)
         body = _(
             'Room number: {alias}\n'
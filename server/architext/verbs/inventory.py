@@ -1,7 +1,7 @@
 from .verb import Verb
 from .. import util
 import functools
-from .. import entities
+from .. import presence
 import architext.strings as strings
 
 class Take(Verb):
@@ -78,12 +78,13 @@ class Give(Verb):
     command = _("give (?P<user_name>.+) - (?P<item_name>.+)")
 
     def process(self, message):
-        match = util.match(self.command, message)
+        match = self.match_command(message)
         target_user_name = match['user_name'].strip()
         target_item_name = match['item_name'].strip()
 
-        target_user = next(entities.User.objects(name=target_user_name, room=self.session.user.room, client_id__ne=None), None)
-        item = next(entities.Item.objects(name=target_item_name, room=self.session.user.room, visible='takable'), None)
+        target_presences = [user for user in presence.registry.in_room(self.session.get_room_id()) if user.name == target_user_name]
+        target_user = next(iter(util.get_users(target_presences)), None)
+        item = next((item for item in self.session.user.room.items if item.name == target_item_name and item.is_takable()), None)
 
         if target_user is not None and item is not None:
             target_user.get_current_world_inventory().add_item(item)
@@ -98,11 +99,12 @@ class TakeFrom(Verb):
     command = _("takefrom (?P<user_name>.+) - (?P<item_name>.+)")
 
     def process(self, message):
-        match = util.match(self.command, message)
+        match = self.match_command(message)
         target_user_name = match['user_name'].strip()
         target_item_name = match['item_name'].strip()
 
-        target_user = next(entities.User.objects(name=target_user_name, room=self.session.user.room, client_id__ne=None), None)
+        target_presences = [user for user in presence.registry.in_room(self.session.get_room_id()) if user.name == target_user_name]
+        target_user = next(iter(util.get_users(target_presences)), None)
         
         if target_user is not None:
             target_item = next(filter(lambda i: i.name==target_item_name, target_user.get_current_world_inventory().items), None)
@@ -1,11 +1,13 @@
 from .verb import Verb
+from .. import entities
 
 class Items(Verb):
     """This verb shows users all items that are not hidden"""
     command = _('items')
 
     def process(self, message):
-        items_names = [item.name for item in self.session.user.room.items if not item.is_hidden()]
+        room = entities.RoomView.load(self.session.user.room)
+        items_names = [item.name for item in room.items if not item.is_hidden()]
 
         if items_names:
             out_message = _('Obvious items:\n ● ') + f'\n {chr(9679)} '.join(items_names)
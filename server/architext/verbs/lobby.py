@@ -13,19 +13,25 @@ import architext.strings as strings
 
 class LobbyMenu(verb.Verb):
     '''Helper class that has the method that shows the lobby menu'''
-    def show_lobby_menu(self):
+    def show_lobby_menu(self, first_index=0):
         out_message = ""
 
-        self.session.world_list_cache = self.get_worlds_list()
+        self.session.world_list_cache = entities.WorldList.load(self.session.user, first_index=first_index)
 
         world_list = self.session.world_list_cache
         
-        if world_list:
+        if world_list.entries:
             out_message += _('Enter the number of the world you want to enter\n')
             # Padding is great for desktop but bad for mobile
-            # world_names_with_index = [f' {index: < 4} {world.name: <36}  {world.get_connected_users()}{chr(128100)} by {world.creator.name} {"" if world.public else chr(128274)}' for index, world in enumerate(world_list)]
-            world_names_with_index = [f' {index+1} {world.name}  [{world.get_connected_users()}{chr(128100)} {world.creator.name}{"" if world.public else f" {chr(128274)}"}]' for index, world in enumerate(world_list)]
+            # world_names_with_index = [f' {index: < 4} {world.name: <36}  {world.connected_users}{chr(128100)} by {world.creator_name} {"" if world.public else chr(128274)}' for index, world in enumerate(world_list.entries, start=world_list.first_index)]
+            world_names_with_index = [f' {index+1} {world.name}  [{world.connected_users}{chr(128100)} {world.creator_name}{"" if world.public else f" {chr(128274)}"}]' for index, world in enumerate(world_list.entries, start=world_list.first_index)]
             out_message += functools.reduce(lambda a, b: '{}\n{}'.format(a, b), world_names_with_index)
+            if world_list.has_previous_page() or world_list.has_next_page():
+                out_message += '\n' + _('Showing worlds {first} to {last} of {total}.').format(
+                    first=world_list.first_index + 1,
+                    last=world_list.first_index + len(world_list.entries),
+                    total=world_list.total
+                )
         else:
             out_message += _('There are not public or known private worlds in this server.')
         out_message += '\n\n' + _(
@@ -33,20 +39,25 @@ class LobbyMenu(verb.Verb):
             '  +  to create a new world.\n'
             '  ?  to see all available actions.'
         )
+        if world_list.has_next_page():
+            out_message += '\n' + _('  n  to see the next page of worlds.')
+        if world_list.has_previous_page():
+            out_message += '\n' + _('  p  to see the previous page of worlds.')
         self.session.send_to_client(out_message)
 
-    def get_worlds_list(self):
-        return list(filter(self.has_to_be_listed, entities.World.objects()))
+    def current_lobby_page_index(self):
+        world_list = self.session.world_list_cache
+        return world_list.first_index if world_list is not None else 0
 
-    def has_to_be_listed(self, world):
-        if world.public:
-            return True
-        elif world.creator == self.session.user:
-            return True
-        elif world in self.session.user.joined_worlds:
-            return True
-        else:
-            return False
+    def get_world_list_entry(self, index):
+        """Returns the lobby entry with the given number minus one. It is taken from
+        the page the user has seen, or from the database if it is in another page."""
+        world_list = self.session.world_list_cache
+        entry = world_list.get(index) if world_list is not None else None
+        if entry is None:
+            entries = entities.WorldList.load(self.session.user, first_index=index, page_size=1).entries
+            entry = entries[0] if entries else None
+        return entry
 
 
 class LobbyHelp(LobbyMenu):
@@ -59,9 +70,10 @@ class LobbyHelp(LobbyMenu):
             '  +    to create a new world.\n'
             '  -    to delete one of your worlds.\n'
             '  r    to reload and show the list of worlds.\n'
+            '  n/p  to see the next/previous page of the list.\n'
             '  *    to deploy a public world snapshot.\n'
             '  >    to import a world from text.\n'
-            '  who  to see who is connected right now.\n'
+            '  who  to see who is connected right now. Add a name or "in <world>" to filter.\n'
             '\n'
             'Enter the number of a world in the world list to go there.\n'
             'Enter the invite code of a world to go there.'
@@ -136,16 +148,14 @@ class EnterWorld(LobbyMenu):
             self.finish_interaction()
             return
         
-        try:
-            if index < 0:
-                raise IndexError
-            chosen_world = self.session.world_list_cache[index]
-        except IndexError:
+        entry = self.get_world_list_entry(index) if index >= 0 else None
+        if entry is None:
             self.session.send_to_client(strings.wrong_value)
             self.finish_interaction()
             return
 
         try:
+            chosen_world = entities.World.objects.get(id=entry.id)
             location_save = self.session.user.get_location_save(chosen_world)
             self.session.user.enter_world(chosen_world)
         except mongoengine.errors.DoesNotExist:
@@ -171,6 +181,27 @@ class RefreshLobby(LobbyMenu):
         self.show_lobby_menu()
         self.finish_interaction()
 
+class NextLobbyPage(LobbyMenu):
+    verbtype = verb.LOBBYVERB
+    command = 'n'
+
+    def process(self, message):
+        world_list = self.session.world_list_cache
+        if world_list is not None and world_list.has_next_page():
+            self.show_lobby_menu(first_index=world_list.first_index + entities.WorldList.PAGE_SIZE)
+        else:
+            self.session.send_to_client(_('There are no more worlds.'))
+        self.finish_interaction()
+
+class PreviousLobbyPage(LobbyMenu):
+    verbtype = verb.LOBBYVERB
+    command = 'p'
+
+    def process(self, message):
+        first_index = max(0, self.current_lobby_page_index() - entities.WorldList.PAGE_SIZE)
+        self.show_lobby_menu(first_index=first_index)
+        self.finish_interaction()
+
 class CreateWorld(LobbyMenu):
     verbtype = verb.LOBBYVERB
     command = '+'
@@ -379,11 +410,20 @@ class ImportWorld(LobbyMenu):
 
         if world_dict is not None:
             self.session.send_to_client(_('Text is correct, creating world. Please wait...'))
-            util.world_from_dict(world_dict, self.world_name, self.session.user)
+            try:
+                util.world_from_dict(world_dict, self.world_name, self.session.user, progress=self.report_progress)
+            except entities.BadItem as bad_item:
+                self.session.send_to_client(_('The world could not be created: some of its items or exits have invalid or repeated names. {error}').format(error=bad_item))
+                self.show_lobby_menu()
+                self.finish_interaction()
+                return
             self.session.send_to_client(_('Your new world is ready. The items in all player inventories from the original world have been moved to your inventory.'))
             self.show_lobby_menu()
             self.finish_interaction()
         else:
             self.session.send_to_client(_('The text is still invalid. Waiting for more characters. ("/" to cancel)'))
 
-
+    def report_progress(self, message):
+        self.session.send_to_client(message)
+        # imports can take a while, so progress is delivered right away
+        self.session.sender.flush()
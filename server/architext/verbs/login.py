@@ -3,6 +3,7 @@ from .look import Look
 from . import lobby
 from .. import entities
 from .. import util
+from .. import config
 import logging
 import textwrap
 from .. import strings
@@ -32,7 +33,7 @@ class Login(Verb):
   ╚═══╧═╧══╧══╧═════╩ ╩ ╩╚═╝  ╚═╝╩ ╩╝╚╝═╩╝╚═╝╚═╝╩ ╚════╧════╧══╧══╧══╝
 
 """)
-        cover = util.get_config()['cover']
+        cover = config.config.cover
         out_message = cover if cover else strings.default_cover
         out_message += _("\n\n ᐅ What is your nickname?")
         self.session.send_to_client(art, options=MessageOptions(display='fit'))
@@ -83,7 +84,7 @@ class Login(Verb):
 
         if self.selected_user.match_password(message):
             self.session.user = self.selected_user
-            log_in_welcome = util.get_config()['log_in_welcome']
+            log_in_welcome = config.config.log_in_welcome
             log_in_welcome = log_in_welcome if log_in_welcome else strings.default_log_in_welcome
             self.session.send_to_client(log_in_welcome)
             self.connect()
@@ -142,7 +143,7 @@ class Login(Verb):
             util.create_world(self.session.user, world='riddle', public=True)
 
         # create tutorial world and move the user there
-        sign_in_welcome = util.get_config()['sign_in_welcome']
+        sign_in_welcome = config.config.sign_in_welcome
         sign_in_welcome = sign_in_welcome if sign_in_welcome else strings.default_sign_in_welcome
         self.session.send_to_client(sign_in_welcome)
         self.session.send_to_client(_("Building your Museum of Architexture..."))
@@ -157,6 +158,7 @@ class Login(Verb):
 
     def connect(self):
         self.session.user.connect(self.session.client_id)
+        self.session.claim_user()
         self.session.user.leave_master_mode()
         # logger setup
         name = self.session.user.name
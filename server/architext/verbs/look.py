@@ -28,25 +28,25 @@ class Look(Verb):
             self.session.send_to_client(f"👁 {selected_entity.name}\n{selected_entity.description if selected_entity.description else strings.default_description}")
     
     def show_current_room(self, show_world_name=False):
-        title = self.session.user.room.name
-        description = (self.session.user.room.description if self.session.user.room.description else strings.default_description) + '\n'
+        room = entities.RoomView.load(self.session.user.room)
+        title = room.name
+        description = (room.description if room.description else strings.default_description) + '\n'
 
-        listed_exits = [exit.name for exit in self.session.user.room.exits if exit.is_listed()]
+        listed_exits = [exit.name for exit in room.exits if exit.is_listed()]
         if len(listed_exits) > 0:
             exits = (', '.join(listed_exits))
             exits = _("⮕ Exits: {exits}.\n").format(exits=exits)
         else:
             exits = ""
 
-        listed_items = [item.name for item in self.session.user.room.items if item.is_listed()]
+        listed_items = [item.name for item in room.items if item.is_listed()]
         if len(listed_items) > 0:
             items = _('👁 You see ')+(', '.join(listed_items))
             items = items + '.\n'
         else:
             items = ''
 
-        players_here = entities.User.objects(room=self.session.user.room, client_id__ne=None, master_mode=False)
-        players_here = [user for user in players_here if user != self.session.user]
+        players_here = [player for player in room.online_players() if not player.master_mode and player.id != self.session.user.id]
         if len(players_here) < 1:
             players_here = ""
         elif len(players_here) == 1:
@@ -59,7 +59,7 @@ class Look(Verb):
         message = (f"{description}{line_break}{items}{players_here}{exits}")
         
         if show_world_name:
-            world_name = _('You are in ') + self.session.user.room.world_state.get_world().name
+            world_name = _('You are in ') + room.world_name
             self.session.send_to_client(world_name, MessageOptions(display='box'))
             self.session.send_to_client(title, MessageOptions(section=False, display='underline'))
             self.session.send_to_client(message, MessageOptions(section=False))
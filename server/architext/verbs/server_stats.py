@@ -0,0 +1,50 @@
+import datetime
+import time
+from . import verb
+from .. import config
+from .. import metrics
+
+class ServerStats(verb.Verb):
+    """Shows the metrics of the server process to its admins (see config.admins):
+    messages per second, gauges and the slowest verbs, with their mean number of
+    database commands per message."""
+
+    command = _('serverstats')
+    verbtype = verb.VERSATILE
+    permissions = verb.NOBOT
+    SHOWN_VERBS = 15
+
+    @classmethod
+    def can_process(cls, message, session):
+        # other users don't even know that the verb exists
+        return super().can_process(message, session) and session.user.name in config.config.admins
+
+    def process(self, message):
+        self.session.send_to_client(self.get_summary())
+        self.finish_interaction()
+
+    def get_summary(self):
+        registry = metrics.registry
+        uptime = datetime.timedelta(seconds=int(time.time() - registry.started_at))
+        lines = [
+            _('Server process up for {uptime}').format(uptime=uptime),
+            _('Messages: {messages} ({rate:.2f} per second over the last minute)').format(messages=registry.messages, rate=registry.message_rate.rate()),
+            _('Verb dispatch: p50 {p50} ms, p99 {p99} ms').format(
+                p50=self.milliseconds(registry.dispatch_latency.quantile(0.5)),
+                p99=self.milliseconds(registry.dispatch_latency.quantile(0.99)),
+            ),
+        ]
+        lines += [f'{name}: {value}' for name, value in sorted(registry.gauge_values().items())]
+        lines.append('')
+        lines.append(_('Slowest verbs (ms):'))
+        lines.append(f'  {"verb":<22}{"messages":>9}{"p50":>8}{"p99":>8}{"max":>8}{"errors":>7}{"queries":>8}')
+        for verb_name, count, p50, p99, maximum, errors, queries in registry.verb_summary()[:self.SHOWN_VERBS]:
+            lines.append(
+                f'  {verb_name:<22}{count:>9}{self.milliseconds(p50):>8}{self.milliseconds(p99):>8}'
+                f'{self.milliseconds(maximum):>8}{errors:>7}{round(queries, 1):>8}'
+            )
+        return '\n'.join(lines)
+
+    @staticmethod
+    def milliseconds(seconds):
+        return round(seconds * 1000, 1)
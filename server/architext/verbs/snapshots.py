@@ -128,7 +128,7 @@ class DeploySnapshot(verb.Verb):
             for user in old_room.users:
                 if user != self.session.user:
                     self.session.send_to_user(user, _('A snapshot has been deployed on this world.'))
-                corresponding_new_room = next(entities.Room.objects(world_state=new_world_state, alias=old_room.alias), None)
+                corresponding_new_room = new_world_state.get_room_by_alias(old_room.alias)
                 if corresponding_new_room is not None:
                     user.teleport(corresponding_new_room)
                 else:
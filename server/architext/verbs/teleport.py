@@ -2,6 +2,7 @@ from . import verb
 from .look import Look 
 from .. import util
 from .. import entities
+from .. import presence
 import architext.strings as strings
 
 class Recall(verb.Verb):
@@ -26,12 +27,10 @@ class TeleportClient(verb.Verb):
         command_length = len(self.command)
         room_alias = message[command_length:]
         
-        query = entities.Room.objects(alias=room_alias, world_state=self.session.user.room.world_state)
-        if len(query) == 1:
-            self.teleport_client(query.first())
-        elif len(query) > 1:
-            raise Exception('There is more than one room with the same alias.')
-        elif len(query) == 0:
+        target_room = self.session.user.room.world_state.get_room_by_alias(room_alias)
+        if target_room is not None:
+            self.teleport_client(target_room)
+        else:
             self.session.send_to_client(strings.room_not_found)
 
         self.finish_interaction()
@@ -47,11 +46,11 @@ class TeleportUser(verb.Verb):
     permissions = verb.PRIVILEGED
 
     def process (self, message):
-        match = util.match(self.command, message)
+        match = self.match_command(message)
         target_user_name = match['user_name'].strip()
         room_alias = match['room_alias'].strip()
         target_user = util.name_to_entity(self.session, target_user_name, loose_match=['world_users'])
-        target_room = next(entities.Room.objects(alias=room_alias, world_state=self.session.user.room.world_state), None)
+        target_room = self.session.user.room.world_state.get_room_by_alias(room_alias)
         if target_user is not None and target_room is not None:
             target_user.teleport(target_room)
             self.session.send_to_client(_("Done. Note that this verb moves players but doesn't tell them that they have been moved. You can tell them using text verbs if you want to."))
@@ -70,8 +69,8 @@ class TeleportAllInRoom(verb.Verb):
 
     def process(self, message):
         room_alias = message[len(self.command):]
-        target_users = entities.User.objects(room=self.session.user.room, client_id__ne=None)
-        target_room = next(entities.Room.objects(alias=room_alias, world_state=self.session.user.room.world_state), None)
+        target_users = entities.User.objects(id__in=[user.user_id for user in presence.registry.in_room(self.session.get_room_id())])
+        target_room = self.session.user.room.world_state.get_room_by_alias(room_alias)
 
         if target_room is not None:
             for user in target_users:
@@ -93,8 +92,8 @@ class TeleportAllInWorld(verb.Verb):
 
     def process(self, message):
         room_alias = message[len(self.command):]
-        target_users = entities.User.objects(client_id__ne=None)
-        target_room = next(entities.Room.objects(alias=room_alias, world_state=self.session.user.room.world_state), None)
+        target_users = entities.User.objects(id__in=[user.user_id for user in presence.registry.all()])
+        target_room = self.session.user.room.world_state.get_room_by_alias(room_alias)
 
         if target_room is not None:
             for user in target_users:
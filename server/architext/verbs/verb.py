@@ -43,7 +43,7 @@ class Verb():
     @classmethod
     def message_matches_command(cls, message):
         if cls.regex_command:
-            return util.match(cls.command, message) is not None
+            return util.get_pattern_set(cls.command).matches(message)
         else:
             if type(cls.command) == str:
                 if message.startswith(cls.command):
@@ -55,6 +55,30 @@ class Verb():
             
             return False
 
+    @classmethod
+    def command_prefixes(cls):
+        """Returns the list of fixed prefixes that a message must start with to
+        match the command. An empty prefix means that any message may match.
+        Used by the session to index its verbs (see dispatch.VerbIndex)."""
+        commands = cls.command if type(cls.command) == list else [cls.command]
+        if cls.regex_command:
+            return [util.literal_prefix(command) for command in commands]
+        else:
+            return list(commands)
+
+    @classmethod
+    def match_command(cls, message):
+        """For regex commands, returns the util.match result of the message
+        against all the command patterns."""
+        return util.get_pattern_set(cls.command).match(message)
+
+    @classmethod
+    def compile_command(cls):
+        """Compiles the patterns of regex commands, so it doesn't happen while
+        processing messages."""
+        if cls.regex_command:
+            util.get_pattern_set(cls.command)
+
     @classmethod
     def can_process(cls, message, session):
         return cls.in_the_right_context(session) and cls.message_matches_command(message)
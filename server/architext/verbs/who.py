@@ -1,30 +1,90 @@
 from . import verb
 from .. import entities
-import textwrap
+from .. import presence
+import math
 
 class Who(verb.Verb):
-    """Show a list of connected players"""
+    """Show a list of connected players. Usage:
+        who [page N]
+        who <name prefix> [page N]
+        who in <part of a world name> [page N]
+
+    Players in private worlds are shown as being in "a private world", unless
+    the viewer has joined that world. Only the world names the viewer can see
+    are matched by "who in", so private worlds they haven't joined never are.
+    """
 
     command = _('who')
     verbtype = verb.VERSATILE
+    PAGE_SIZE = 30
 
     def process(self, message):
-        out_message = self.get_player_list()
+        out_message = self.get_player_list(message[len(self.command):].strip())
         self.session.send_to_client(out_message)
         self.finish_interaction()
 
-    def get_player_list(self):
-        connected_users = entities.User.objects(client_id__ne=None)
+    def get_player_list(self, arguments=''):
+        name_prefix, world_filter, page = self.parse_arguments(arguments)
+        connected_users = sorted(presence.registry.all(), key=lambda user: user.name.casefold())
+        if name_prefix:
+            connected_users = [user for user in connected_users if user.name.casefold().startswith(name_prefix)]
+        locations = {}
+        if world_filter:
+            locations = self.get_locations(connected_users)
+            connected_users = [user for user in connected_users if world_filter in locations[user.user_id][1].casefold()]
+        if not connected_users:
+            return _("There are no online players like that.")
+
+        pages = math.ceil(len(connected_users) / self.PAGE_SIZE)
+        page = min(page, pages)
+        shown_users = connected_users[(page - 1) * self.PAGE_SIZE:page * self.PAGE_SIZE]
+        if not world_filter:
+            # only the locations of the page are shown
+            locations = self.get_locations(shown_users)
         at = _("at")
-        list_rows = [f'  {user.name: <26}  - {at} {self.get_location(user)}\n' for user in connected_users]
+        list_rows = [f'  {user.name: <26}  - {at} {locations[user.user_id][0]}\n' for user in shown_users]
         users_list = ''.join(list_rows)
-        out = _("Online players:\n{users_list}").format(users_list=users_list)
+        if pages == 1:
+            return _("Online players:\n{users_list}").format(users_list=users_list)
+        out = _("Online players (page {page} of {pages}):\n{users_list}").format(page=page, pages=pages, users_list=users_list)
+        if page < pages:
+            filters = f' {_("in")} {world_filter}' if world_filter else f' {name_prefix}' if name_prefix else ''
+            next_page = f'{self.command}{filters} {_("page")} {page + 1}'
+            out += _('Enter "{next_page}" to see more.').format(next_page=next_page)
         return out
 
-    def get_location(self, user):
-        if user.room is None:
-            return _('the lobby')
-        world = user.room.world_state.get_world()
-        if not world.public and not world in self.session.user.joined_worlds:
-            return _('a private world')
-        return world.name
\ No newline at end of file
+    def parse_arguments(self, arguments):
+        """Returns the name prefix, part of the world name and page number given in
+        the arguments of the message."""
+        words = arguments.split()
+        page = 1
+        if len(words) >= 2 and words[-2] == _('page') and words[-1].isdigit():
+            page = max(1, int(words[-1]))
+            words = words[:-2]
+        if words and words[0] == _('in'):
+            return '', ' '.join(words[1:]).casefold(), page
+        return ' '.join(words).casefold(), '', page
+
+    def get_locations(self, connected_users):
+        """Returns {user id: (location to show, world name to filter by)} for the
+        connected users. The worlds they are in are read with a single query.
+        The world name to filter by is empty when the viewer can't see it."""
+        world_state_ids = {user.world_state_id for user in connected_users if not user.is_in_lobby()}
+        worlds = {}  # world state id: world document, with only the fields used here
+        if world_state_ids:
+            query = {'world_state': {'$in': list(world_state_ids)}}
+            for world in entities.World._get_collection().find(query, {'name': 1, 'public': 1, 'world_state': 1}):
+                worlds[world['world_state']] = world
+        # ids of the joined worlds, without loading them (SystemActors haven't joined any)
+        joined_world_ids = {world.id for world in getattr(self.session.user, '_data', {}).get('joined_worlds', [])}
+
+        locations = {}
+        for user in connected_users:
+            world = worlds.get(user.world_state_id)
+            if user.is_in_lobby():
+                locations[user.user_id] = (_('the lobby'), '')
+            elif world is None or (not world.get('public', False) and world['_id'] not in joined_world_ids):
+                locations[user.user_id] = (_('a private world'), '')
+            else:
+                locations[user.user_id] = (world['name'], world['name'])
+        return locations
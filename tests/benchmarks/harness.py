@@ -0,0 +1,194 @@
+"""Drives Session objects directly, without a server, measuring each message.
+
+The database is a mongomock stand-in by default, or a real MongoDB when an URI
+is given (see connect). The server code expects to run from the server
+directory (config.yml, translations and world resources are read from there),
+so the harness changes the working directory to it before importing architext.
+Logs are written to a temporary directory instead of server/logs.
+"""
+import collections
+import os
+import pathlib
+import sys
+import tempfile
+import threading
+import time
+import mongoengine
+import pymongo.monitoring
+
+SERVER_DIRECTORY = pathlib.Path(__file__).resolve().parents[2] / 'server'
+
+UNKNOWN_VERB = 'Unknown'  # messages that no verb processes
+
+
+class DatabaseOperations():
+    """Counts the operations sent to the database."""
+
+    def __init__(self):
+        self.count = 0
+
+
+class CommandCounter(pymongo.monitoring.CommandListener):
+    """Counts the commands sent to a real MongoDB."""
+
+    def __init__(self, operations):
+        self.operations = operations
+
+    def started(self, event):
+        self.operations.count += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+MONGOMOCK_OPERATIONS = [
+    'find', 'find_one', 'find_one_and_delete', 'find_one_and_replace', 'find_one_and_update',
+    'insert_one', 'insert_many', 'replace_one', 'update_one', 'update_many', 'delete_one', 'delete_many',
+    'count_documents', 'estimated_document_count', 'distinct', 'aggregate', 'bulk_write',
+]
+
+
+def count_mongomock_operations(operations):
+    """mongomock doesn't publish command events, so its collections are wrapped
+    instead. Operations called by other operations (e.g. find_one calls find)
+    are counted once."""
+    import mongomock.collection
+    depth = threading.local()
+
+    def counting(method):
+        def wrapper(*args, **kwargs):
+            if getattr(depth, 'value', 0) == 0:
+                operations.count += 1
+            depth.value = getattr(depth, 'value', 0) + 1
+            try:
+                return method(*args, **kwargs)
+            finally:
+                depth.value -= 1
+        return wrapper
+
+    for name in MONGOMOCK_OPERATIONS:
+        setattr(mongomock.collection.Collection, name, counting(getattr(mongomock.collection.Collection, name)))
+
+
+def connect(mongo_uri=None):
+    """Connects to the database and imports architext. Returns the
+    DatabaseOperations counter."""
+    os.chdir(SERVER_DIRECTORY)
+    if str(SERVER_DIRECTORY) not in sys.path:
+        sys.path.insert(0, str(SERVER_DIRECTORY))
+
+    operations = DatabaseOperations()
+    if mongo_uri is None:
+        import mongomock
+        count_mongomock_operations(operations)
+        mongoengine.connect('architext_benchmark', host='mongodb://localhost', mongo_client_class=mongomock.MongoClient)
+    else:
+        mongoengine.connect(host=mongo_uri, event_listeners=[CommandCounter(operations)])
+        mongoengine.get_db().client.drop_database(mongoengine.get_db().name)
+
+    import architext  # noqa: F401 (sets up the translations used by the verbs)
+    import architext.logs
+    architext.logs.pipeline.directory = tempfile.mkdtemp(prefix='architext_benchmark_logs_')
+    return operations
+
+
+class Measurements():
+    """Latency and database operations of each message, by the verb that processed it."""
+
+    def __init__(self):
+        self.latencies = collections.defaultdict(list)  # verb name: seconds of each message
+        self.operations = collections.defaultdict(list)  # verb name: database operations of each message
+
+    def add(self, verb_name, latency, operations):
+        self.latencies[verb_name].append(latency)
+        self.operations[verb_name].append(operations)
+
+    @staticmethod
+    def percentile(values, percent):
+        ordered = sorted(values)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * percent / 100))]
+
+    def summary(self):
+        """Returns {verb name: {messages, p50_ms, p90_ms, p99_ms, max_ms, db_operations}},
+        where db_operations is the mean per message."""
+        return {
+            verb_name: {
+                'messages': len(latencies),
+                'p50_ms': round(self.percentile(latencies, 50) * 1000, 3),
+                'p90_ms': round(self.percentile(latencies, 90) * 1000, 3),
+                'p99_ms': round(self.percentile(latencies, 99) * 1000, 3),
+                'max_ms': round(max(latencies) * 1000, 3),
+                'db_operations': round(sum(self.operations[verb_name]) / len(latencies), 2),
+            }
+            for verb_name, latencies in sorted(self.latencies.items())
+        }
+
+
+class VerbTracker():
+    """Records the verb that processes each message. Verbs executed by the ghost
+    sessions of custom verbs are part of the custom verb that runs them."""
+
+    def __init__(self):
+        from architext.verbs.verb import Verb
+        self.last_verb = None
+        self._depth = 0
+        execute = Verb.execute
+        tracker = self
+
+        def tracked_execute(verb, message):
+            if tracker._depth == 0:
+                tracker.last_verb = type(verb).__name__
+            tracker._depth += 1
+            try:
+                return execute(verb, message)
+            finally:
+                tracker._depth -= 1
+
+        Verb.execute = tracked_execute
+
+
+class Player():
+    def __init__(self, name, script):
+        from architext.adapters.sender import FakeSender
+        from architext.session import Session
+
+        class QuietSender(FakeSender):
+            def send(self, connection_id, message):
+                self._sent.append((connection_id, message))
+
+        self.name = name
+        self.sender = QuietSender()
+        self.session = Session(f'client_{name}', self.sender)
+        self.script = list(script)
+        self.next_message = 0
+
+    def is_done(self):
+        return self.next_message >= len(self.script)
+
+    def send_next(self):
+        message = self.script[self.next_message]
+        self.next_message += 1
+        self.session.process_message(message)
+        return message
+
+
+def run(scripts, operations):
+    """Plays the scripts ({player name: list of messages}), one message of each
+    player in turn, and returns the Measurements."""
+    tracker = VerbTracker()
+    measurements = Measurements()
+    players = [Player(name, script) for name, script in scripts.items()]
+    while not all(player.is_done() for player in players):
+        for player in players:
+            if player.is_done():
+                continue
+            tracker.last_verb = None
+            operations_before = operations.count
+            start = time.perf_counter()
+            player.send_next()
+            latency = time.perf_counter() - start
+            measurements.add(tracker.last_verb or UNKNOWN_VERB, latency, operations.count - operations_before)
+    return measurements
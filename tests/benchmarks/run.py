@@ -0,0 +1,104 @@
+"""Benchmarks the verbs by playing scripted sessions (see scenarios.py) in process.
+
+Usage, from the repository root:
+
+    python -m tests.benchmarks.run [--players N] [--mongo URI] [--save-baseline] [--latency-tolerance T]
+
+The server requirements and mongomock must be installed (mongomock is not
+needed when a MongoDB URI is given).
+
+It prints the latency percentiles and the mean database operations of the
+messages processed by each verb, and compares them with baseline.json.
+Results are only compared with a baseline of the same number of players.
+--save-baseline replaces the baseline with the results of the run.
+
+Database operations are deterministic, so the exit code is 1 if any verb made
+more of them than in the baseline. Latencies depend on the machine and on its
+load, so increases over 25% are only printed. With --latency-tolerance they
+make the run fail too, when they go over it (0.5 means 50% slower), which is
+only meaningful with a baseline saved on the same machine.
+"""
+import argparse
+import json
+import pathlib
+import sys
+from . import harness
+from . import scenarios
+
+BASELINE_FILE = pathlib.Path(__file__).resolve().parent / 'baseline.json'
+PASSWORD = 'benchmark'
+
+
+def load_baseline(players):
+    """Returns the results by verb of the baseline, or an empty dict if there is
+    no baseline for that number of players."""
+    if not BASELINE_FILE.exists():
+        return {}
+    baseline = json.loads(BASELINE_FILE.read_text())
+    if baseline['players'] != players:
+        print(f'The baseline is for {baseline["players"]} players, results are not compared.')
+        return {}
+    return baseline['verbs']
+
+
+REPORTED_LATENCY_INCREASE = 0.25
+
+
+def compare(results, baseline, latency_tolerance=REPORTED_LATENCY_INCREASE):
+    """Returns the database operations and the latencies of the results that
+    went over the baseline, as two lists of messages. Latencies are compared
+    with the given tolerance."""
+    db_regressions, latency_regressions = [], []
+    for verb_name, result in results.items():
+        expected = baseline.get(verb_name)
+        if expected is None:
+            continue
+        for key in ('p50_ms', 'p90_ms'):
+            if result[key] > expected[key] * (1 + latency_tolerance):
+                latency_regressions.append(f'{verb_name}: {key} {expected[key]} -> {result[key]}')
+        if result['db_operations'] > expected['db_operations']:
+            db_regressions.append(f'{verb_name}: db_operations {expected["db_operations"]} -> {result["db_operations"]}')
+    return db_regressions, latency_regressions
+
+
+def print_results(results, baseline):
+    print(f'{"verb":<24}{"messages":>9}{"p50 ms":>10}{"p90 ms":>10}{"p99 ms":>10}{"max ms":>10}{"db ops":>8}{"base p50":>10}{"base db":>9}')
+    for verb_name, result in results.items():
+        expected = baseline.get(verb_name, {})
+        print(
+            f'{verb_name:<24}{result["messages"]:>9}{result["p50_ms"]:>10}{result["p90_ms"]:>10}{result["p99_ms"]:>10}'
+            f'{result["max_ms"]:>10}{result["db_operations"]:>8}{expected.get("p50_ms", "-"):>10}{expected.get("db_operations", "-"):>9}'
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmarks the verbs by playing scripted sessions.')
+    parser.add_argument('--players', type=int, default=5, help='number of players playing at the same time')
+    parser.add_argument('--mongo', default=None, help='URI of a MongoDB database to use instead of mongomock (it is emptied)')
+    parser.add_argument('--save-baseline', action='store_true', help='save the results as the new baseline')
+    parser.add_argument('--latency-tolerance', type=float, default=None, help='latency increase that makes the run fail (by default, latencies never do)')
+    args = parser.parse_args(argv)
+
+    operations = harness.connect(args.mongo)
+    scripts = {f'player{index}': scenarios.player_script(f'player{index}', PASSWORD) for index in range(args.players)}
+    results = harness.run(scripts, operations).summary()
+
+    baseline = load_baseline(args.players)
+    print_results(results, baseline)
+
+    if args.save_baseline:
+        BASELINE_FILE.write_text(json.dumps({'players': args.players, 'verbs': results}, indent=4) + '\n')
+        print(f'Baseline saved to {BASELINE_FILE}')
+        return 0
+
+    latency_gated = args.latency_tolerance is not None
+    db_regressions, latency_regressions = compare(results, baseline, args.latency_tolerance if latency_gated else REPORTED_LATENCY_INCREASE)
+    for regression in db_regressions:
+        print(f'Regression: {regression}')
+    for regression in latency_regressions:
+        print(f'Regression: {regression}' if latency_gated else f'Slower (not a failure, see --latency-tolerance): {regression}')
+    return 1 if db_regressions or (latency_gated and latency_regressions) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
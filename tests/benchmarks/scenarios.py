@@ -0,0 +1,47 @@
+"""Scripted sessions played by each benchmark player, in order.
+
+Each scenario is a list of messages, sent as the player would type them. The
+first player creates the public Monk's Riddle world when signing up, and every
+player gets their own copy of the Museum of Architexture (see util.create_world).
+"""
+
+def sign_up(name, password):
+    return [name, password, password, f'{name}@architext.test']
+
+MUSEUM_WALK = [
+    'look', 'items', 'exits', 'info', 'who',
+    'go door', 'look', 'look curtain',
+    'go corridor', 'open mailbox', 'take key', 'inventory', 'move carpet', 'look', 'info',
+    'open trapdoor', 'go trapdoor', 'look', 'go ceiling', 'look',
+]
+
+CRAFTING = [
+    'craft', 'Potato', 'A potato', 'takable', 'take potato', 'inventory', 'drop potato', 'look potato',
+    'craft', 'Stone', 'A stone', 'listed', 'look stone', 'items',
+]
+
+CUSTOM_VERBS = [
+    'craft', 'Lamp', 'A lamp', 'listed',
+    'verb lamp', 'rub', 'textroom The lamp glows', 'textto .user - You rub the lamp', 'OK',
+    'rub lamp', 'rub lamp', 'rub lamp',
+    'verb room', 'clap', 'textroom clap clap', 'OK',
+    'clap', 'clap', 'clap',
+    'verb world', 'jump', 'textroom jumping', 'OK',
+    'jump', 'jump', 'jump',
+]
+
+SNAPSHOT_AND_EXPORT = [
+    'worldinfo', 'snapshot', 'benchmark snapshot', 'export', 'export pretty', 'deploy', '1', 'look',
+]
+
+RIDDLE_WALK = [
+    'exitworld', '1', 'look', 'look poster',
+    'go portal', 'look', 'go north', 'look',
+    'go door', 'look', 'go right', 'look', 'look chest',
+    'go corridor', 'go end', 'go left', 'look',
+    'go corridor', 'go beginning', 'go stairs', 'go east', 'look well', 'go south', 'go west', 'go portal',
+    'who',
+]
+
+def player_script(name, password):
+    return sign_up(name, password) + MUSEUM_WALK + CRAFTING + CUSTOM_VERBS + SNAPSHOT_AND_EXPORT + RIDDLE_WALK
@@ -0,0 +1,72 @@
+import tests.unit.util as util
+
+util.connect()
+
+from architext import verbs
+from architext.session import Session
+from architext.verbs import verb as verb_module
+from architext.verbs.custom_verb_program import Command, Condition, compile_program
+
+
+class Anything(verb_module.Verb):
+    """A world verb that may process any message, deciding in can_process."""
+    command = ''
+    verbtype = verb_module.WORLDVERB
+
+    @classmethod
+    def can_process(cls, message, session):
+        return False
+
+
+def test_programs_are_compiled_once_per_commands():
+    commands = ('textroom one', 'textroom two')
+    assert compile_program(commands) is compile_program(commands)
+    assert compile_program(commands) is not compile_program(('textroom one',))
+
+
+def test_commands_are_resolved_in_advance():
+    command = Command('look')
+    assert command.verb is verbs.Look
+    assert command.resolved
+    assert command.may_be_custom_verb  # CustomVerb comes before Look in the verb list
+
+    assert Command('nonsense words').verb is None
+
+
+def test_commands_for_verbs_overriding_can_process_are_not_resolved():
+    command = Command('serverstats')
+    assert command.verb is None
+    assert not command.resolved
+
+
+def test_wildcard_verbs_overriding_can_process_are_respected(monkeypatch):
+    monkeypatch.setattr(Session, 'verb_index', verbs.VerbIndex([verbs.CustomVerb, Anything, verbs.Look]))
+    command = Command('look')
+    assert command.verb is None
+    assert not command.resolved
+
+    monkeypatch.setattr(Session, 'verb_index', verbs.VerbIndex([verbs.CustomVerb, verbs.Look, Anything]))
+    command = Command('look')
+    assert command.verb is verbs.Look
+    assert command.resolved
+
+
+def test_conditions_are_compiled_with_both_cases():
+    program = compile_program(('if lamp in room', '-textroom lit', '-OK', '-textroom dark', '-OK', 'textroom done'))
+    condition, last_command = program.steps
+    assert isinstance(condition, Condition)
+    assert [step.text for step in condition.true_case.steps] == ['textroom lit']
+    assert [step.text for step in condition.false_case.steps] == ['textroom dark']
+    assert condition.complete
+    assert last_command.text == 'textroom done'
+
+
+def test_custom_verbs_run_their_program():
+    player = util.new_player()
+    for message in ['verb room', 'probe', 'if lamp in room', '-textroom lit', '-OK', '-textroom dark', '-OK', 'OK']:
+        util.send(player, message)
+    assert 'dark' in util.send(player, 'probe')
+
+    for message in ['craft', 'lamp', 'A lamp', 'listed']:
+        util.send(player, message)
+    assert 'lit' in util.send(player, 'probe')
@@ -0,0 +1,65 @@
+import tests.unit.util as util
+
+util.connect()
+
+from architext import verbs
+
+
+def table_of(player):
+    return player.session.user.room.get_custom_verb_table()
+
+
+def add_verb(player, target, name, action):
+    for message in [f'verb {target}', name, action, 'OK']:
+        util.send(player, message)
+
+
+def test_room_and_world_verbs_follow_their_edits():
+    player = util.new_player()
+    room_id = player.session.user.room.id
+    assert table_of(player).room_verb('clap', room_id) is None
+
+    add_verb(player, 'room', 'clap', 'textroom clap clap')
+    add_verb(player, 'world', 'jump', 'textroom jumping')
+    assert table_of(player).room_verb('clap', room_id) is not None
+    assert table_of(player).world_verb('jump') is not None
+    assert 'clap clap' in util.send(player, 'clap')
+    assert 'jumping' in util.send(player, 'jump')
+
+    util.send(player, 'deleteverb *room*')
+    util.send(player, '0')
+    assert table_of(player).room_verb('clap', room_id) is None
+    assert 'clap clap' not in util.send(player, 'clap')
+    assert 'jumping' in util.send(player, 'jump')
+
+
+def test_item_verbs_follow_their_items():
+    player = util.new_player()
+    first_room_id = player.session.user.room.id
+    for message in ['craft', 'Lamp', 'A lamp', 'takable']:
+        util.send(player, message)
+    assert not table_of(player).may_be_item_verb('rub', first_room_id)
+
+    add_verb(player, 'lamp', 'rub', 'textroom the lamp glows')
+    assert table_of(player).may_be_item_verb('rub', first_room_id)
+    assert 'glows' in util.send(player, 'rub lamp')
+
+    util.send(player, 'take lamp')
+    util.send(player, 'go door')
+    second_room_id = player.session.user.room.id
+    assert second_room_id != first_room_id
+    assert table_of(player).may_be_item_verb('rub', second_room_id)  # carried
+    assert 'glows' in util.send(player, 'rub lamp')
+
+    util.send(player, 'drop lamp')
+    assert table_of(player).may_be_item_verb('rub', second_room_id)
+    assert not table_of(player).may_be_item_verb('rub', first_room_id)
+
+
+def test_can_process_leaves_the_session_untouched():
+    player = util.new_player()
+    add_verb(player, 'room', 'clap', 'textroom clap clap')
+    session_attributes = dict(vars(player.session))
+    assert verbs.CustomVerb.can_process('clap', player.session)
+    assert not verbs.CustomVerb.can_process('snap', player.session)
+    assert vars(player.session) == session_attributes
@@ -0,0 +1,95 @@
+import re
+import tests.unit.util as util
+
+util.connect()
+
+from architext import name_index
+from architext import util as architext_util
+
+
+# the matching of util before the names were folded by NameIndex
+
+def legacy_remove_accents(text):
+    text = re.sub(u"[àáâãäå]", 'a', text)
+    text = re.sub(u"[èéêë]", 'e', text)
+    text = re.sub(u"[ìíîï]", 'i', text)
+    text = re.sub(u"[òóôõö]", 'o', text)
+    text = re.sub(u"[ùúûü]", 'u', text)
+    text = re.sub(u"[ýÿ]", 'y', text)
+    text = re.sub(u"[ñ]", 'n', text)
+    return text
+
+def legacy_easy_text(text):
+    return legacy_remove_accents(text.lower())
+
+def legacy_possible_meanings(partial_string, list_of_options, loose_match=True, substr_match=True):
+    if partial_string in list_of_options:
+        return [string for string in list_of_options if partial_string == string]
+    elif loose_match and any(legacy_easy_text(s) == legacy_easy_text(partial_string) for s in list_of_options):
+        return [s for s in list_of_options if legacy_easy_text(s) == legacy_easy_text(partial_string)]
+    elif substr_match:
+        return [s for s in list_of_options if legacy_easy_text(partial_string) in legacy_easy_text(s)]
+    else:
+        return []
+
+def legacy_find_name_matches(input_string, items, item_to_string, loose_match=True, substr_match=True):
+    strings = legacy_possible_meanings(input_string, [item_to_string(item) for item in items], loose_match, substr_match)
+    return [item for item in items if item_to_string(item) in strings]
+
+
+NAMES = ['Potato', 'potato', 'Pótato', 'a big potato', 'Ñandú', 'nandu', 'door', 'Door', 'door handle', 'Éclair', 'Potato']
+QUERIES = ['Potato', 'potato', 'POTATO', 'pota', 'POTÁ', 'nandu', 'ÑANDÚ', 'ñandu', 'door', 'DOOR', 'handle', 'clair', 'ÉCLAIR', 'big', 'xyz', '']
+OPTIONS = [(True, True), (True, False), (False, True), (False, False)]
+
+
+class Named():
+    def __init__(self, name):
+        self.name = name
+
+    def __repr__(self):
+        return f'Named({self.name!r})'
+
+
+def test_possible_meanings_match_the_legacy_matching():
+    for query in QUERIES:
+        for loose_match, substr_match in OPTIONS:
+            expected = legacy_possible_meanings(query, NAMES, loose_match, substr_match)
+            assert architext_util.possible_meanings(query, NAMES, loose_match, substr_match) == expected, (query, loose_match, substr_match)
+
+
+def test_find_name_matches_match_the_legacy_matching():
+    entities = [Named(name) for name in NAMES]
+    for query in QUERIES:
+        for loose_match, substr_match in OPTIONS:
+            expected = legacy_find_name_matches(query, entities, lambda entity: entity.name, loose_match, substr_match)
+            matches = architext_util.find_name_matches(query, entities, lambda entity: entity.name, loose_match, substr_match)
+            assert matches == expected, (query, loose_match, substr_match)
+
+
+def test_fold_also_removes_accents_the_legacy_matching_missed():
+    assert name_index.fold('Çà Ŝtě') == 'ca ste'
+
+
+def test_combined_index_searches_its_indexes_in_order():
+    first = name_index.NameIndex([Named('Potato'), Named('a big potato')])
+    second = name_index.NameIndex([Named('potato'), Named('Carrot')])
+    combined = name_index.NameIndex.combine(first, second)
+    assert len(combined) == 4
+    assert [entity.name for entity in combined.possible_meanings('Potato')] == ['Potato']
+    assert [entity.name for entity in combined.possible_meanings('POTATO')] == ['Potato', 'potato']
+    assert [entity.name for entity in combined.possible_meanings('pota')] == ['Potato', 'a big potato', 'potato']
+
+
+def test_inventory_index_follows_the_inventory():
+    player = util.new_player()
+    util.send(player, 'craft')
+    util.send(player, 'Lamp')
+    util.send(player, 'A lamp')
+    util.send(player, 'takable')
+    user = player.session.user
+
+    assert user.get_current_world_inventory_index().possible_meanings('lamp') == []
+    util.send(player, 'take lamp')
+    assert [item.name for item in user.get_current_world_inventory_index().possible_meanings('lamp')] == ['Lamp']
+    util.send(player, 'drop lamp')
+    assert user.get_current_world_inventory_index().possible_meanings('lamp') == []
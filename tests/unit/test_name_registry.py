@@ -0,0 +1,119 @@
+import uuid
+import pytest
+import tests.unit.util as util
+
+util.connect()
+
+from architext import entities
+from architext.entities import exceptions
+from architext.entities.name_registry import NameRegistry
+
+cache = entities.world_graph.cache
+
+
+class Entity():
+    def __init__(self, id, name, visible='listed'):
+        self.id = id
+        self.name = name
+        self.visible = visible
+
+
+def test_registry_tells_the_scope_of_each_name():
+    registry = NameRegistry()
+    registry.add_item(Entity(1, 'gem', 'takable'), room_id='a')
+    registry.add_item(Entity(2, 'rock'), room_id='a')
+    registry.add_item(Entity(3, 'coin', 'takable'))  # carried
+    registry.add_exit(Entity(4, 'door'), room_id='b')
+
+    assert registry.used_in_room('rock', 'a')
+    assert not registry.used_in_room('rock', 'b')
+    assert registry.used_in_room('door', 'b')
+    assert not registry.used_in_room('coin', 'a')
+    assert registry.used_by_takable('gem') and registry.used_by_takable('coin')
+    assert not registry.used_by_takable('rock')
+    assert all(registry.used_globally(name) for name in ['gem', 'rock', 'coin', 'door'])
+    assert not registry.used_globally('lamp')
+
+
+def test_registry_ignores_the_entity_being_validated():
+    registry = NameRegistry()
+    registry.add_item(Entity(1, 'gem', 'takable'), room_id='a')
+    assert not registry.used_in_room('gem', 'a', ignore_id=1)
+    assert not registry.used_by_takable('gem', ignore_id=1)
+    assert not registry.used_globally('gem', ignore_id=1)
+
+    registry.add_item(Entity(2, 'gem'), room_id='a')
+    assert registry.used_in_room('gem', 'a', ignore_id=1)
+    assert registry.used_globally('gem', ignore_id=1)
+    assert not registry.used_by_takable('gem', ignore_id=1)
+
+
+@pytest.fixture
+def world():
+    """A world with two rooms joined by a door, a gem in the second one and a
+    coin carried by its creator."""
+    creator = entities.User(name=str(uuid.uuid4())[:10], password=util.PASSWORD)
+    world = entities.World(name='Names', creator=creator, starting_room=entities.Room(name='Hall', alias='0'))
+    hall = world.world_state.starting_room
+    cellar = entities.Room(name='Cellar', world_state=world.world_state)
+    entities.Exit(name='door', room=hall, destination=cellar)
+    entities.Item(name='gem', room=cellar, visible='takable')
+    inventory = creator.get_inventory_from(world.world_state)
+    inventory.items.append(entities.Item(name='coin', room=None, visible='takable'))
+    inventory.save()
+    return world, hall, cellar
+
+
+def name_checks(name, room, ignore_item=None):
+    return [
+        entities.Item.name_is_valid(name, room, ignore_item=ignore_item, takable=False),
+        entities.Item.name_is_valid(name, room, ignore_item=ignore_item, takable=True),
+    ]
+
+
+@pytest.mark.parametrize('graph_loaded', [False, True])
+def test_names_collide_with_the_entities_of_the_world(world, graph_loaded):
+    world, hall, cellar = world
+    cache.clear()
+    if graph_loaded:
+        cache.get(world.world_state.id)
+
+    assert name_checks('door', hall) == [False, False]  # exit of the room
+    assert name_checks('door', cellar) == [True, False]  # exit of another room
+    assert name_checks('gem', hall) == [False, False]  # takable item of another room
+    assert name_checks('coin', hall) == [False, False]  # carried takable item
+    assert name_checks('lamp', hall) == [True, True]
+    assert (cache.get_loaded(world.world_state.id) is not None) == graph_loaded
+
+
+@pytest.mark.parametrize('graph_loaded', [False, True])
+def test_renamed_items_free_their_old_name(world, graph_loaded):
+    world, hall, cellar = world
+    cache.clear()
+    if graph_loaded:
+        cache.get(world.world_state.id)
+    rock = entities.Item(name='rock', room=hall)
+    assert name_checks('rock', hall) == [False, False]
+    assert name_checks('rock', hall, ignore_item=rock) == [True, True]
+
+    rock.name = 'stone'
+    rock.save()
+    assert name_checks('rock', hall) == [True, True]
+    assert name_checks('stone', hall) == [False, False]
+
+
+def test_saving_an_item_with_a_used_name_fails(world):
+    world, hall, cellar = world
+    cache.clear()
+    cache.get(world.world_state.id)
+    with pytest.raises(exceptions.RoomNameClash):
+        entities.Item(name='door', room=hall)
+    with pytest.raises(exceptions.NameNotGloballyUnique):
+        entities.Item(name='door', room=cellar, visible='takable')
+
+    rock = entities.Item(name='rock', room=hall)
+    rock.name = 'door'
+    with pytest.raises(exceptions.RoomNameClash):
+        rock.save()
+    assert entities.Item.objects(id=rock.id).first().name == 'rock'
+    assert name_checks('rock', hall) == [False, False]
@@ -0,0 +1,83 @@
+import pytest
+import tests.unit.util as util
+
+util.connect()
+
+from architext import verbs
+from architext.session import Session
+from architext.verbs import verb as verb_module
+
+
+def world_verb(name, command, regex_command=False, accepts=None):
+    """A world verb class. If accepts is given, it overrides can_process to
+    accept the messages for which it returns True."""
+    attributes = {'command': command, 'regex_command': regex_command, 'verbtype': verb_module.WORLDVERB}
+    if accepts is not None:
+        attributes['can_process'] = classmethod(lambda cls, message, session: accepts(message))
+    return type(name, (verb_module.Verb,), attributes)
+
+
+@pytest.fixture(scope='module')
+def session():
+    """Session of a player in a world, where the world verbs can be used."""
+    return util.new_player().session
+
+
+def first_to_process(index, message, session):
+    return next((verb for verb in index.candidates(message, verb_module.WORLDVERB) if verb.can_process(message, session)), None)
+
+
+def test_candidates_keep_the_priority_of_the_list():
+    look = world_verb('Look', 'look')
+    anything = world_verb('Anything', '', accepts=lambda message: False)
+    lock = world_verb('Lock', ['lock ', 'close '])
+    shout = world_verb('Shout', 'shout ')
+    index = verbs.VerbIndex([look, anything, lock, shout])
+
+    assert index.candidates('look', verb_module.WORLDVERB) == [look, anything, lock]
+    assert index.candidates('close door', verb_module.WORLDVERB) == [anything, lock]
+    assert index.candidates('shout hi', verb_module.WORLDVERB) == [anything, shout]
+    assert index.candidates('zzz', verb_module.WORLDVERB) == [anything]
+    assert index.candidates('', verb_module.WORLDVERB) == [anything]
+
+
+def test_wildcard_verbs_overriding_can_process_keep_their_turn(session):
+    look = world_verb('Look', 'look')
+    greedy = world_verb('Greedy', '', accepts=lambda message: message.startswith('lo'))
+    late_greedy = world_verb('LateGreedy', '', accepts=lambda message: True)
+
+    assert first_to_process(verbs.VerbIndex([greedy, look, late_greedy]), 'look', session) is greedy
+    assert first_to_process(verbs.VerbIndex([look, greedy, late_greedy]), 'look', session) is look
+    assert first_to_process(verbs.VerbIndex([look, greedy, late_greedy]), 'lost', session) is greedy
+    assert first_to_process(verbs.VerbIndex([look, greedy, late_greedy]), 'xyz', session) is late_greedy
+
+
+def test_regex_commands_are_indexed_by_their_literal_prefix(session):
+    roll = world_verb('Roll', r'roll (?P<dice>\d+)', regex_command=True)
+    any_number = world_verb('AnyNumber', r'\d+', regex_command=True)
+    index = verbs.VerbIndex([roll, any_number])
+
+    assert index.candidates('roll 3', verb_module.WORLDVERB) == [roll, any_number]
+    assert first_to_process(index, 'roll 3', session) is roll
+    assert first_to_process(index, '42', session) is any_number
+
+
+def test_verbs_are_indexed_in_their_context():
+    lobby_verb = type('LobbyVerb', (verb_module.Verb,), {'command': 'go', 'verbtype': verb_module.LOBBYVERB})
+    versatile_verb = type('VersatileVerb', (verb_module.Verb,), {'command': 'go', 'verbtype': verb_module.VERSATILE})
+    world_go = world_verb('WorldGo', 'go')
+    index = verbs.VerbIndex([lobby_verb, versatile_verb, world_go])
+
+    assert index.candidates('go', verb_module.LOBBYVERB) == [lobby_verb, versatile_verb]
+    assert index.candidates('go', verb_module.WORLDVERB) == [versatile_verb, world_go]
+
+
+def test_session_verbs_are_found_as_if_all_of_them_were_polled():
+    messages = [prefix for verb in Session.verbs for prefix in verb.command_prefixes()]
+    messages += [prefix + ' something' for prefix in messages] + ['', '1', '/', 'xyz']
+    for context in Session.verb_index.CONTEXTS:
+        in_context = [verb for verb in Session.verbs if verb.verbtype in [context, verb_module.VERSATILE]]
+        for message in messages:
+            polled = [verb for verb in in_context if verb.message_matches_command(message)]
+            indexed = [verb for verb in Session.verb_index.candidates(message, context) if verb.message_matches_command(message)]
+            assert indexed == polled, (context, message)
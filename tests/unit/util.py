@@ -0,0 +1,31 @@
+"""Helpers of the unit tests, which use the entities and the sessions of the
+server in process, on a mongomock database, instead of a running server."""
+import functools
+import uuid
+from tests.benchmarks import harness
+from tests.benchmarks import scenarios
+
+PASSWORD = 'adasdadadsa'
+
+
+@functools.cache
+def connect():
+    """Connects to the database and imports architext, once (see harness.connect)."""
+    harness.connect()
+
+
+def new_player():
+    """Returns a harness.Player already signed up, with a new name."""
+    connect()
+    name = str(uuid.uuid4())[:10]
+    player = harness.Player(name, scenarios.sign_up(name, PASSWORD))
+    while not player.is_done():
+        player.send_next()
+    return player
+
+
+def send(player, message):
+    """Sends a message as the player and returns the text sent back to them."""
+    sent_before = len(player.sender._sent)
+    player.session.process_message(message)
+    return '\n'.join(sent.text for connection_id, sent in player.sender._sent[sent_before:])